@@ -1,81 +1,115 @@
 # Adventure Game
+import time
+LAUNCH_TIME = time.perf_counter()  # For the startup measurement: launch to first menu frame
+
+import argparse
+import io
 import os
 import threading
+from collections import defaultdict
 
-import test_audio_playback
-# os.environ['SDL_VIDEODRIVER'] = 'cocoa'  # Use native macOS window system
-os.environ['SDL_VIDEODRIVER'] = 'x11'
-os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = "hide"
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', "hide")
 
 import pygame
 from pygame.locals import *
 from OpenGL.GL import *
-from OpenGL.GLU import *
 import math
 import numpy as np
 import sys
-import textwrap
 import soundfile as sf
 
-import sounddevice as sd
 import websockets
 import asyncio
 import json
-from queue import Queue
 
-from openai import OpenAI
 from dotenv import load_dotenv
-import time
-from langdetect import detect
 
 from concurrent.futures import ThreadPoolExecutor
 
-# Load environment variables
-load_dotenv()
-
-# Ensure OpenAI API Key is loaded
-api_key = os.getenv('OPENAI_API_KEY')
-if not api_key:
-    print("[OpenAI] API key not found. Please set OPENAI_API_KEY in your .env file.")
-    sys.exit(1)
-client = OpenAI(api_key=api_key)
-print("[OpenAI] API key loaded successfully.")
-
-# Initialize Pygame with macOS specific settings
-pygame.init()
-pygame.display.init()
-display = (800, 600)
-pygame.display.gl_set_attribute(pygame.GL_CONTEXT_MAJOR_VERSION, 2)
-pygame.display.gl_set_attribute(pygame.GL_CONTEXT_MINOR_VERSION, 1)
-pygame.display.set_mode(display, pygame.OPENGL | pygame.DOUBLEBUF)
-screen = pygame.display.get_surface()
-
-# Set up the camera and perspective
-glEnable(GL_DEPTH_TEST)
-glMatrixMode(GL_PROJECTION)
-glLoadIdentity()
-gluPerspective(45, (display[0]/display[1]), 0.1, 50.0)
-glMatrixMode(GL_MODELVIEW)
-
-# Set up basic lighting
-glEnable(GL_LIGHTING)
-glEnable(GL_LIGHT0)
-glLightfv(GL_LIGHT0, GL_POSITION, [0, 5, 5, 1])
-glLightfv(GL_LIGHT0, GL_AMBIENT, [0.5, 0.5, 0.5, 1])
-glLightfv(GL_LIGHT0, GL_DIFFUSE, [1.0, 1.0, 1.0, 1])
-
-# Enable blending for transparency
-glEnable(GL_BLEND)
-glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-
-# Initial camera position
-glTranslatef(0.0, 0.0, -5)
+import audio_protocol
+from audio_capture import AudioRingBuffer, VoiceActivityDetector
+from audio_player import StreamingAudioPlayer
+from text_layout import TextLayoutCache
+from chat_history import ConversationHistory
+from personas import PersonaRegistry
+from response_cache import ResponseCache, conversation_key
+from render_mesh import MeshBuilder, StaticMesh, rotation, translation
+from npc_crowd import NPCCrowd
+from frame_timing import FrameTimer
+from tile_map import CollisionGrid, TileMap
+from culling import frustum_planes, perspective, visible_boxes, visible_spheres
+
+# OpenAI, sounddevice and langdetect are imported on first use, so importing this module
+# (for tests, tools or headless runs) doesn't pay for them or need an API key or audio device
+client = None
+
+def get_client():
+    """OpenAI client, created on first use"""
+    global client
+    if client is None:
+        from openai import OpenAI
+        client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    return client
+
+# Camera
+CAMERA_FOV = 45
+CAMERA_NEAR = 0.1
+CAMERA_FAR = 50.0
+CAMERA_OFFSET = (0.0, 0.0, -5)  # The eye sits behind the player
+DRAW_DISTANCE = 40.0  # Objects further than this from the eye are not drawn
+WORLD_CHUNK_SIZE = 8.0  # Static geometry is grouped into square chunks this wide, culled as a unit
+
+HISTORY_TOKEN_BUDGET = 1500  # Prompt tokens per chat request; older turns are folded into a summary
+MAX_REPLY_TOKENS = 150  # Longest NPC reply requested; the dialogue box is sized to show all of it
+
+def camera_matrices(rot=(0, 0), pos=(0, 0, 0)):
+    """Projection and view matrices for the eye CAMERA_OFFSET behind a player at pos, turned by rot
+    (pitch, yaw in degrees). Drawing and culling both use these, so they always agree."""
+    projection = perspective(CAMERA_FOV, WINDOW_WIDTH / WINDOW_HEIGHT, CAMERA_NEAR, CAMERA_FAR)
+    view = (translation(*CAMERA_OFFSET) @ rotation(rot[0], 1, 0, 0) @ rotation(rot[1], 0, 1, 0) @
+            translation(*(-p for p in pos)))
+    return projection, view
+
+def load_camera(projection, view):
+    """Make projection and view the current GL matrices (GL takes them column-major)"""
+    glMatrixMode(GL_PROJECTION)
+    glLoadMatrixd(np.ascontiguousarray(projection.T))
+    glMatrixMode(GL_MODELVIEW)
+    glLoadMatrixd(np.ascontiguousarray(view.T))
+
+def init_display():
+    """Open the OpenGL window and set up the fixed-function state the game draws with"""
+    # Initialize Pygame with macOS specific settings
+    pygame.init()
+    pygame.display.init()
+    pygame.display.gl_set_attribute(pygame.GL_CONTEXT_MAJOR_VERSION, 2)
+    pygame.display.gl_set_attribute(pygame.GL_CONTEXT_MINOR_VERSION, 1)
+    pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.OPENGL | pygame.DOUBLEBUF)
+
+    glEnable(GL_DEPTH_TEST)
+
+    # Set up basic lighting
+    glEnable(GL_LIGHTING)
+    glEnable(GL_LIGHT0)
+    glLightfv(GL_LIGHT0, GL_POSITION, [0, 5, 5, 1])
+    glLightfv(GL_LIGHT0, GL_AMBIENT, [0.5, 0.5, 0.5, 1])
+    glLightfv(GL_LIGHT0, GL_DIFFUSE, [1.0, 1.0, 1.0, 1])
+
+    # Enable blending for transparency
+    glEnable(GL_BLEND)
+    glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+
+    # Set up the camera and perspective, after the light so its position stays in eye space
+    load_camera(*camera_matrices())
 
 # Constants
 WINDOW_WIDTH = 800
 WINDOW_HEIGHT = 600
 TILE_SIZE = 32
 FPS = 60
+SIMULATION_STEP = 1 / 60  # Fixed game-state update interval in seconds
+MAX_FRAME_TIME = 0.25  # Longer frames (e.g. after a stall) don't try to catch up all at once
+FRAME_STAGES = ("events", "update", "cull", "world", "npcs", "ui", "flip", "wait")
 
 # Colors
 BLACK = (0, 0, 0)
@@ -86,21 +120,38 @@ BROWN = (139, 69, 19)
 RED = (255, 0, 0)
 GRAY = (128, 128, 128)
 
-# Game map
+# Game map: 'W' wall, '.' floor, one world unit per tile. The room interior spans -5..5 on x and z.
 GAME_MAP = [
-    "WWWWWWWWWWWWWWWWWWWW",
-    "W..................W",
-    "W..................W",
-    "W........N.........W",
-    "W..................W",
-    "W..................W",
-    "W..................W",
-    "W....P.............W",
-    "W..................W",
-    "W..................W",
-    "W..................W",
-    "W..................W",
-    "WWWWWWWWWWWWWWWWWWWW"
+    "WWWWWWWWWWWW",
+    "W..........W",
+    "W..........W",
+    "W..........W",
+    "W..........W",
+    "W..........W",
+    "W..........W",
+    "W..........W",
+    "W..........W",
+    "W..........W",
+    "W..........W",
+    "WWWWWWWWWWWW",
+]
+MAP_TILE_SIZE = 1.0
+
+# Office furniture in a more realistic arrangement: (kind, x, z, angle)
+FURNITURE = [
+    # HR Area (left side)
+    ("desk", -4, -2, 90),
+    ("chair", -3.5, -2, 90),
+    ("partition", -4, -2, 0),  # Booth walls for HR
+    # CEO Area (right side)
+    ("desk", 4, 1, -90),
+    ("chair", 3.5, 1, -90),
+    ("partition", 4, 1, 0),  # Booth walls for CEO
+    # Plants in corners (moved closer to walls)
+    ("plant", -4.5, -4.5, 0),
+    ("plant", 4.5, -4.5, 0),
+    ("plant", -4.5, 4.5, 0),
+    ("plant", 4.5, 4.5, 0),
 ]
 
 # Add these constants near the other constants
@@ -110,65 +161,53 @@ MENU_BG_COLOR = (0, 0, 0)  # Black background
 MENU_TEXT_COLOR = (0, 255, 0)  # Matrix-style green
 MENU_HIGHLIGHT_COLOR = (0, 200, 0)  # Slightly darker green for effects
 
-def draw_cube():
-    vertices = [
-        # Front face
-        [-0.5, -0.5,  0.5],
-        [ 0.5, -0.5,  0.5],
-        [ 0.5,  0.5,  0.5],
-        [-0.5,  0.5,  0.5],
-        # Back face
-        [-0.5, -0.5, -0.5],
-        [-0.5,  0.5, -0.5],
-        [ 0.5,  0.5, -0.5],
-        [ 0.5, -0.5, -0.5],
-    ]
-  
-    surfaces = [
-        [0, 1, 2, 3],  # Front
-        [3, 2, 6, 5],  # Top
-        [0, 3, 5, 4],  # Left
-        [1, 7, 6, 2],  # Right
-        [4, 5, 6, 7],  # Back
-        [0, 4, 7, 1],  # Bottom
-    ]
-  
-    glBegin(GL_QUADS)
-    for surface in surfaces:
-        glNormal3f(0, 0, 1)  # Simple normal for lighting
-        for vertex in surface:
-            glVertex3fv(vertices[vertex])
-    glEnd()
-
-def draw_sphere(radius, slices, stacks):
-    for i in range(stacks):
-        lat0 = math.pi * (-0.5 + float(i) / stacks)
-        z0 = math.sin(lat0)
-        zr0 = math.cos(lat0)
-      
-        lat1 = math.pi * (-0.5 + float(i + 1) / stacks)
-        z1 = math.sin(lat1)
-        zr1 = math.cos(lat1)
-      
-        glBegin(GL_QUAD_STRIP)
-        for j in range(slices + 1):
-            lng = 2 * math.pi * float(j) / slices
-            x = math.cos(lng)
-            y = math.sin(lng)
-          
-            glNormal3f(x * zr0, y * zr0, z0)
-            glVertex3f(x * zr0 * radius, y * zr0 * radius, z0 * radius)
-            glNormal3f(x * zr1, y * zr1, z1)
-            glVertex3f(x * zr1 * radius, y * zr1 * radius, z1 * radius)
-        glEnd()
+# Posted by the chat worker as an NPC reply streams in (partial=True) and once it has finished
+NPC_REPLY_EVENT = pygame.USEREVENT + 1
+
+# NPC roster: who stands where, and their colour palettes
+NPC_ROSTER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "npcs.json")
+
+def surface_gl_format(surface):
+    """GL pixel format matching a 32-bit surface's in-memory byte order"""
+    return GL_BGRA if surface.get_shifts()[:3] == (16, 8, 0) else GL_RGBA
+
+def reply_lines(font, max_width, tokens=MAX_REPLY_TOKENS):
+    """Wrapped lines a reply of `tokens` tokens needs: about four characters per token at the font's
+    average width, plus a spare line for the space greedy wrapping leaves at line ends"""
+    sample = "When we launched the studio, our metrics showed founders moving faster together. "
+    char_width = font.size(sample)[0] / len(sample)
+    return math.ceil(tokens * 4 * char_width / max_width) + 1
+
+def create_surface_texture(surface):
+    """Allocate a texture the size of surface, to be filled with upload_surface_rows"""
+    texture = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, surface.get_width(), surface.get_height(), 0,
+                 surface_gl_format(surface), GL_UNSIGNED_BYTE, None)
+    return texture
+
+def upload_surface_rows(surface, top, rows):
+    """Copy rows of surface into the bound texture straight from its pixel memory; returns bytes sent"""
+    width = surface.get_width()
+    pitch = surface.get_pitch()
+    pixels = surface.get_buffer()
+    data = np.frombuffer(pixels, dtype=np.uint8)[top * pitch:(top + rows) * pitch]
+    glPixelStorei(GL_UNPACK_ROW_LENGTH, pitch // 4)
+    glTexSubImage2D(GL_TEXTURE_2D, 0, 0, top, width, rows, surface_gl_format(surface), GL_UNSIGNED_BYTE, data)
+    glPixelStorei(GL_UNPACK_ROW_LENGTH, 0)
+    del data, pixels  # Unlock the surface
+    return width * rows * 4
 
 class DialogueSystem:
-    def __init__(self):
+    def __init__(self, headless=False):
         self.active = False
         self.user_input = ""
         try:
             pygame.font.init()
             self.font = pygame.font.Font(None, 24)
+            self.text_layout = TextLayoutCache(self.font, (255, 255, 255))
             print("[DialogueSystem] Font loaded successfully")
         except Exception as e:
             print("[DialogueSystem] Font loading failed:", e)
@@ -176,60 +215,35 @@ class DialogueSystem:
         self.input_active = False
         self.last_npc_text = ""     # Track NPC text separately
         self.last_input_text = ""   # Track input text separately
-        self.conversation_history = []  # Maintain conversation history
+        self.conversation_history = ConversationHistory()  # Maintain conversation history
 
-        # Create a surface for the UI
-        self.ui_surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA).convert_alpha()
-        self.ui_texture = glGenTextures(1)
         self.current_npc = None  # Track which NPC we're talking to
         self.initial_player_pos = None  # Store initial position when dialogue starts
 
         # Initialize speech mode
         self.speech_mode = False
-        self.box_height = 200
-        self.box_y = WINDOW_HEIGHT - self.box_height - 20  # Store box_y as instance variable
+        self.text_width = WINDOW_WIDTH - 80  # The box spans WINDOW_WIDTH - 40, text is inset 20 on each side
+        self.line_height = 22
+        if not headless:
+            self.init_overlay()
         self.speech_handler = SpeechHandler()
-        self.voice_mapping = {
-            "HR": "alloy",
-            "CEO": "echo"
-        }
-        # Create an event loop
-        self.loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(self.loop)
+        self.personas = PersonaRegistry.load()
+        self.voice_mapping = {role: persona.voice for role, persona in self.personas.personas.items()}
+        # Replies keyed by persona and the normalized end of the conversation, in memory. Setting
+        # RESPONSE_CACHE_PATH also keeps them on disk (headless runs never do), shared with a local server.
+        cache_path = None if headless else os.getenv('RESPONSE_CACHE_PATH')
+        self.reply_cache = ResponseCache("replies", path=cache_path)
+        # Chat requests run here so the render loop never waits on the network
+        self.chat_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat")
+        self.summary_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary")
+        self.request_id = 0
+        self.waiting_for_reply = False
+        self.thinking_since = 0
 
     def render_text(self, surface, text, x, y):
-        max_width = WINDOW_WIDTH - 40
-        line_height = 25
-      
-        words = text.split()
-        lines = []
-        current_line = []
-        current_width = 0
-      
-        # Always use pure white with full opacity
-        text_color = (255, 255, 255)
-      
-        for word in words:
-            word_surface = self.font.render(word + ' ', True, text_color)
-            word_width = word_surface.get_width()
-          
-            if current_width + word_width <= max_width:
-                current_line.append(word)
-                current_width += word_width
-            else:
-                lines.append(' '.join(current_line))
-                current_line = [word]
-                current_width = word_width
-      
-        if current_line:
-            lines.append(' '.join(current_line))
-      
-        # Render each line in pure white
-        for i, line in enumerate(lines):
-            text_surface = self.font.render(line, True, (255, 255, 255))  # Force white color
-            surface.blit(text_surface, (x, y + i * line_height))
-      
-        return len(lines) * line_height
+        # Layout and line surfaces are cached, so unchanged text costs only blits
+        return self.text_layout.render(surface, text, x, y, self.text_width, self.line_height,
+                                       max_lines=self.message_lines)
 
     # def start_conversation(self, npc_role="HR", player_pos=None):
     #     self.active = True
@@ -340,159 +354,129 @@ class DialogueSystem:
         self.active = True
         self.input_active = True
         self.current_npc = npc_role
+        self.request_id += 1  # Ignore replies still streaming from an earlier conversation
+        self.waiting_for_reply = False
         self.initial_player_pos = [player_pos[0], player_pos[1], player_pos[2]] if player_pos else [0, 0.5, 0]
         print(f"[DialogueSystem] Starting dialogue with {npc_role}")
 
-        # Base personality framework
-        base_prompt = """You are an AI character in a 3D office environment.
-            Maintain consistent personality and remember context within the dialogue.
-            Keep responses natural and concise (2-3 sentences).
-            Show emotional intelligence and react appropriately to interactions.
-            IMPORTANT: Always respond in English only."""
-
-        # Role-specific prompts
-        if npc_role == "HR":
-            role_prompt = """You are Sarah Chen, HR Director at Venture Builder AI.
-            PERSONALITY: Warm but professional, excellent emotional intelligence, strong ethical boundaries
-            BACKGROUND: 15 years HR experience in tech, Masters in Organizational Psychology
-            CURRENT FOCUS: AI Talent Development, Remote Work Framework, Culture Development
-            SPEAKING STYLE: Supportive and policy-aware, uses phrases like "I understand that..." and "According to our policy..."
-            Never start with generic greetings like "How can I assist you." Instead, engage naturally like a real HR director."""
-
-            initial_greeting = "Hi there! I'm Sarah Chen, HR Director here at Venture Builder AI. I was just reviewing our new talent development program - what brings you to my office today?"
-
-        else:  # CEO
-            role_prompt = """You are Michael Chen, CEO of Venture Builder AI.
-            PERSONALITY: Visionary yet approachable, strategic thinker, passionate about innovation
-            BACKGROUND: Founded company 5 years ago, launched 15+ venture-backed startups, MIT CS graduate
-            CURRENT FOCUS: AI Venture Studio, European Expansion, Startup Methodology
-            SPEAKING STYLE: Uses storytelling and data, phrases like "When we launched..." and "Our metrics show..."
-            Never start with generic greetings like "How can I assist you." Instead, engage naturally like a real CEO."""
-
-            initial_greeting = "Welcome! I'm Michael Chen, CEO of Venture Builder AI. I was just looking at some exciting metrics from our latest ventures - what's on your mind?"
-
-        # Initialize conversation with system prompt and role
-        self.conversation_history = [
-            {"role": "system", "content": f"{base_prompt}\n\n{role_prompt}"},
-            {"role": "assistant", "content": initial_greeting}
-        ]
+        # The system prompt comes from the shared registry, byte-identical on every request
+        persona = self.personas.get(npc_role)
+        self.conversation_history = ConversationHistory(persona.system_prompt, HISTORY_TOKEN_BUDGET, persona.greeting)
+        self.speech_handler.npc_role = persona.role
+        self.speech_handler.server_npc_role = None  # The server starts its conversation afresh too
+        if self.speech_mode:
+            self.speech_handler.greet(persona.role)
 
         # Set initial message
-        self.npc_message = initial_greeting
+        self.npc_message = persona.greeting
         print(f"[DialogueSystem] Initial message set: {self.npc_message}")
 
+    def end_conversation(self):
+        self.active = False
+        self.input_active = False
+        self.request_id += 1
+        self.waiting_for_reply = False
+        print("[DialogueSystem] Chat ended")
+        if self.current_npc:
+            print(f"[DialogueSystem] Prompt cache: {self.personas.cache_report(self.current_npc)}")
+        return {"command": "move_player_back", "position": self.initial_player_pos}
+
     def send_message(self):
+        """Request the NPC's reply on the background worker; tokens stream into npc_message"""
         if not self.conversation_history:
             print("[DialogueSystem] No conversation history to send.")
-            return
+            return None
 
+        self.waiting_for_reply = True
+        self.thinking_since = time.time()
+        self.npc_message = ""
+        self.request_id += 1
+        self.summarize_history()
+        # Copy the history so the worker never sees it change mid-request
+        return self.chat_worker.submit(self.request_reply, self.conversation_history.messages(), self.request_id,
+                                      self.current_npc)
+
+    def request_reply(self, messages, request_id, npc_role):
+        """Stream a chat completion (runs on the worker thread, never the render loop)"""
+        persona = self.personas.get(npc_role)
+        cache_key = (persona.role, persona.system_prompt, conversation_key(messages))
+        ai_message = self.reply_cache.get(*cache_key)
+        if ai_message:
+            pygame.event.post(pygame.event.Event(NPC_REPLY_EVENT, request_id=request_id, message=ai_message))
+            return ai_message
         try:
-            # Detect and translate user input to English if necessary
-            if self.user_input.strip():
-                print(f"[DialogueSystem] User input: {self.user_input}")
-                self.conversation_history.append({
-                    "role": "user",
-                    "content": self.user_input.strip()
-                })
-
-            # Get AI response
-            response = client.chat.completions.create(
+            stream = get_client().chat.completions.create(
                 model="gpt-4-0125-preview",
-                messages=self.conversation_history,
+                messages=messages,
                 temperature=0.85,
-                max_tokens=150,
+                max_tokens=MAX_REPLY_TOKENS,
                 top_p=0.95,
                 frequency_penalty=0.2,
-                presence_penalty=0.1
+                presence_penalty=0.1,
+                stream=True,
+                # Usage arrives in a final chunk; openai 1.12 has no stream_options argument yet
+                extra_body={"stream_options": {"include_usage": True}}
             )
-
-            ai_message = response.choices[0].message.content
-
-            # Add AI's response to history
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": ai_message
-            })
-
-            # Update the display message
-            self.npc_message = ai_message
-            print(f"[DialogueSystem] NPC response: {self.npc_message}")
-
+            parts = []
+            for chunk in stream:
+                if request_id != self.request_id:
+                    break  # Conversation ended or restarted, drop the stale reply
+                if getattr(chunk, "usage", None):
+                    self.personas.record_usage(npc_role, chunk.usage)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    # Only the main thread writes npc_message, and only for the current request
+                    pygame.event.post(pygame.event.Event(NPC_REPLY_EVENT, request_id=request_id,
+                                                         message="".join(parts), partial=True))
+            ai_message = "".join(parts)
+            if ai_message and request_id == self.request_id:
+                self.reply_cache.put(ai_message, *cache_key)
         except Exception as e:
-            self.npc_message = "I apologize, but I'm having trouble connecting to our systems right now."
             print(f"[DialogueSystem] Error: {e}")
 
-    def render(self):
-        if not self.active:
-            return
-
-        self.ui_surface.fill((0, 0, 0, 0))
-
-        if self.active:
-            # box_height = 200
-            # self.box_y = WINDOW_HEIGHT - box_height - 20
-          
-            # Make the background MUCH darker - almost black with some transparency
-            box_color = (0, 0, 0, 230)  # Changed to very dark, mostly opaque background
-            pygame.draw.rect(self.ui_surface, box_color, (20, self.box_y, WINDOW_WIDTH - 40, self.box_height))
-          
-            # White border
-            pygame.draw.rect(self.ui_surface, (255, 255, 255, 255), (20, self.box_y, WINDOW_WIDTH - 40, self.box_height), 2)
+        # Hand the result back to the main thread through the pygame event queue
+        pygame.event.post(pygame.event.Event(NPC_REPLY_EVENT, request_id=request_id, message=ai_message))
+        return ai_message
 
-            # Render ALL text in pure white (255, 255, 255)
-            # Quit instruction
-            quit_text_surface = self.font.render("Press Shift+Q to exit", True, (255, 255, 255))
-            self.ui_surface.blit(quit_text_surface, (40, self.box_y + 10))
-
-            # NPC message in white
-            if self.npc_message:
-                self.render_text(self.ui_surface, self.npc_message, 40, self.box_y + 40)
-
-            # Input prompt in white
-            if self.input_active:
-                input_prompt = "> " + self.user_input + "_"
-                input_surface = self.font.render(input_prompt, True, (255, 255, 255))
-                self.ui_surface.blit(input_surface, (40, self.box_y + self.box_height - 40))
-
-        # Convert surface to OpenGL texture
-        texture_data = pygame.image.tostring(self.ui_surface, "RGBA", True)
-
-        # Save current OpenGL state
-        glPushAttrib(GL_ALL_ATTRIB_BITS)
-        glMatrixMode(GL_PROJECTION)
-        glPushMatrix()
-        glLoadIdentity()
-        glOrtho(0, WINDOW_WIDTH, 0, WINDOW_HEIGHT, -1, 1)
-        glMatrixMode(GL_MODELVIEW)
-        glPushMatrix()
-        glLoadIdentity()
-
-        # Setup for 2D rendering
-        glDisable(GL_DEPTH_TEST)
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-        glEnable(GL_TEXTURE_2D)
-
-        # Bind and update texture
-        glBindTexture(GL_TEXTURE_2D, self.ui_texture)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, WINDOW_WIDTH, WINDOW_HEIGHT, 0, GL_RGBA, GL_UNSIGNED_BYTE, texture_data)
-
-        # Draw the UI texture
-        glBegin(GL_QUADS)
-        glTexCoord2f(0, 0); glVertex2f(0, 0)
-        glTexCoord2f(1, 0); glVertex2f(WINDOW_WIDTH, 0)
-        glTexCoord2f(1, 1); glVertex2f(WINDOW_WIDTH, WINDOW_HEIGHT)
-        glTexCoord2f(0, 1); glVertex2f(0, WINDOW_HEIGHT)
-        glEnd()
+    def handle_reply(self, event):
+        """Show a streamed reply's progress, then finish it, on the main thread"""
+        if event.request_id != self.request_id:
+            return
+        if getattr(event, "partial", False):
+            self.npc_message = event.message  # Show the reply as it streams in
+            return
+        self.waiting_for_reply = False
+        if not event.message:
+            self.npc_message = self.personas.fallback
+            return
 
-        # Restore OpenGL state
-        glMatrixMode(GL_PROJECTION)
-        glPopMatrix()
-        glMatrixMode(GL_MODELVIEW)
-        glPopMatrix()
-        glPopAttrib()
+        # Add AI's response to history
+        self.conversation_history.append("assistant", event.message)
+        self.summarize_history()
+        self.npc_message = event.message
+        print(f"[DialogueSystem] NPC response: {self.npc_message}")
+
+    def summarize_history(self):
+        """Fold turns that no longer fit the token budget into the running summary, in the background"""
+        history = self.conversation_history
+        messages = history.begin_summary()
+        if messages:
+            self.summary_worker.submit(self.request_summary, history, messages)
+
+    def request_summary(self, history, messages):
+        """Summarize dropped turns (runs on the summary worker thread)"""
+        summary = None
+        try:
+            response = get_client().chat.completions.create(
+                model="gpt-4-0125-preview",
+                messages=messages,
+                temperature=0.3,
+                max_tokens=150
+            )
+            summary = response.choices[0].message.content
+        except Exception as e:
+            print(f"[DialogueSystem] Summary error: {e}")
+        history.finish_summary(summary)
 
     def handle_input(self, event):
         if not self.active:
@@ -504,29 +488,29 @@ class DialogueSystem:
                 self.toggle_speech_mode()
                 return
 
+            # Toggle the UI upload debug line with F3
+            if event.key == pygame.K_F3:
+                self.show_upload_stats = not self.show_upload_stats
+                return
+
             # Exit chat with Shift+Q
             keys = pygame.key.get_pressed()
             if keys[pygame.K_LSHIFT] and event.key == pygame.K_q:
-                self.active = False
-                self.input_active = False
-                print("[DialogueSystem] Chat ended")
-                return {"command": "move_player_back", "position": self.initial_player_pos}
+                return self.end_conversation()
 
             # Handle text input when not in speech mode
             if not self.speech_mode:
-                if event.key == pygame.K_RETURN and self.user_input.strip():
+                if event.key == pygame.K_RETURN and self.user_input.strip() and not self.waiting_for_reply:
                     try:
                         # Detect language
+                        from langdetect import detect
                         detected_language = detect(self.user_input.strip())
                         if detected_language != "en":
                             self.npc_message = "Please speak in English for this conversation."
                         else:
                             # Process the message
                             print(f"[DialogueSystem] User said: {self.user_input}")
-                            self.conversation_history.append({
-                                "role": "user",
-                                "content": self.user_input.strip()
-                            })
+                            self.conversation_history.append("user", self.user_input.strip())
                             self.send_message()
                         self.user_input = ""
                     except Exception as e:
@@ -542,19 +526,10 @@ class DialogueSystem:
             self.speech_mode = not self.speech_mode
             if self.speech_mode:
                 print("Speech mode enabled - Press V again to stop recording")
-                # Start real-time speech processing
+                # Utterances are sent from the speech handler's own loop as VAD closes them
                 self.speech_handler.start_record()
-
-                # Start processing in background
-                def run_async():
-                    try:
-                        asyncio.run(self.handle_speech_input())
-                    except Exception as e:
-                        print(f"Error in speech processing thread: {e}")
-
-                thread = threading.Thread(target=run_async)
-                thread.daemon = True
-                thread.start()
+                if self.active and len(self.conversation_history) == 2:  # Nothing said yet but the greeting
+                    self.speech_handler.greet(self.current_npc)
             else:
                 print("Speech mode disabled")
                 self.speech_handler.stop_record()
@@ -562,80 +537,126 @@ class DialogueSystem:
             print(f"Error toggling speech mode: {e}")
             self.speech_mode = False
 
-    async def handle_speech_input(self):
-        """Handle real-time speech input and generate responses"""
-        try:
-            print("Starting speech processing...")
-            if not hasattr(self.speech_handler, 'ws') or not self.speech_handler.ws:
-                await self.speech_handler.connect_websocket()
-
-            await self.speech_handler.process_audio_stream()
-
-        except Exception as e:
-            print(f"Error in speech processing: {e}")
-            self.speech_mode = False
-
-    async def send_message(self):
-        try:
-            response = await self.client.chat.completions.create(
-                model="gpt-4-0125-preview",
-                messages=self.conversation_history,
-                temperature=0.85,
-                max_tokens=150,
-                top_p=0.95,
-                frequency_penalty=0.2,
-                presence_penalty=0.1
-            )
-            ai_message = response.choices[0].message.content
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": ai_message
-            })
-            self.npc_message = ai_message
-            return ai_message
-        except Exception as e:
-            error_message = "I apologize, but I'm having trouble connecting to our systems right now."
-            self.npc_message = error_message
-            print(f"[DialogueSystem] Error: {e}")
-            return error_message
+    def init_overlay(self):
+        """Allocate the overlay surface and texture, sized to the dialogue box plus the status line"""
+        # The message section holds the longest reply the chat request allows
+        self.message_lines = reply_lines(self.font, self.text_width)
+        self.box_height = self.message_lines * self.line_height + 90
+        self.box_y = WINDOW_HEIGHT - self.box_height - 20
+        self.overlay_rect = pygame.Rect(20, self.box_y - 30, WINDOW_WIDTH - 40, self.box_height + 30)
+        width, height = self.overlay_rect.size
+        self.ui_surface = pygame.Surface((width, height), pygame.SRCALPHA, 32)
+        self.ui_texture = create_surface_texture(self.ui_surface)
+
+        # Each section is redrawn and re-uploaded only when its content changes
+        self.ui_box = pygame.Rect(0, 30, width, self.box_height)
+        self.ui_sections = {
+            "status": pygame.Rect(0, 0, width, 30),
+            "header": pygame.Rect(2, 32, width - 4, 38),
+            "message": pygame.Rect(2, 70, width - 4, self.box_height - 80),
+            "input": pygame.Rect(2, self.box_height - 10, width - 4, 38),
+        }
+        self.ui_drawn = {}  # section -> content it currently shows
+        self.ui_background_drawn = False
+
+        # Upload statistics for the F3 debug line
+        self.show_upload_stats = False
+        self.upload_bytes = 0
+        self.upload_frames = 0
+        self.upload_window_start = time.time()
+        self.upload_rate = 0
+
+    def section_content(self, name):
+        """Everything a section's pixels depend on"""
+        if name == "status":
+            stats = f"{self.upload_rate:.0f}" if self.show_upload_stats else None
+            return (self.speech_mode, stats)
+        if name == "header":
+            return "Press Shift+Q to exit"
+        if name == "message":
+            if self.npc_message or not self.waiting_for_reply:
+                return self.npc_message
+            return ("thinking", int((time.time() - self.thinking_since) * 3) % 3 + 1)
+        return (self.input_active, self.user_input)
+
+    def draw_section(self, name, rect):
+        """Redraw one section of the overlay surface in overlay coordinates"""
+        self.ui_surface.set_clip(rect)
+        # Make the background MUCH darker - almost black with some transparency
+        self.ui_surface.fill((0, 0, 0, 0) if name == "status" else (0, 0, 0, 230))
+        content = self.ui_drawn[name]
+
+        # Render ALL text in pure white (255, 255, 255)
+        if name == "status":
+            speech_mode, stats = content
+            if speech_mode:
+                mic_status = "🎤 Voice Mode (Press V to toggle off)"
+            else:
+                mic_status = "Text Mode (Press V for voice input)"
+            if stats is not None:
+                mic_status += f"   UI upload: {stats} B/frame"
+            self.ui_surface.blit(self.text_layout.line_surface(mic_status), (20, 0))
+        elif name == "header":
+            # Quit instruction
+            self.ui_surface.blit(self.text_layout.line_surface(content), (20, 40))
+        elif name == "message":
+            # NPC message, or a thinking indicator until the first token arrives
+            if isinstance(content, tuple):
+                self.ui_surface.blit(self.text_layout.line_surface("Thinking" + "." * content[1]), (20, 70))
+            elif content:
+                self.render_text(self.ui_surface, content, 20, 70)
+        else:
+            # Input prompt
+            input_active, user_input = content
+            if input_active:
+                self.ui_surface.blit(self.text_layout.line_surface("> " + user_input + "_"), (20, self.box_height - 10))
+        self.ui_surface.set_clip(None)
+
+    def update_overlay(self):
+        """Redraw changed sections and upload just their rows; returns bytes uploaded"""
+        dirty = []
+        if not self.ui_background_drawn:
+            self.ui_surface.fill((0, 0, 0, 0))
+            pygame.draw.rect(self.ui_surface, (0, 0, 0, 230), self.ui_box)
+            # White border
+            pygame.draw.rect(self.ui_surface, (255, 255, 255, 255), self.ui_box, 2)
+            self.ui_background_drawn = True
+            self.ui_drawn = {}
+            dirty.append(self.ui_surface.get_rect())
+
+        for name, rect in self.ui_sections.items():
+            content = self.section_content(name)
+            if self.ui_drawn.get(name) != content:
+                self.ui_drawn[name] = content
+                self.draw_section(name, rect)
+                dirty.append(rect)
+
+        uploaded = 0
+        if dirty:
+            glBindTexture(GL_TEXTURE_2D, self.ui_texture)
+            if dirty[0] == self.ui_surface.get_rect():
+                uploaded = upload_surface_rows(self.ui_surface, 0, self.ui_surface.get_height())
+            else:
+                for rect in dirty:
+                    uploaded += upload_surface_rows(self.ui_surface, rect.top, rect.height)
+        return uploaded
 
     def render(self):
         if not self.active:
             return
 
-        self.ui_surface.fill((0, 0, 0, 0))
-
-        if self.active:
-            box_height = 200
-            box_y = WINDOW_HEIGHT - box_height - 20
-            
-            # Make the background MUCH darker - almost black with some transparency
-            box_color = (0, 0, 0, 230)  # Changed to very dark, mostly opaque background
-            pygame.draw.rect(self.ui_surface, box_color, (20, box_y, WINDOW_WIDTH - 40, box_height))
-            
-            # White border
-            pygame.draw.rect(self.ui_surface, (255, 255, 255, 255), (20, box_y, WINDOW_WIDTH - 40, box_height), 2)
-
-            # Render ALL text in pure white (255, 255, 255)
-            # Quit instruction
-            quit_text_surface = self.font.render("Press Shift+Q to exit", True, (255, 255, 255))
-            self.ui_surface.blit(quit_text_surface, (40, box_y + 10))
-
-            # NPC message in white
-            if self.npc_message:
-                self.render_text(self.ui_surface, self.npc_message, 40, box_y + 40)
-
-            # Input prompt in white
-            if self.input_active:
-                input_prompt = "> " + self.user_input + "_"
-                input_surface = self.font.render(input_prompt, True, (255, 255, 255))
-                self.ui_surface.blit(input_surface, (40, box_y + box_height - 40))
-
-        # Convert surface to OpenGL texture
-        texture_data = pygame.image.tostring(self.ui_surface, "RGBA", True)
-
         # Save current OpenGL state
         glPushAttrib(GL_ALL_ATTRIB_BITS)
+        glEnable(GL_TEXTURE_2D)
+        uploaded = self.update_overlay()
+
+        self.upload_bytes += uploaded
+        self.upload_frames += 1
+        if time.time() - self.upload_window_start >= 1.0:
+            self.upload_rate = self.upload_bytes / self.upload_frames
+            self.upload_bytes = self.upload_frames = 0
+            self.upload_window_start = time.time()
+
         glMatrixMode(GL_PROJECTION)
         glPushMatrix()
         glLoadIdentity()
@@ -646,22 +667,20 @@ class DialogueSystem:
 
         # Setup for 2D rendering
         glDisable(GL_DEPTH_TEST)
+        glDisable(GL_LIGHTING)
         glEnable(GL_BLEND)
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-        glEnable(GL_TEXTURE_2D)
-
-        # Bind and update texture
+        glColor4f(1, 1, 1, 1)
         glBindTexture(GL_TEXTURE_2D, self.ui_texture)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, WINDOW_WIDTH, WINDOW_HEIGHT, 0, GL_RGBA, GL_UNSIGNED_BYTE, texture_data)
 
-        # Draw the UI texture
+        # Draw the UI texture over the dialogue box; row 0 of the texture is the top of the box
+        left, right = self.overlay_rect.left, self.overlay_rect.right
+        top, bottom = WINDOW_HEIGHT - self.overlay_rect.top, WINDOW_HEIGHT - self.overlay_rect.bottom
         glBegin(GL_QUADS)
-        glTexCoord2f(0, 0); glVertex2f(0, 0)
-        glTexCoord2f(1, 0); glVertex2f(WINDOW_WIDTH, 0)
-        glTexCoord2f(1, 1); glVertex2f(WINDOW_WIDTH, WINDOW_HEIGHT)
-        glTexCoord2f(0, 1); glVertex2f(0, WINDOW_HEIGHT)
+        glTexCoord2f(0, 1); glVertex2f(left, bottom)
+        glTexCoord2f(1, 1); glVertex2f(right, bottom)
+        glTexCoord2f(1, 0); glVertex2f(right, top)
+        glTexCoord2f(0, 0); glVertex2f(left, top)
         glEnd()
 
         # Restore OpenGL state
@@ -671,18 +690,10 @@ class DialogueSystem:
         glPopMatrix()
         glPopAttrib()
 
-        # Add speech mode indicator
-        if self.speech_mode:
-            mic_status = "🎤 Voice Mode (Press V to toggle off)"
-        else:
-            mic_status = "Text Mode (Press V for voice input)"
-
-        status_surface = self.font.render(mic_status, True, (255, 255, 255))
-        self.ui_surface.blit(status_surface, (40, self.box_y - 30))
-
 class World:
-    def __init__(self):
-        self.size = 5
+    def __init__(self, tile_map):
+        self.tile_map = tile_map
+        self.wall_height = 2
         # Define office furniture colors
         self.colors = {
             'floor': (0.76, 0.6, 0.42),  # Light wood color
@@ -693,292 +704,207 @@ class World:
             'plant': (0.2, 0.5, 0.2),  # Green
             'partition': (0.3, 0.3, 0.3)  # Darker solid gray for booth walls
         }
-      
-    def draw_desk(self, x, z, rotation=0):
-        glPushMatrix()
-        glTranslatef(x, 0, z)  # Start at floor level
-        glRotatef(rotation, 0, 1, 0)
-      
+        # The static office is baked into per-chunk vertex arrays now and uploaded on the first draw
+        self.chunk_vertices, self.chunk_mins, self.chunk_maxs = self.bake()
+        self.chunks = None
+
+    def build_desk(self, mesh, x, z, angle=0):
+        mesh.push()
+        mesh.translate(x, 0, z)  # Start at floor level
+        mesh.rotate(angle, 0, 1, 0)
+
         # Desk top (reduced size)
-        glColor3f(*self.colors['desk'])
-        glBegin(GL_QUADS)
-        glVertex3f(-0.4, 0.4, -0.3)
-        glVertex3f(0.4, 0.4, -0.3)
-        glVertex3f(0.4, 0.4, 0.3)
-        glVertex3f(-0.4, 0.4, 0.3)
-        glEnd()
-      
+        mesh.set_color(*self.colors['desk'])
+        mesh.quads([
+            (-0.4, 0.4, -0.3), (0.4, 0.4, -0.3), (0.4, 0.4, 0.3), (-0.4, 0.4, 0.3)
+        ])
+
         # Desk legs (adjusted for new height)
         for x_offset, z_offset in [(-0.35, -0.25), (0.35, -0.25), (-0.35, 0.25), (0.35, 0.25)]:
-            glBegin(GL_QUADS)
-            glVertex3f(x_offset-0.02, 0, z_offset-0.02)
-            glVertex3f(x_offset+0.02, 0, z_offset-0.02)
-            glVertex3f(x_offset+0.02, 0.4, z_offset-0.02)
-            glVertex3f(x_offset-0.02, 0.4, z_offset-0.02)
-            glEnd()
-      
+            mesh.quads([
+                (x_offset-0.02, 0, z_offset-0.02), (x_offset+0.02, 0, z_offset-0.02),
+                (x_offset+0.02, 0.4, z_offset-0.02), (x_offset-0.02, 0.4, z_offset-0.02)
+            ])
+
         # Computer monitor (smaller)
-        glColor3f(*self.colors['computer'])
-        glTranslatef(-0.15, 0.4, 0)
-        glBegin(GL_QUADS)
-        glVertex3f(-0.1, 0, -0.05)
-        glVertex3f(0.1, 0, -0.05)
-        glVertex3f(0.1, 0.2, -0.05)
-        glVertex3f(-0.1, 0.2, -0.05)
-        glEnd()
-      
-        glPopMatrix()
-  
-    def draw_chair(self, x, z, rotation=0):
-        glPushMatrix()
-        glTranslatef(x, 0, z)
-        glRotatef(rotation, 0, 1, 0)
-        glColor3f(*self.colors['chair'])
-      
+        mesh.set_color(*self.colors['computer'])
+        mesh.translate(-0.15, 0.4, 0)
+        mesh.quads([
+            (-0.1, 0, -0.05), (0.1, 0, -0.05), (0.1, 0.2, -0.05), (-0.1, 0.2, -0.05)
+        ])
+
+        mesh.pop()
+
+    def build_chair(self, mesh, x, z, angle=0):
+        mesh.push()
+        mesh.translate(x, 0, z)
+        mesh.rotate(angle, 0, 1, 0)
+        mesh.set_color(*self.colors['chair'])
+
         # Seat (lowered and smaller)
-        glBegin(GL_QUADS)
-        glVertex3f(-0.15, 0.25, -0.15)
-        glVertex3f(0.15, 0.25, -0.15)
-        glVertex3f(0.15, 0.25, 0.15)
-        glVertex3f(-0.15, 0.25, 0.15)
-        glEnd()
-      
+        mesh.quads([
+            (-0.15, 0.25, -0.15), (0.15, 0.25, -0.15), (0.15, 0.25, 0.15), (-0.15, 0.25, 0.15)
+        ])
+
         # Back (adjusted height)
-        glBegin(GL_QUADS)
-        glVertex3f(-0.15, 0.25, -0.15)
-        glVertex3f(0.15, 0.25, -0.15)
-        glVertex3f(0.15, 0.5, -0.15)
-        glVertex3f(-0.15, 0.5, -0.15)
-        glEnd()
-      
+        mesh.quads([
+            (-0.15, 0.25, -0.15), (0.15, 0.25, -0.15), (0.15, 0.5, -0.15), (-0.15, 0.5, -0.15)
+        ])
+
         # Chair legs (adjusted height)
         for x_offset, z_offset in [(-0.12, -0.12), (0.12, -0.12), (-0.12, 0.12), (0.12, 0.12)]:
-            glBegin(GL_QUADS)
-            glVertex3f(x_offset-0.02, 0, z_offset-0.02)
-            glVertex3f(x_offset+0.02, 0, z_offset-0.02)
-            glVertex3f(x_offset+0.02, 0.25, z_offset-0.02)
-            glVertex3f(x_offset-0.02, 0.25, z_offset-0.02)
-            glEnd()
-          
-        glPopMatrix()
-  
-    def draw_plant(self, x, z):
-        glPushMatrix()
-        glTranslatef(x, 0, z)
-      
+            mesh.quads([
+                (x_offset-0.02, 0, z_offset-0.02), (x_offset+0.02, 0, z_offset-0.02),
+                (x_offset+0.02, 0.25, z_offset-0.02), (x_offset-0.02, 0.25, z_offset-0.02)
+            ])
+
+        mesh.pop()
+
+    def build_plant(self, mesh, x, z, angle=0):
+        mesh.push()
+        mesh.translate(x, 0, z)
+        mesh.rotate(angle, 0, 1, 0)
+
         # Plant pot (smaller)
-        glColor3f(0.4, 0.2, 0.1)  # Brown pot
+        mesh.set_color(0.4, 0.2, 0.1)  # Brown pot
         pot_radius = 0.1
         pot_height = 0.15
         segments = 8
-      
+
         # Draw the pot sides
-        glBegin(GL_QUADS)
-        for i in range(segments):
-            angle1 = (i / segments) * 2 * math.pi
-            angle2 = ((i + 1) / segments) * 2 * math.pi
-            x1 = math.cos(angle1) * pot_radius
-            z1 = math.sin(angle1) * pot_radius
-            x2 = math.cos(angle2) * pot_radius
-            z2 = math.sin(angle2) * pot_radius
-            glVertex3f(x1, 0, z1)
-            glVertex3f(x2, 0, z2)
-            glVertex3f(x2, pot_height, z2)
-            glVertex3f(x1, pot_height, z1)
-        glEnd()
-      
+        angles = np.arange(segments + 1) / segments * 2 * math.pi
+        ring = np.stack((np.cos(angles) * pot_radius, np.zeros_like(angles), np.sin(angles) * pot_radius), axis=1)
+        top = ring + (0, pot_height, 0)
+        mesh.quads(np.stack((ring[:-1], ring[1:], top[1:], top[:-1]), axis=1))
+
         # Plant leaves (smaller)
-        glColor3f(*self.colors['plant'])
-        glTranslatef(0, pot_height, 0)
+        mesh.set_color(*self.colors['plant'])
+        mesh.translate(0, pot_height, 0)
         leaf_size = 0.15
         num_leaves = 6
-        for i in range(num_leaves):
-            angle = (i / num_leaves) * 2 * math.pi
-            x = math.cos(angle) * leaf_size
-            z = math.sin(angle) * leaf_size
-            glBegin(GL_TRIANGLES)
-            glVertex3f(0, 0, 0)
-            glVertex3f(x, leaf_size, z)
-            glVertex3f(z, leaf_size/2, -x)
-            glEnd()
-      
-        glPopMatrix()
-      
-    def draw(self):
+        angles = np.arange(num_leaves) / num_leaves * 2 * math.pi
+        leaf_x = np.cos(angles) * leaf_size
+        leaf_z = np.sin(angles) * leaf_size
+        mesh.triangles(np.stack((
+            np.zeros((num_leaves, 3)),
+            np.stack((leaf_x, np.full(num_leaves, leaf_size), leaf_z), axis=1),
+            np.stack((leaf_z, np.full(num_leaves, leaf_size / 2), -leaf_x), axis=1),
+        ), axis=1))
+
+        mesh.pop()
+
+    def build_furniture(self, mesh, kind, x, z, angle):
+        getattr(self, "build_" + kind)(mesh, x, z, angle)
+
+    def footprints(self):
+        """Floor rectangle (x0, z0, x1, z1) covered by each piece of furniture, for collision"""
+        for kind, x, z, angle in FURNITURE:
+            mesh = MeshBuilder()
+            self.build_furniture(mesh, kind, x, z, angle)
+            vertices = mesh.build()
+            yield vertices[:, 0].min(), vertices[:, 2].min(), vertices[:, 0].max(), vertices[:, 2].max()
+
+    def bake(self):
+        """Record the floor and walls from the tile map, plus the furniture, grouped into chunks.
+
+        Returns each chunk's vertices and the min and max corners of its bounding box.
+        """
+        mesh = MeshBuilder()
+        pieces = []  # (first vertex, end vertex) of each floor rect, wall face and furniture item
+
+        # Floor at Y=0
+        mesh.set_color(*self.colors['floor'])
+        mesh.set_normal(0, 1, 0)
+        for x0, z0, x1, z1 in self.tile_map.floor_rects():
+            start = mesh.vertex_count
+            mesh.quads([(x0, 0, z0), (x0, 0, z1), (x1, 0, z1), (x1, 0, z0)])
+            pieces.append((start, mesh.vertex_count))
+
+        # Walls starting from floor level, wherever a wall tile meets floor
+        mesh.set_color(*self.colors['walls'])
+        height = self.wall_height
+        for x0, z0, x1, z1 in self.tile_map.wall_faces():
+            start = mesh.vertex_count
+            mesh.quads([(x0, 0, z0), (x1, 0, z1), (x1, height, z1), (x0, height, z0)])
+            pieces.append((start, mesh.vertex_count))
+
+        for kind, x, z, angle in FURNITURE:
+            start = mesh.vertex_count
+            self.build_furniture(mesh, kind, x, z, angle)
+            pieces.append((start, mesh.vertex_count))
+
+        # Each piece goes to the chunk holding the centre of its bounding box
+        vertices = mesh.build()
+        chunks = {}
+        for start, end in pieces:
+            positions = vertices[start:end, :3]
+            center = (positions.min(axis=0) + positions.max(axis=0)) / 2
+            key = (math.floor(center[0] / WORLD_CHUNK_SIZE), math.floor(center[2] / WORLD_CHUNK_SIZE))
+            chunks.setdefault(key, []).append(np.arange(start, end))
+        chunk_vertices = [vertices[np.concatenate(indices)] for indices in chunks.values()]
+        mins = np.array([chunk[:, :3].min(axis=0) for chunk in chunk_vertices]).reshape(-1, 3)
+        maxs = np.array([chunk[:, :3].max(axis=0) for chunk in chunk_vertices]).reshape(-1, 3)
+        return chunk_vertices, mins, maxs
+
+    def draw(self, visible=None):
+        """Draw every chunk, or only those set in the `visible` mask"""
         # Set material properties
         glEnable(GL_COLOR_MATERIAL)
         glColorMaterial(GL_FRONT_AND_BACK, GL_AMBIENT_AND_DIFFUSE)
-      
-        # Draw floor at Y=0
-        glBegin(GL_QUADS)
-        glColor3f(*self.colors['floor'])
-        glNormal3f(0, 1, 0)
-        glVertex3f(-self.size, 0, -self.size)
-        glVertex3f(-self.size, 0, self.size)
-        glVertex3f(self.size, 0, self.size)
-        glVertex3f(self.size, 0, -self.size)
-        glEnd()
-      
-        # Draw walls starting from floor level
-        glBegin(GL_QUADS)
-        glColor3f(*self.colors['walls'])
-      
-        # Front wall
-        glVertex3f(-self.size, 0, -self.size)
-        glVertex3f(self.size, 0, -self.size)
-        glVertex3f(self.size, 2, -self.size)
-        glVertex3f(-self.size, 2, -self.size)
-      
-        # Back wall
-        glVertex3f(-self.size, 0, self.size)
-        glVertex3f(self.size, 0, self.size)
-        glVertex3f(self.size, 2, self.size)
-        glVertex3f(-self.size, 2, self.size)
-      
-        # Left wall
-        glVertex3f(-self.size, 0, -self.size)
-        glVertex3f(-self.size, 0, self.size)
-        glVertex3f(-self.size, 2, self.size)
-        glVertex3f(-self.size, 2, -self.size)
-      
-        # Right wall
-        glVertex3f(self.size, 0, -self.size)
-        glVertex3f(self.size, 0, self.size)
-        glVertex3f(self.size, 2, self.size)
-        glVertex3f(self.size, 2, -self.size)
-        glEnd()
-      
-        # Draw office furniture in a more realistic arrangement
-        # HR Area (left side)
-        self.draw_desk(-4, -2, 90)
-        self.draw_chair(-3.5, -2, 90)
-        self.draw_partition_walls(-4, -2)  # Add booth walls for HR
-      
-        # CEO Area (right side)
-        self.draw_desk(4, 1, -90)
-        self.draw_chair(3.5, 1, -90)
-        self.draw_partition_walls(4, 1)  # Add booth walls for CEO
-      
-        # Plants in corners (moved closer to walls)
-        self.draw_plant(-4.5, -4.5)
-        self.draw_plant(4.5, -4.5)
-        self.draw_plant(-4.5, 4.5)
-        self.draw_plant(4.5, 4.5)
-
-    def draw_partition_walls(self, x, z):
-        """Draw booth partition walls - all surfaces in solid gray"""
-        glColor3f(0.3, 0.3, 0.3)  # Solid gray for all walls
-      
+
+        if self.chunks is None:
+            self.chunks = [StaticMesh(vertices) for vertices in self.chunk_vertices]
+        for i, chunk in enumerate(self.chunks):
+            if visible is None or visible[i]:
+                chunk.draw()
+
+    def build_partition(self, mesh, x, z, angle=0):
+        """Booth partition walls - all surfaces in solid gray"""
+        mesh.set_color(*self.colors['partition'])  # Solid gray for all walls
+        mesh.push()
+        mesh.translate(x, 0, z)
+        mesh.rotate(angle, 0, 1, 0)
+
         # Back wall (smaller and thinner)
-        glPushMatrix()
-        glTranslatef(x, 0, z)
-        glScalef(0.05, 1.0, 1.0)  # Thinner wall, normal height, shorter length
-        draw_cube()  # Replace glutSolidCube with draw_cube
-        glPopMatrix()
-      
+        mesh.push()
+        mesh.scale(0.05, 1.0, 1.0)  # Thinner wall, normal height, shorter length
+        mesh.cube()
+        mesh.pop()
+
         # Side wall (smaller and thinner)
-        glPushMatrix()
-        glTranslatef(x, 0, z + 0.5)  # Moved closer
-        glRotatef(90, 0, 1, 0)
-        glScalef(0.05, 1.0, 0.8)  # Thinner wall, normal height, shorter length
-        draw_cube()  # Replace glutSolidCube with draw_cube
-        glPopMatrix()
+        mesh.push()
+        mesh.translate(0, 0, 0.5)  # Moved closer
+        mesh.rotate(90, 0, 1, 0)
+        mesh.scale(0.05, 1.0, 0.8)  # Thinner wall, normal height, shorter length
+        mesh.cube()
+        mesh.pop()
+
+        mesh.pop()
 
 class Player:
-    def __init__(self):
+    def __init__(self, collision):
+        self.collision = collision
+        self.radius = 0.3
         self.pos = [0, 0.5, 0]  # Lowered Y position to be just above floor
         self.rot = [0, 0, 0]
-        self.speed = 0.3
+        self.speed = 18.0  # Units per second (0.3 per frame at 60 FPS)
         self.mouse_sensitivity = 0.5
       
-    def move(self, dx, dz):
+    def move(self, dx, dz, dt):
         # Convert rotation to radians (negative because OpenGL uses clockwise rotation)
         angle = math.radians(-self.rot[1])
       
         # Calculate movement vector
-        move_x = (dx * math.cos(angle) + dz * math.sin(angle)) * self.speed
-        move_z = (-dx * math.sin(angle) + dz * math.cos(angle)) * self.speed
-      
-        # Calculate new position
-        new_x = self.pos[0] + move_x
-        new_z = self.pos[2] + move_z
+        move_x = (dx * math.cos(angle) + dz * math.sin(angle)) * self.speed * dt
+        move_z = (-dx * math.sin(angle) + dz * math.cos(angle)) * self.speed * dt
       
-        # Wall collision check (room is 10x10)
-        room_limit = 4.5  # Slightly less than room size/2 to prevent wall clipping
-        if abs(new_x) < room_limit:
-            self.pos[0] = new_x
-        if abs(new_z) < room_limit:
-            self.pos[2] = new_z
+        # Slide along walls, furniture and NPCs instead of walking through them
+        self.pos[0], self.pos[2] = self.collision.move_circle(self.pos[0], self.pos[2], move_x, move_z, self.radius)
 
     def update_rotation(self, dx, dy):
         # Multiply mouse movement by sensitivity for faster turning
         self.rot[1] += dx * self.mouse_sensitivity
 
-class NPC:
-    def __init__(self, x, y, z, role="HR"):
-        self.scale = 0.6  # Make NPCs smaller (about 60% of current size)
-        # Position them beside the desks, at ground level
-        # Adjust Y position to be half their height (accounting for scale)
-        self.pos = [x, 0.65, z]  # This puts their feet on the ground
-        self.size = 0.5
-        self.role = role
-      
-        # Enhanced color palette
-        self.skin_color = (0.8, 0.7, 0.6)  # Neutral skin tone
-        self.hair_color = (0.2, 0.15, 0.1) if role == "HR" else (0.3, 0.3, 0.3)  # Dark brown vs gray
-      
-        # Updated clothing colors
-        if role == "HR":
-            self.clothes_primary = (0.8, 0.2, 0.2)    # Bright red
-            self.clothes_secondary = (0.6, 0.15, 0.15) # Darker red
-        else:  # CEO
-            self.clothes_primary = (0.2, 0.3, 0.8)    # Bright blue
-            self.clothes_secondary = (0.15, 0.2, 0.6)  # Darker blue
-
-    def draw(self):
-        glPushMatrix()
-        glTranslatef(self.pos[0], self.pos[1], self.pos[2])
-        glScalef(self.scale, self.scale, self.scale)
-      
-        # Head
-        glColor3f(*self.skin_color)
-        draw_sphere(0.12, 16, 16)
-      
-        # Hair (slightly larger than head)
-        glColor3f(*self.hair_color)
-        glPushMatrix()
-        glTranslatef(0, 0.05, 0)  # Slightly above head
-        draw_sphere(0.13, 16, 16)
-        glPopMatrix()
-      
-        # Body (torso)
-        glColor3f(*self.clothes_primary)
-        glPushMatrix()
-        glTranslatef(0, -0.3, 0)  # Move down from head
-        glScalef(0.3, 0.4, 0.2)   # Make it rectangular
-        draw_cube()
-        glPopMatrix()
-      
-        # Arms
-        glColor3f(*self.clothes_secondary)
-        for x_offset in [-0.2, 0.2]:  # Left and right arms
-            glPushMatrix()
-            glTranslatef(x_offset, -0.3, 0)
-            glScalef(0.1, 0.4, 0.1)
-            draw_cube()
-            glPopMatrix()
-      
-        # Legs
-        glColor3f(*self.clothes_secondary)
-        for x_offset in [-0.1, 0.1]:  # Left and right legs
-            glPushMatrix()
-            glTranslatef(x_offset, -0.8, 0)
-            glScalef(0.1, 0.5, 0.1)
-            draw_cube()
-            glPopMatrix()
-      
-        glPopMatrix()
-
 class MenuScreen:
     def __init__(self):
         self.font_large = pygame.font.Font(None, 74)
@@ -986,50 +912,62 @@ class MenuScreen:
         self.font_small = pygame.font.Font(None, 36)
         self.active = True
         self.start_time = time.time()
-      
-    def render(self):
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-      
-        # Create a surface for 2D rendering
-        surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
-      
-        # Calculate vertical positions
-        center_y = WINDOW_HEIGHT // 2
-        title_y = center_y - 100
-        subtitle_y = center_y - 20
-        prompt_y = center_y + 100
-      
-        # Render title with "typing" effect
+        self.clock = pygame.time.Clock()
+
+        # Pre-render everything static once: title prefixes, subtitle, prompt and scanlines
+        self.title_surfaces = [self.font_large.render(TITLE[:i], True, MENU_TEXT_COLOR) for i in range(len(TITLE) + 1)]
+        self.subtitle_surface = self.font_medium.render(SUBTITLE, True, MENU_TEXT_COLOR)
+        self.prompt_surface = self.font_small.render("Press ENTER to start", True, MENU_TEXT_COLOR)
+        self.scanlines = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA, 32)
+        # Add some retro effects (scanlines)
+        for y in range(0, WINDOW_HEIGHT, 4):
+            pygame.draw.line(self.scanlines, (0, 50, 0), (0, y), (WINDOW_WIDTH, y))
+
+        # One persistent surface and texture, re-uploaded only when the animation state changes
+        self.surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA, 32)
+        self.texture = create_surface_texture(self.surface)
+        self.shown_state = None
+
+    def animation_state(self):
+        """Typing progress, subtitle fade and prompt blink at the current time"""
         elapsed_time = time.time() - self.start_time
         title_chars = int(min(len(TITLE), elapsed_time * 15))  # Type 15 chars per second
-        partial_title = TITLE[:title_chars]
-        title_surface = self.font_large.render(partial_title, True, MENU_TEXT_COLOR)
-        title_x = (WINDOW_WIDTH - title_surface.get_width()) // 2
-        surface.blit(title_surface, (title_x, title_y))
-      
-        # Render subtitle with fade-in effect
+        subtitle_alpha = 0
         if elapsed_time > len(TITLE) / 15:  # Start after title is typed
             subtitle_alpha = min(255, int((elapsed_time - len(TITLE) / 15) * 255))
-            subtitle_surface = self.font_medium.render(SUBTITLE, True, MENU_TEXT_COLOR)
-            subtitle_surface.set_alpha(subtitle_alpha)
-            subtitle_x = (WINDOW_WIDTH - subtitle_surface.get_width()) // 2
-            surface.blit(subtitle_surface, (subtitle_x, subtitle_y))
-      
-        # Render "Press ENTER" with blinking effect
+        prompt_visible = False
         if elapsed_time > (len(TITLE) / 15 + 1):  # Start after subtitle fade
-            if int(elapsed_time * 2) % 2:  # Blink every 0.5 seconds
-                prompt_text = "Press ENTER to start"
-                prompt_surface = self.font_small.render(prompt_text, True, MENU_TEXT_COLOR)
-                prompt_x = (WINDOW_WIDTH - prompt_surface.get_width()) // 2
-                surface.blit(prompt_surface, (prompt_x, prompt_y))
-      
-        # Add some retro effects (scanlines)
-        for y in range(0, WINDOW_HEIGHT, 4):
-            pygame.draw.line(surface, (0, 50, 0), (0, y), (WINDOW_WIDTH, y))
-      
-        # Convert surface to OpenGL texture
-        texture_data = pygame.image.tostring(surface, "RGBA", True)
-      
+            prompt_visible = bool(int(elapsed_time * 2) % 2)  # Blink every 0.5 seconds
+        return title_chars, subtitle_alpha, prompt_visible
+
+    def compose(self, title_chars, subtitle_alpha, prompt_visible):
+        """Redraw the menu surface from the pre-rendered layers"""
+        # Calculate vertical positions
+        center_y = WINDOW_HEIGHT // 2
+        title_y = center_y - 100
+        subtitle_y = center_y - 20
+        prompt_y = center_y + 100
+
+        self.surface.fill((0, 0, 0, 0))
+        title_surface = self.title_surfaces[title_chars]
+        self.surface.blit(title_surface, ((WINDOW_WIDTH - title_surface.get_width()) // 2, title_y))
+        if subtitle_alpha:
+            self.subtitle_surface.set_alpha(subtitle_alpha)
+            self.surface.blit(self.subtitle_surface, ((WINDOW_WIDTH - self.subtitle_surface.get_width()) // 2, subtitle_y))
+        if prompt_visible:
+            self.surface.blit(self.prompt_surface, ((WINDOW_WIDTH - self.prompt_surface.get_width()) // 2, prompt_y))
+        self.surface.blit(self.scanlines, (0, 0))
+
+    def render(self):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        state = self.animation_state()
+        if state != self.shown_state:
+            self.compose(*state)
+            upload_surface_rows(self.surface, 0, WINDOW_HEIGHT)
+            self.shown_state = state
+
         # Set up orthographic projection for 2D rendering
         glMatrixMode(GL_PROJECTION)
         glLoadIdentity()
@@ -1037,44 +975,121 @@ class MenuScreen:
         glMatrixMode(GL_MODELVIEW)
         glLoadIdentity()
 
-        # Render the texture in OpenGL
-        texture = glGenTextures(1)
-        glBindTexture(GL_TEXTURE_2D, texture)
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, WINDOW_WIDTH, WINDOW_HEIGHT, 0, GL_RGBA, GL_UNSIGNED_BYTE, texture_data)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-      
-        # Draw the texture
+        # Draw the texture; row 0 of the texture is the top of the screen
         glEnable(GL_TEXTURE_2D)
         glBegin(GL_QUADS)
-        glTexCoord2f(0, 1); glVertex2f(0, 0)
-        glTexCoord2f(1, 1); glVertex2f(WINDOW_WIDTH, 0)
-        glTexCoord2f(1, 0); glVertex2f(WINDOW_WIDTH, WINDOW_HEIGHT)
-        glTexCoord2f(0, 0); glVertex2f(0, WINDOW_HEIGHT)
+        glTexCoord2f(0, 0); glVertex2f(0, 0)
+        glTexCoord2f(1, 0); glVertex2f(WINDOW_WIDTH, 0)
+        glTexCoord2f(1, 1); glVertex2f(WINDOW_WIDTH, WINDOW_HEIGHT)
+        glTexCoord2f(0, 1); glVertex2f(0, WINDOW_HEIGHT)
         glEnd()
         glDisable(GL_TEXTURE_2D)
-      
-        # Reset OpenGL state for 3D rendering
+
+        # Reset OpenGL state for 3D rendering, camera offset included
+        load_camera(*camera_matrices())
+        glEnable(GL_DEPTH_TEST)
+
+        pygame.display.flip()
+        self.clock.tick(FPS)  # The menu has nothing to do between frames
+
+    def close(self):
+        """Release the menu texture once the game has started"""
+        if self.texture:
+            glDeleteTextures([self.texture])
+            self.texture = None
+
+class FrameStatsOverlay:
+    """F2 overlay with frame-time percentiles per stage, refreshed twice a second"""
+    def __init__(self, timer):
+        self.timer = timer
+        self.visible = False
+        self.font = pygame.font.Font(None, 20)
+        self.surface = pygame.Surface((280, 20 * (len(timer.stages) + 3)), pygame.SRCALPHA, 32)
+        self.texture = create_surface_texture(self.surface)
+        self.last_update = 0
+        self.counters = ""  # Extra line below the table
+
+    def update(self):
+        self.surface.fill((0, 0, 0, 180))
+        self.surface.blit(self.font.render("ms        p50     p95     p99", True, WHITE), (8, 4))
+        stats = self.timer.percentiles()
+        for i, stage in enumerate(("frame",) + tuple(self.timer.stages)):
+            if stage in stats:
+                line = f"{stage:<8}" + "".join(f"{value:8.2f}" for value in stats[stage])
+                self.surface.blit(self.font.render(line, True, WHITE), (8, 24 + i * 20))
+        if self.counters:
+            self.surface.blit(self.font.render(self.counters, True, WHITE), (8, 24 + (len(self.timer.stages) + 1) * 20))
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        upload_surface_rows(self.surface, 0, self.surface.get_height())
+
+    def render(self):
+        if not self.visible:
+            return
+        if time.time() - self.last_update >= 0.5:
+            self.update()
+            self.last_update = time.time()
+
+        glPushAttrib(GL_ALL_ATTRIB_BITS)
         glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
         glLoadIdentity()
-        gluPerspective(45, (WINDOW_WIDTH / WINDOW_HEIGHT), 0.1, 50.0)
+        glOrtho(0, WINDOW_WIDTH, 0, WINDOW_HEIGHT, -1, 1)
         glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
         glLoadIdentity()
-        glEnable(GL_DEPTH_TEST)
+        glDisable(GL_DEPTH_TEST)
+        glDisable(GL_LIGHTING)
+        glEnable(GL_TEXTURE_2D)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glColor4f(1, 1, 1, 1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
 
-        pygame.display.flip()
+        # Top-left corner of the window
+        width, height = self.surface.get_size()
+        top = WINDOW_HEIGHT - 10
+        glBegin(GL_QUADS)
+        glTexCoord2f(0, 1); glVertex2f(10, top - height)
+        glTexCoord2f(1, 1); glVertex2f(10 + width, top - height)
+        glTexCoord2f(1, 0); glVertex2f(10 + width, top)
+        glTexCoord2f(0, 0); glVertex2f(10, top)
+        glEnd()
+
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+        glPopMatrix()
+        glPopAttrib()
 
 # Modify the Game3D class to include the menu
 class Game3D:
-    def __init__(self):
-        self.menu = MenuScreen()
-        self.player = Player()
-        self.world = World()
-        self.dialogue = DialogueSystem()
-        self.hr_npc = NPC(-3.3, 0, -2, "HR")  # Moved beside the desk
-        self.ceo_npc = NPC(3.3, 0, 1, "CEO")  # Moved beside the desk
+    def __init__(self, headless=False):
+        # Headless games have no window: no menu, overlays or rendering, just the simulation
+        self.headless = headless
+        self.menu = None if headless else MenuScreen()
+        self.tile_map = TileMap(GAME_MAP, MAP_TILE_SIZE)
+        self.world = World(self.tile_map)
+        self.dialogue = DialogueSystem(headless)
+        self.npcs = NPCCrowd.load(NPC_ROSTER)
+
+        # Collision grid: map walls plus furniture and NPC footprints
+        self.collision = CollisionGrid(self.tile_map)
+        for footprint in self.world.footprints():
+            self.collision.block_rect(*footprint)
+        for x, _, z in self.npcs.positions:
+            self.collision.block_rect(x - 0.2, z - 0.2, x + 0.2, z + 0.2)
+        self.player = Player(self.collision)
         self.interaction_distance = 2.0
-        self.last_interaction_time = 0
+        # The NPC from the last conversation can't start another until the player walks this far away
+        self.exit_distance = 3.0
+        self.engaged_npc = None
+        self.clock = pygame.time.Clock()
+        self.frame_timer = FrameTimer(FRAME_STAGES)
+        self.frame_stats = None if headless else FrameStatsOverlay(self.frame_timer)
+
+        # View-frustum and distance culling
+        self.objects_submitted = 0
+        self.objects_culled = 0
                  
     def move_player_away_from_npc(self, npc_pos):
         # Calculate direction vector from NPC to player
@@ -1091,18 +1106,64 @@ class Game3D:
         self.player.pos[0] = npc_pos[0] + (dx * 3)
         self.player.pos[2] = npc_pos[2] + (dz * 3)
 
-    def run(self):
+    def run(self, max_frames=None):
         running = True
+        frames = 0
+        accumulator = 0.0
+        previous = time.perf_counter()
         while running:
             if self.menu.active:
                 running = self.handle_menu_events()
+                if frames == 0:
+                    print(f"[Startup] First menu frame {(time.perf_counter() - LAUNCH_TIME) * 1000:.0f} ms after launch")
+                previous = time.perf_counter()
             else:
+                # Fixed-timestep simulation: update in SIMULATION_STEP increments, render once per frame
+                now = time.perf_counter()
+                accumulator += min(now - previous, MAX_FRAME_TIME)
+                previous = now
+
+                timer = self.frame_timer
+                timer.begin_frame()
                 running = self.handle_game_events()
-                self.update_game_state()
+                timer.mark("events")
+                while accumulator >= SIMULATION_STEP:
+                    self.update_game_state(SIMULATION_STEP, pygame.key.get_pressed())
+                    accumulator -= SIMULATION_STEP
+                timer.mark("update")
                 self.render_game()
+                self.clock.tick(FPS)
+                timer.mark("wait")
+                timer.end_frame()
+
+            frames += 1
+            if max_frames is not None and frames >= max_frames:
+                running = False
 
+        self.dialogue.speech_handler.close()
         pygame.quit()
 
+    def run_headless(self, steps):
+        """Run the simulation without a display: the player walks in a slow circle, ending each conversation at once"""
+        keys = defaultdict(bool, {pygame.K_w: True})
+        conversations = 0
+        started = time.perf_counter()
+        for _ in range(steps):
+            self.player.rot[1] = (self.player.rot[1] + 0.5) % 360
+            self.update_game_state(SIMULATION_STEP, keys)
+            if self.dialogue.active:
+                conversations += 1
+                self.dialogue.end_conversation()
+        elapsed = time.perf_counter() - started
+        print(f"[Headless] {steps} steps ({steps * SIMULATION_STEP:.0f} s of game time) in {elapsed:.2f} s, "
+              f"{conversations} conversations, player at ({self.player.pos[0]:.2f}, {self.player.pos[2]:.2f})")
+        self.dialogue.speech_handler.close()
+
+    def dump_frame_times(self):
+        path = time.strftime("frame_times_%Y%m%d_%H%M%S.csv")
+        frames = self.frame_timer.dump_csv(path)
+        print(f"[Game3D] Wrote {frames} frame timings to {path}")
+
     def handle_menu_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
@@ -1110,8 +1171,10 @@ class Game3D:
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_RETURN:
                     self.menu.active = False
+                    self.menu.close()
                     pygame.mouse.set_visible(False)
                     pygame.event.set_grab(True)
+                    return True
                 elif event.key == pygame.K_ESCAPE:
                     return False
         self.menu.render()
@@ -1126,10 +1189,17 @@ class Game3D:
                     pygame.mouse.set_visible(True)
                     pygame.event.set_grab(False)
                     return False
-                if self.dialogue.active:
+                # Frame-time overlay on F2, CSV dump of the recent frames on F4
+                if event.key == pygame.K_F2:
+                    self.frame_stats.visible = not self.frame_stats.visible
+                elif event.key == pygame.K_F4:
+                    self.dump_frame_times()
+                elif self.dialogue.active:
                     self.handle_dialogue_input(event)
             elif event.type == pygame.MOUSEMOTION:
                 self.handle_mouse_motion(event)
+            elif event.type == NPC_REPLY_EVENT:
+                self.dialogue.handle_reply(event)
         return True
 
     def handle_dialogue_input(self, event):
@@ -1142,69 +1212,118 @@ class Game3D:
         x, y = event.rel
         self.player.update_rotation(x, y)
 
-    def update_game_state(self):
+    def update_game_state(self, dt, keys):
         if not self.dialogue.active:
-            self.handle_player_movement()
+            self.handle_player_movement(dt, keys)
         self.check_npc_interactions()
 
-    def handle_player_movement(self):
-        keys = pygame.key.get_pressed()
-        if keys[pygame.K_w]: self.player.move(0, -1)
-        if keys[pygame.K_s]: self.player.move(0, 1)
-        if keys[pygame.K_a]: self.player.move(-1, 0)
-        if keys[pygame.K_d]: self.player.move(1, 0)
+    def handle_player_movement(self, dt, keys):
+        if keys[pygame.K_w]: self.player.move(0, -1, dt)
+        if keys[pygame.K_s]: self.player.move(0, 1, dt)
+        if keys[pygame.K_a]: self.player.move(-1, 0, dt)
+        if keys[pygame.K_d]: self.player.move(1, 0, dt)
 
     def check_npc_interactions(self):
-        current_time = time.time()
-        if current_time - self.last_interaction_time > 0.5:
-            self.check_npc_distance(self.hr_npc, "HR")
-            self.check_npc_distance(self.ceo_npc, "CEO")
-
-    def check_npc_distance(self, npc, role):
-        dx = self.player.pos[0] - npc.pos[0]
-        dz = self.player.pos[2] - npc.pos[2]
-        distance = math.sqrt(dx * dx + dz * dz)
-        if distance < self.interaction_distance and not self.dialogue.active:
-            self.dialogue.start_conversation(role, self.player.pos)
-            self.last_interaction_time = time.time()
+        if self.engaged_npc is not None and \
+                self.npcs.distance_to(self.engaged_npc, self.player.pos) > self.exit_distance:
+            self.engaged_npc = None
+        if self.dialogue.active:
+            return
+        index, _ = self.npcs.nearest(self.player.pos, self.interaction_distance, exclude=self.engaged_npc)
+        if index is not None:
+            self.engaged_npc = index
+            self.dialogue.start_conversation(self.npcs.roles[index], self.player.pos)
+
+    def camera(self):
+        """This frame's projection and view matrices"""
+        return camera_matrices(self.player.rot, self.player.pos)
+
+    def cull(self, camera=None):
+        """Test every world chunk and NPC against the view frustum and draw distance; returns both masks"""
+        projection, view = camera or self.camera()
+        planes = frustum_planes(projection @ view)
+        eye = np.linalg.inv(view)[:3, 3]
+        world_visible = visible_boxes(planes, self.world.chunk_mins, self.world.chunk_maxs, eye, DRAW_DISTANCE)
+        centers, radii = self.npcs.bounds()
+        npcs_visible = visible_spheres(planes, centers, radii, eye, DRAW_DISTANCE)
+
+        self.objects_submitted = int(world_visible.sum() + npcs_visible.sum())
+        self.objects_culled = len(world_visible) + len(npcs_visible) - self.objects_submitted
+        return world_visible, npcs_visible
 
     def render_game(self):
+        timer = self.frame_timer
+        camera = self.camera()
+        world_visible, npcs_visible = self.cull(camera)
+        timer.mark("cull")
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-        glPushMatrix()
-        self.apply_player_transformations()
-        self.world.draw()
-        self.hr_npc.draw()
-        self.ceo_npc.draw()
-        glPopMatrix()
+        # Load the matrices culling used rather than building on whatever the GL stack holds
+        load_camera(*camera)
+        self.world.draw(world_visible)
+        timer.mark("world")
+        self.npcs.draw(self.player.pos, npcs_visible)
+        timer.mark("npcs")
         self.dialogue.render()
+        self.frame_stats.counters = f"objects {self.objects_submitted} drawn, {self.objects_culled} culled"
+        self.frame_stats.render()
+        timer.mark("ui")
         pygame.display.flip()
-        pygame.time.Clock().tick(60)
-
-    def apply_player_transformations(self):
-        glRotatef(self.player.rot[0], 1, 0, 0)
-        glRotatef(self.player.rot[1], 0, 1, 0)
-        glTranslatef(-self.player.pos[0], -self.player.pos[1], -self.player.pos[2])
+        timer.mark("flip")
 
 class SpeechHandler:
     def __init__(self):
         self.ws = None
-        self.audio_queue = Queue()
+        # Background event loop that owns the WebSocket and the utterance queue
+        self.loop = None
+        self.utterances = None
+        self.consumer = None
         self.is_recording = False
         self.stream = None
         self.sample_rate = 16000
         self.chunk_size = 1024
         self.connection_timeout = 5
-        self.silence_threshold = 0.01
+        self.response_timeout = 30  # Longest wait for the next message of a reply before giving up on it
+        self.stream_seconds = 0.5  # Speech is sent to the server in blocks of this length while it goes on
+        # Longer speech (or steady noise the VAD takes for speech) is cut off and answered;
+        # the VAD then has to see the end of it before a new utterance can start
+        self.max_utterance_seconds = 15
         self.speaking = False
-        self.audio_buffer = []
+        self.vad = VoiceActivityDetector(sample_rate=self.sample_rate, hangover_ms=600, preroll_ms=200)
+        # Preallocated capture buffer, only ever written by the audio callback.
+        # Every block is kept (not just loud ones) so the pre-roll before an onset is available.
+        self.stream_samples = int(self.stream_seconds * self.sample_rate)
+        self.audio_buffer = AudioRingBuffer(4 * self.stream_samples + self.vad.preroll)
+        self.utterance_start = 0
+        self.sent_position = 0  # Everything before this has been handed to the consumer
+        self.protocol = audio_protocol.LEGACY_PROTOCOL_VERSION
+        self.codec = audio_protocol.CODEC_PCM_F32  # Microphone codec agreed with the server
+        self.player = StreamingAudioPlayer()
+        self.barge_in = True  # Talking over the NPC cuts its reply off
+        self.barge_in_ratio = 4.0  # How much louder than the NPC's playback the voice must be to cut it off
+        self.barged_in = False
+        self.npc_role = None  # Who the player is talking to, set by the dialogue system
+        self.server_npc_role = None  # The persona the server is currently using
+
+    def start_loop(self):
+        """Start the long-lived asyncio loop that sends utterances and plays replies"""
+        if self.loop:
+            return
+        self.loop = asyncio.new_event_loop()
+        self.utterances = asyncio.Queue()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.consumer = asyncio.run_coroutine_threadsafe(self.process_audio_stream(), self.loop)
 
     def start_record(self):
         """Start recording audio"""
         try:
+            self.start_loop()
             if not self.is_recording:
                 self.is_recording = True
                 self.speaking = False
-                self.audio_buffer = []
+                self.audio_buffer.clear()
+                self.vad.reset()
+                self.utterance_start = self.sent_position = 0
+                import sounddevice as sd
                 self.stream = sd.InputStream(
                     samplerate=self.sample_rate,
                     channels=1,
@@ -1223,35 +1342,61 @@ class SpeechHandler:
         try:
             if self.is_recording and self.stream:
                 self.is_recording = False
-                self.speaking = False
-                if len(self.audio_buffer) > 0:
-                    self.audio_queue.put(np.array(self.audio_buffer))
-                self.audio_buffer = []
+                # Stop the callback before touching the buffer from this thread
                 self.stream.stop()
                 self.stream.close()
                 self.stream = None
+                for _, position in self.vad.flush():
+                    if self.speaking:
+                        self.finish_utterance(position)
+                self.speaking = False
                 print("Recording stopped")
         except Exception as e:
             print(f"Error stopping recording: {e}")
 
+    def send_buffered(self, end):
+        """Hand the unsent audio up to end to the consumer"""
+        if end > self.sent_position:
+            # Wake the consumer on its own loop; this may run on the PortAudio thread
+            self.loop.call_soon_threadsafe(self.utterances.put_nowait, self.audio_buffer.read(self.sent_position, end))
+            self.sent_position = end
+
+    def finish_utterance(self, end):
+        """Send the rest of the utterance, then the marker that ends it"""
+        self.send_buffered(end)
+        self.loop.call_soon_threadsafe(self.utterances.put_nowait, None)
+
     def audio_callback(self, indata, frames, time, status):
         """Callback for audio input"""
         if status:
             print(f"Audio callback status: {status}")
 
         if self.is_recording:
-            # Calculate audio level
-            audio_level = np.max(np.abs(indata))
-            if audio_level > self.silence_threshold:
-                print(f"Speaking detected! Level: {audio_level:.2f}")
-                self.speaking = True
-                self.audio_buffer.extend(indata.flatten())
-            elif self.speaking and audio_level <= self.silence_threshold:
-                print("Speech ended, processing buffer...")
+            self.audio_buffer.write(indata)
+            for event, position in self.vad.process(indata):
+                if event == "start":
+                    if self.player.is_playing:
+                        # Echo of the reply reaches the mic quieter than it is played, so only a louder
+                        # voice counts; anything else heard during playback opens no utterance
+                        if not (self.barge_in
+                                and np.mean(np.square(indata)) > self.barge_in_ratio * self.player.level):
+                            continue
+                        self.barged_in = True
+                        self.player.interrupt()
+                    print("Speaking detected!")
+                    self.speaking = True
+                    self.utterance_start = self.sent_position = position
+                elif self.speaking:  # Not already cut off at max_utterance_seconds
+                    print("Speech ended, processing buffer...")
+                    self.speaking = False
+                    self.finish_utterance(position)
+            written = self.audio_buffer.written
+            if self.speaking and written - self.utterance_start >= self.max_utterance_seconds * self.sample_rate:
+                print("Utterance too long, processing buffer...")
                 self.speaking = False
-                if len(self.audio_buffer) > 0:
-                    self.audio_queue.put(np.array(self.audio_buffer))
-                    self.audio_buffer = []
+                self.finish_utterance(written)
+            elif self.speaking and written - self.sent_position >= self.stream_samples:
+                self.send_buffered(written)
 
     async def connect_websocket(self):
         """Connect to the WebSocket server"""
@@ -1262,90 +1407,190 @@ class SpeechHandler:
                 timeout=self.connection_timeout
             )
             print("Connected to WebSocket server")
+            self.server_npc_role = None
+            await self.negotiate_protocol()
         except Exception as e:
             print(f"Failed to connect to WebSocket server: {e}")
             raise
 
-    async def process_audio_stream(self):
-        """Process and send audio data to the WebSocket server"""
+    async def negotiate_protocol(self):
+        """Agree on the audio framing and codec with the server, falling back to legacy hex-in-JSON"""
+        self.protocol = audio_protocol.LEGACY_PROTOCOL_VERSION
+        self.codec = audio_protocol.CODEC_PCM_F32
+        await self.ws.send(audio_protocol.hello_message())
         try:
-            if not self.ws:
-                await self.connect_websocket()
-
-            while True:
-                if not self.audio_queue.empty():
-                    audio_chunk = self.audio_queue.get()
-                    print(f"Processing audio chunk of size: {len(audio_chunk)}")
-
-                    try:
-                        # Send the audio chunk
-                        await self.ws.send(json.dumps({
-                            "type": "audio_chunk",
-                            "chunk": audio_chunk.tobytes().hex()
-                        }))
-                        print("Audio chunk sent")
-
-                        # Send end-of-audio signal
-                        await self.ws.send(json.dumps({"type": "end_of_audio"}))
-                        print("End-of-audio signal sent")
-
-                        # Wait for response
-                        response = await self.ws.recv()
-                        print("Received response from server")
-                        data = json.loads(response)
-
-                        if data.get("type") == "audio_response":
-                            print("Processing audio response...")
-                            try:
-                                # Convert hex string to bytes
-                                audio_data = bytes.fromhex(data["audio"])
-
-                                # Save to temporary WAV file
-                                temp_file = "temp_response.wav"
-                                with open(temp_file, "wb") as f:
-                                    f.write(audio_data)
-
-                                try:
-                                    # Play the audio
-                                    print("Playing audio response...")
-                                    audio_data, sr = sf.read(temp_file)
-                                    sd.play(audio_data, sr)
-                                    sd.wait()  # Wait until audio is finished playing
-                                    print("Audio played successfully")
-                                except Exception as e:
-                                    print(f"Error playing audio: {e}")
-                                finally:
-                                    # Clean up temporary file
-                                    if os.path.exists(temp_file):
-                                        os.remove(temp_file)
-                                        print("Temporary file cleaned up")
-
-                            except Exception as e:
-                                print(f"Error processing audio response: {e}")
-
-                    except Exception as e:
-                        print(f"Error in WebSocket communication: {e}")
+            reply = await asyncio.wait_for(self.ws.recv(), timeout=self.connection_timeout)
+            data = json.loads(reply)
+            if data.get("type") == "hello":
+                self.protocol = audio_protocol.negotiate(data.get("protocol"))
+                self.codec = audio_protocol.choose_codec(data.get("codecs"))
+        except asyncio.TimeoutError:
+            print("Server did not answer hello, using legacy protocol")
+        print(f"Using audio protocol version {self.protocol}, codec {audio_protocol.codec_name(self.codec)}")
+
+    async def send_audio_chunk(self, audio_chunk):
+        """Send microphone audio using the negotiated framing and codec"""
+        audio_chunk = np.ascontiguousarray(audio_chunk, dtype=np.float32)
+        if self.protocol >= 2:
+            if self.codec in audio_protocol.COMPRESSED_CODECS:
+                # Encoding takes milliseconds per second of audio; keep it off the loop that plays replies
+                payload = await asyncio.to_thread(audio_protocol.encode_audio, audio_chunk, self.codec, self.sample_rate)
+            else:
+                payload = audio_protocol.encode_audio(audio_chunk, self.codec, self.sample_rate)
+            await self.ws.send(audio_protocol.pack_frame(
+                audio_protocol.AUDIO_CHUNK,
+                payload,
+                codec=self.codec,
+                sample_rate=self.sample_rate
+            ))
+        else:
+            await self.ws.send(json.dumps({
+                "type": "audio_chunk",
+                "chunk": audio_chunk.tobytes().hex()
+            }))
+
+    def decode_audio_response(self, message):
+        """Extract TTS audio bytes from a server message, or None if it isn't audio"""
+        if isinstance(message, bytes):
+            frame = audio_protocol.unpack_frame(message)
+            if frame.kind == audio_protocol.AUDIO_RESPONSE:
+                return frame.payload
+            return None
+        data = json.loads(message)
+        if data.get("type") == "audio_response":
+            return bytes.fromhex(data["audio"])
+        return None
+
+    async def receive_response(self):
+        """Receive the NPC reply, queueing each audio piece for playback as soon as it arrives"""
+        self.barged_in = False
+        while True:
+            response = await asyncio.wait_for(self.ws.recv(), timeout=self.response_timeout)
+            audio_data = self.decode_audio_response(response)
+            if audio_data is not None:
+                print("Received audio response from server")
+                if not self.barged_in:
+                    await self.play_audio_response(audio_data)
+                if self.protocol < 3:
+                    self.player.end_of_stream()
+                    return  # Older servers send the whole reply as a single message
+                continue
+
+            data = json.loads(response)
+            if data.get("type") == "transcript":
+                print(f"Server heard: {data['text']}")
+            elif data.get("type") == "end_of_response":
+                self.player.end_of_stream()
+                if data.get("error"):
+                    print(f"Server could not answer: {data['error']}")
+                print(f"Response complete, timings: {data.get('timings')}, "
+                      f"underruns: {self.player.underruns}, interruptions: {self.player.interruptions}")
+                return
 
-                if not self.is_recording:
-                    break
+    async def play_audio_response(self, audio_data):
+        """Decode one piece of TTS audio and queue it on the player"""
+        try:
+            # Decode straight from memory, on a worker thread since Opus and FLAC take a while
+            audio_data, sr = await asyncio.to_thread(sf.read, io.BytesIO(audio_data), dtype='float32')
+            self.player.feed(audio_data, sr)
+        except Exception as e:
+            print(f"Error playing audio: {e}")
 
-                await asyncio.sleep(0.1)
+    def greet(self, role):
+        """Have the server speak the NPC's greeting, in order with any utterances already queued"""
+        if self.loop:
+            self.loop.call_soon_threadsafe(self.utterances.put_nowait, role)
 
-        except Exception as e:
-            print(f"Error in audio processing: {e}")
-        finally:
-            if self.ws:
+    async def process_audio_stream(self):
+        """Stream each utterance to the WebSocket server while it is spoken, then wait for the reply"""
+        while True:
+            audio_chunk = await self.utterances.get()
+
+            try:
+                if not self.ws:
+                    await self.connect_websocket()
+
+                # A role instead of audio asks for that NPC's greeting, which the server has pre-synthesized
+                if isinstance(audio_chunk, str):
+                    if self.protocol >= 3:
+                        await self.ws.send(json.dumps({"type": "npc", "role": audio_chunk, "greet": True}))
+                        self.server_npc_role = audio_chunk
+                        await self.receive_response()
+                    continue
+
+                # None marks the end of the utterance whose audio has already been sent
+                if audio_chunk is not None:
+                    # Switching NPC starts a new conversation with that persona on the server
+                    if self.npc_role != self.server_npc_role:
+                        await self.ws.send(json.dumps({"type": "npc", "role": self.npc_role}))
+                        self.server_npc_role = self.npc_role
+                    await self.send_audio_chunk(audio_chunk)
+                    print(f"Audio chunk of size {len(audio_chunk)} sent")
+                    continue
+
+                # Send end-of-audio signal
+                await self.ws.send(json.dumps({"type": "end_of_audio"}))
+                print("End-of-audio signal sent")
+
+                # Wait for response
+                await self.receive_response()
+
+            except websockets.exceptions.ConnectionClosed as e:
+                print(f"WebSocket connection lost, will reconnect on next utterance: {e}")
+                self.ws = None
+            except asyncio.TimeoutError:
+                # A late reply would be mistaken for the next one, so start over on a fresh connection
+                print(f"No reply from server within {self.response_timeout}s, reconnecting on next utterance")
+                self.player.end_of_stream()
                 await self.ws.close()
-                print("WebSocket connection closed")
+                self.ws = None
+            except Exception as e:
+                print(f"Error in WebSocket communication: {e}")
+
+    def close(self):
+        """Stop recording and shut down the connection and background loop"""
+        self.stop_record()
+        self.player.close()
+        if self.loop:
+            try:
+                if self.ws:
+                    asyncio.run_coroutine_threadsafe(self.ws.close(), self.loop).result(self.connection_timeout)
+                    print("WebSocket connection closed")
+            except Exception as e:
+                print(f"Error closing WebSocket connection: {e}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.loop = None
 
-    async def __aiter__(self):
-        """Make the class an async iterator"""
-        try:
-            async for result in self.process_audio_stream():
-                yield result
-        except Exception as e:
-            print(f"Error in audio iterator: {e}")
-      
 # Create and run game
-game = Game3D()
-game.run()
\ No newline at end of file
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Venture Builder AI office")
+    parser.add_argument("--headless", action="store_true",
+                        help="run the simulation without a window, audio or chat requests")
+    parser.add_argument("--frames", type=int,
+                        help="quit after this many frames (headless: simulation steps, default 3600)")
+    args = parser.parse_args(argv)
+
+    # Load environment variables
+    load_dotenv()
+
+    if args.headless:
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        pygame.init()
+        Game3D(headless=True).run_headless(args.frames or 3600)
+        return
+
+    # Ensure OpenAI API Key is loaded
+    if not os.getenv('OPENAI_API_KEY'):
+        print("[OpenAI] API key not found. Please set OPENAI_API_KEY in your .env file.")
+        sys.exit(1)
+    print("[OpenAI] API key loaded successfully.")
+
+    # os.environ['SDL_VIDEODRIVER'] = 'cocoa'  # Use native macOS window system
+    os.environ.setdefault('SDL_VIDEODRIVER', 'x11')
+    init_display()
+    game = Game3D()
+    game.run(args.frames)
+
+
+if __name__ == "__main__":
+    main()
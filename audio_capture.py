@@ -0,0 +1,136 @@
+import numpy as np
+
+
+class AudioRingBuffer:
+    """Preallocated float32 ring buffer written by a single producer (the PortAudio callback).
+
+    Positions are absolute sample counts, so the producer can remember where an utterance
+    started and copy it out in one go when it ends. Only `read` allocates.
+    """
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.data = np.zeros(self.capacity, dtype=np.float32)
+        self.written = 0  # Total samples ever written
+
+    def write(self, samples):
+        """Append a block of samples, overwriting the oldest ones once full"""
+        samples = samples.reshape(-1)
+        count = len(samples)
+        if count > self.capacity:
+            samples = samples[-self.capacity:]
+        start = (self.written + count - len(samples)) % self.capacity
+        end = start + len(samples)
+        if end <= self.capacity:
+            self.data[start:end] = samples
+        else:
+            split = self.capacity - start
+            self.data[start:] = samples[:split]
+            self.data[:end - self.capacity] = samples[split:]
+        self.written += count
+
+    def read(self, start, end=None):
+        """Copy the samples between two absolute positions (clamped to what is still buffered)"""
+        end = self.written if end is None else min(end, self.written)
+        start = max(start, end - self.capacity, 0)
+        count = max(end - start, 0)
+        out = np.empty(count, dtype=np.float32)
+        begin = start % self.capacity
+        first = min(count, self.capacity - begin)
+        out[:first] = self.data[begin:begin + first]
+        out[first:] = self.data[:count - first]
+        return out
+
+    def clear(self):
+        self.written = 0
+
+
+class VoiceActivityDetector:
+    """Frame energy + zero-crossing-rate VAD with an adaptive noise floor, hangover and pre-roll.
+
+    Feed it consecutive blocks of the capture stream. It returns ("start", position) when an
+    utterance begins and ("end", position) when it ends, as absolute sample positions in the
+    stream, so they line up with AudioRingBuffer positions when both see the same blocks.
+    """
+    def __init__(self, sample_rate=16000, frame_ms=20, threshold_ratio=4.0, min_energy=1e-5,
+                 max_zcr=0.35, onset_ms=60, hangover_ms=600, preroll_ms=200, noise_rise=0.02):
+        self.frame_size = sample_rate * frame_ms // 1000
+        self.threshold_ratio = threshold_ratio  # Speech must be this much louder than the noise floor
+        self.min_energy = min_energy
+        self.max_zcr = max_zcr  # Broadband noise crosses zero far more often than voiced speech
+        self.onset_frames = max(1, onset_ms // frame_ms)
+        self.hangover = sample_rate * hangover_ms // 1000
+        self.preroll = sample_rate * preroll_ms // 1000
+        self.noise_rise = noise_rise  # How quickly the floor follows louder background noise
+        self.reset()
+
+    def reset(self):
+        self.position = 0  # Stream position of the first sample in self.remainder
+        self.remainder = np.empty(0, dtype=np.float32)
+        self.noise_floor = None
+        self.speaking = False
+        self.run = 0
+        self.last_speech_end = 0
+
+    def frame_features(self, frames):
+        """Mean energy and zero-crossing rate of each row of a (frames, frame_size) array"""
+        energy = np.mean(np.square(frames), axis=1)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_size - 1)
+        return energy, zcr
+
+    def update_noise_floor(self, energy):
+        # The quietest frame in a block is a good noise estimate even mid-utterance.
+        # Drop quickly towards quieter levels, rise slowly towards louder ones.
+        quietest = max(float(energy.min()), self.min_energy / self.threshold_ratio)
+        if self.noise_floor is None:
+            self.noise_floor = quietest
+        elif quietest < self.noise_floor:
+            self.noise_floor += 0.5 * (quietest - self.noise_floor)
+        else:
+            # Blocks that look like speech only nudge the floor, so long utterances don't raise it
+            rate = self.noise_rise
+            if quietest > self.noise_floor * self.threshold_ratio:
+                rate *= 0.05
+            self.noise_floor += rate * (quietest - self.noise_floor)
+
+    def process(self, block):
+        """Run the detector over one block of samples and return any start/end events"""
+        samples = block.reshape(-1)
+        if self.remainder.size:
+            samples = np.concatenate((self.remainder, samples))
+        count = len(samples) // self.frame_size
+        frames = samples[:count * self.frame_size].reshape(count, self.frame_size)
+        self.remainder = samples[count * self.frame_size:].copy()
+        if not count:
+            return []
+
+        energy, zcr = self.frame_features(frames)
+        self.update_noise_floor(energy)
+        threshold = max(self.noise_floor * self.threshold_ratio, self.min_energy)
+        is_speech = (energy > threshold) & (zcr < self.max_zcr)
+
+        events = []
+        for i, speech in enumerate(is_speech):
+            frame_end = self.position + (i + 1) * self.frame_size
+            if speech:
+                self.run += 1
+                self.last_speech_end = frame_end
+                if not self.speaking and self.run >= self.onset_frames:
+                    self.speaking = True
+                    onset = frame_end - self.run * self.frame_size
+                    events.append(("start", max(onset - self.preroll, 0)))
+            else:
+                self.run = 0
+                if self.speaking and frame_end - self.last_speech_end >= self.hangover:
+                    self.speaking = False
+                    events.append(("end", min(self.last_speech_end + self.preroll, frame_end)))
+        self.position += count * self.frame_size
+        return events
+
+    def flush(self):
+        """Close an utterance that is still open when the stream stops"""
+        if not self.speaking:
+            return []
+        self.speaking = False
+        self.run = 0
+        return [("end", self.position + len(self.remainder))]
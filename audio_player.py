@@ -0,0 +1,108 @@
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class StreamingAudioPlayer:
+    """Plays audio fed in pieces through a jitter buffer on a PortAudio output stream.
+
+    Pieces can be fed while earlier ones are still playing. Playback starts once
+    `prebuffer_ms` of audio is queued (or the reply has ended), so the first sentence of
+    an NPC reply plays while later ones are still being synthesized.
+    """
+    def __init__(self, prebuffer_ms=150, blocksize=1024):
+        self.prebuffer_ms = prebuffer_ms
+        self.blocksize = blocksize
+        self.stream = None
+        self.sample_rate = None
+        self.lock = threading.Lock()
+        self.pieces = deque()
+        self.offset = 0  # Samples already played from pieces[0]
+        self.buffered = 0
+        self.started = False
+        self.ending = False
+        self.level = 0.0  # Mean square of the last block played, to tell its echo from the player's voice
+        # Counters
+        self.underruns = 0
+        self.interruptions = 0
+
+    @property
+    def is_playing(self):
+        return self.buffered > 0
+
+    def open(self, sample_rate):
+        self.close()
+        self.sample_rate = sample_rate
+        self.prebuffer = sample_rate * self.prebuffer_ms // 1000
+        import sounddevice as sd  # Deferred so importing the player needs no audio device
+        self.stream = sd.OutputStream(
+            samplerate=sample_rate,
+            channels=1,
+            dtype='float32',
+            callback=self.callback,
+            blocksize=self.blocksize
+        )
+        self.stream.start()
+
+    def feed(self, samples, sample_rate):
+        """Queue decoded audio for playback"""
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim > 1:
+            samples = samples.mean(axis=1)
+        if self.stream is None:
+            self.open(sample_rate)
+        elif sample_rate != self.sample_rate:
+            positions = np.arange(0, len(samples), sample_rate / self.sample_rate)
+            samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+        with self.lock:
+            self.pieces.append(samples)
+            self.buffered += len(samples)
+            self.ending = False
+
+    def end_of_stream(self):
+        """Mark the current reply as complete so a short tail is not held back by the prebuffer"""
+        with self.lock:
+            self.ending = True
+
+    def interrupt(self):
+        """Drop everything queued, e.g. when the player starts talking over the NPC"""
+        with self.lock:
+            if self.buffered:
+                self.interruptions += 1
+            self.pieces.clear()
+            self.offset = 0
+            self.buffered = 0
+            self.started = False
+
+    def callback(self, outdata, frames, time, status):
+        """Pull the next block out of the jitter buffer (PortAudio thread)"""
+        out = outdata[:, 0]
+        filled = 0
+        with self.lock:
+            if not self.started and self.buffered and (self.buffered >= self.prebuffer or self.ending):
+                self.started = True
+            if self.started:
+                while filled < frames and self.pieces:
+                    piece = self.pieces[0]
+                    take = min(frames - filled, len(piece) - self.offset)
+                    out[filled:filled + take] = piece[self.offset:self.offset + take]
+                    filled += take
+                    self.offset += take
+                    if self.offset == len(piece):
+                        self.pieces.popleft()
+                        self.offset = 0
+                self.buffered -= filled
+                if filled < frames:
+                    if not self.ending:
+                        self.underruns += 1
+                    # Rebuild the prebuffer before resuming
+                    self.started = False
+        out[filled:] = 0
+        self.level = float(np.mean(np.square(out)))
+
+    def close(self):
+        if self.stream:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
@@ -0,0 +1,123 @@
+import io
+import json
+import struct
+from collections import namedtuple
+
+import numpy as np
+import soundfile as sf
+
+# Protocol versions
+# 1 = legacy: audio sent as hex strings inside JSON text frames
+# 2 = binary: audio sent as WebSocket binary frames with a small typed header
+# 3 = streamed replies: transcript/chat_token control messages, one audio frame
+#     per synthesized sentence (seq = sentence index), then end_of_response
+LEGACY_PROTOCOL_VERSION = 1
+PROTOCOL_VERSION = 3
+
+# Frame kinds
+AUDIO_CHUNK = 1      # Microphone audio, client -> server
+AUDIO_RESPONSE = 2   # NPC speech, server -> client
+
+# Payload codecs
+CODEC_PCM_F32 = 0    # Raw little-endian float32 samples
+CODEC_ENCODED = 1    # Encoded audio file bytes (whatever the TTS endpoint returned)
+CODEC_PCM_S16 = 2    # Raw little-endian int16 samples, half the size of float32
+CODEC_FLAC = 3       # FLAC file bytes, lossless
+CODEC_OPUS = 4       # Ogg Opus file bytes, lossy but far smaller
+
+# Microphone codecs by name, most compact first. Both sides list the ones they can handle in
+# their hello; the client sends audio in the first of its codecs the server also understands.
+# Frames carry their codec, so a server that never lists any still gets float32.
+CODEC_NAMES = {"opus": CODEC_OPUS, "flac": CODEC_FLAC, "pcm_s16": CODEC_PCM_S16, "pcm_f32": CODEC_PCM_F32}
+COMPRESSED_CODECS = {CODEC_FLAC, CODEC_OPUS}  # Worth encoding and decoding off the event loop
+FILE_FORMATS = {CODEC_FLAC: ("FLAC", "PCM_16"), CODEC_OPUS: ("OGG", "OPUS")}
+
+# Header layout: kind, codec, sequence number, sample rate (0 if carried by the payload)
+HEADER = struct.Struct("<BBHI")
+
+Frame = namedtuple("Frame", ["kind", "codec", "seq", "sample_rate", "payload"])
+
+
+def pack_frame(kind, payload, codec=CODEC_PCM_F32, seq=0, sample_rate=0):
+    """Build a binary frame from a header and a bytes-like payload"""
+    header = HEADER.pack(kind, codec, seq & 0xFFFF, sample_rate)
+    return b"".join((header, memoryview(payload).cast("B")))
+
+
+def unpack_frame(message):
+    """Split a binary frame into its header fields and a zero-copy payload view"""
+    view = memoryview(message)
+    if len(view) < HEADER.size:
+        raise ValueError(f"Frame too short: {len(view)} bytes")
+    kind, codec, seq, sample_rate = HEADER.unpack_from(view)
+    return Frame(kind, codec, seq, sample_rate, view[HEADER.size:])
+
+
+def pcm_from_payload(payload):
+    """View a PCM float32 payload as a numpy array without copying"""
+    return np.frombuffer(payload, dtype=np.float32)
+
+
+def supported_codecs():
+    """Names of the codecs this side can encode and decode, preferred first (Opus needs libsndfile 1.0.29+)"""
+    return [name for name in CODEC_NAMES
+            if CODEC_NAMES[name] not in FILE_FORMATS
+            or FILE_FORMATS[CODEC_NAMES[name]][1] in sf.available_subtypes(FILE_FORMATS[CODEC_NAMES[name]][0])]
+
+
+def hello_message(version=PROTOCOL_VERSION, codecs=None):
+    """Control message used by both sides to announce their protocol version and audio codecs"""
+    return json.dumps({"type": "hello", "protocol": version, "codecs": supported_codecs() if codecs is None else codecs})
+
+
+def choose_codec(peer_codecs, codecs=None):
+    """The first of our codecs the peer also supports, or float32 PCM if it didn't say"""
+    for name in supported_codecs() if codecs is None else codecs:
+        if name in (peer_codecs or ()):
+            return CODEC_NAMES[name]
+    return CODEC_PCM_F32
+
+
+def codec_name(codec):
+    return next((name for name, value in CODEC_NAMES.items() if value == codec), str(codec))
+
+
+def choose_tts_format(peer_codecs):
+    """TTS response_format for a peer: Opus or FLAC if it can decode them, else the endpoint's mp3 default"""
+    return next((name for name in ("opus", "flac") if name in (peer_codecs or ())), "mp3")
+
+
+def encode_audio(samples, codec, sample_rate):
+    """Encode float32 samples as a frame payload"""
+    if codec == CODEC_PCM_F32:
+        return np.ascontiguousarray(samples, dtype=np.float32)
+    if codec == CODEC_PCM_S16:
+        return (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    file_format, subtype = FILE_FORMATS[codec]
+    sf.write(buffer, samples, sample_rate, format=file_format, subtype=subtype)
+    return buffer.getvalue()
+
+
+def decode_audio(payload, codec):
+    """Decode a frame payload to float32 samples"""
+    if codec == CODEC_PCM_F32:
+        return pcm_from_payload(payload)
+    if codec == CODEC_PCM_S16:
+        return np.frombuffer(payload, dtype="<i2").astype(np.float32) / 32768
+    if codec in FILE_FORMATS:
+        try:
+            samples, _ = sf.read(io.BytesIO(payload), dtype="float32")
+        except RuntimeError as e:
+            raise ValueError(f"Undecodable {codec_name(codec)} payload: {e}")
+        return samples
+    raise ValueError(f"Unknown audio codec: {codec}")
+
+
+def negotiate(peer_version):
+    """Pick the highest protocol version both sides understand"""
+    try:
+        peer_version = int(peer_version)
+    except (TypeError, ValueError):
+        return LEGACY_PROTOCOL_VERSION
+    return max(LEGACY_PROTOCOL_VERSION, min(PROTOCOL_VERSION, peer_version))
@@ -0,0 +1,682 @@
+"""Microbenchmarks for hot paths that run without a display, audio device or network.
+
+Usage: python benchmarks.py [name ...]   (no names runs everything)
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+
+BENCHMARKS = {}
+
+# PyOpenGL binds its platform on first import, and some benchmarks import it (through render_mesh)
+# before making a headless context; programs launched by benchmarks get the original environment
+LAUNCH_ENV = dict(os.environ)
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def timed(func, *args):
+    """Run func once and return elapsed microseconds"""
+    started = time.perf_counter_ns()
+    func(*args)
+    return (time.perf_counter_ns() - started) / 1000
+
+
+def report(label, samples_us):
+    samples_us = np.asarray(samples_us)
+    print(f"  {label:<28} mean {samples_us.mean():8.1f} us   p99 {np.percentile(samples_us, 99):8.1f} us   "
+          f"max {samples_us.max():8.1f} us")
+
+
+@benchmark
+def capture_callback(seconds=10, sample_rate=16000, block=1024):
+    """Per-block audio callback cost: list.extend of Python floats vs the preallocated ring buffer"""
+    from audio_capture import AudioRingBuffer
+
+    rng = np.random.default_rng(0)
+    blocks = [rng.uniform(-0.5, 0.5, (block, 1)).astype(np.float32) for _ in range(seconds * sample_rate // block)]
+
+    legacy = []
+    legacy_times = [timed(legacy.extend, b.flatten()) for b in blocks]
+    legacy_times.append(timed(np.array, legacy))
+
+    ring = AudioRingBuffer(15 * sample_rate)
+    ring_times = [timed(ring.write, b) for b in blocks]
+    ring_times.append(timed(ring.read, 0))
+
+    print(f"{seconds}s utterance, {len(blocks)} blocks of {block} samples (last sample = utterance hand-off)")
+    report("list.extend + np.array", legacy_times)
+    report("AudioRingBuffer", ring_times)
+
+
+NPC_REPLY = ("When we launched our first venture five years ago, we had three people and a whiteboard. "
+             "Today our studio supports fifteen portfolio companies across Europe and North America, and "
+             "our metrics show that founders who join the residency program reach their first paying "
+             "customer twice as fast. I would love to hear what kind of problem you want to work on, "
+             "because the best ventures we build start with a team that understands the pain deeply. "
+             "What brings you here today, and what would success look like for you in a year?")
+
+
+@benchmark
+def dialogue_text(frames=300):
+    """Dialogue box text per frame with a ~150-token NPC reply: render-every-word vs TextLayoutCache"""
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "hide")
+    import pygame
+    from text_layout import TextLayoutCache
+
+    pygame.font.init()
+    font = pygame.font.Font(None, 24)
+    surface = pygame.Surface((800, 600), pygame.SRCALPHA)
+    max_width, line_height = 760, 25
+
+    def uncached_frame():
+        # The pre-cache DialogueSystem.render_text plus the per-frame hint and prompt renders
+        lines, current_line, current_width = [], [], 0
+        for word in NPC_REPLY.split():
+            word_width = font.render(word + ' ', True, (255, 255, 255)).get_width()
+            if current_width + word_width <= max_width:
+                current_line.append(word)
+                current_width += word_width
+            else:
+                lines.append(' '.join(current_line))
+                current_line, current_width = [word], word_width
+        lines.append(' '.join(current_line))
+        for i, line in enumerate(lines):
+            surface.blit(font.render(line, True, (255, 255, 255)), (40, 420 + i * line_height))
+        surface.blit(font.render("Press Shift+Q to exit", True, (255, 255, 255)), (40, 390))
+        surface.blit(font.render("> _", True, (255, 255, 255)), (40, 540))
+
+    layout = TextLayoutCache(font)
+
+    def cached_frame():
+        layout.render(surface, NPC_REPLY, 40, 420, max_width, line_height)
+        surface.blit(layout.line_surface("Press Shift+Q to exit"), (40, 390))
+        surface.blit(layout.line_surface("> _"), (40, 540))
+
+    for label, frame in (("render every word", uncached_frame), ("TextLayoutCache", cached_frame)):
+        times = [timed(frame) for _ in range(frames)]
+        report(label, times)
+        print(f"  {'':<28} {1e6 / np.mean(times):8.0f} text frames/s")
+    print(f"  steady-state rasterizations with cache: {layout.rasterized} (all on the first frame)")
+
+    # Streaming: the reply grows token by token, re-wrapping only the last line
+    streamed = TextLayoutCache(font)
+    tokens = NPC_REPLY.split(' ')
+    times = [timed(streamed.render, surface, ' '.join(tokens[:i]), 40, 420, max_width, line_height)
+             for i in range(1, len(tokens) + 1)]
+    report("streaming, per token", times)
+
+
+def headless_gl_context(width=800, height=600):
+    """Make an offscreen OpenGL context current: EGL surfaceless by default, OSMesa with PYOPENGL_PLATFORM=osmesa"""
+    import ctypes
+    platform = os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+    if platform == "osmesa":
+        from OpenGL import GL, osmesa
+        context = osmesa.OSMesaCreateContextExt(osmesa.OSMESA_RGBA, 24, 0, 0, None)
+        buffer = (GL.GLubyte * (width * height * 4))()
+        osmesa.OSMesaMakeCurrent(context, buffer, GL.GL_UNSIGNED_BYTE, width, height)
+        return context, buffer
+
+    os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+    from OpenGL import EGL
+    display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+    major, minor = EGL.EGLint(), EGL.EGLint()
+    if not EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor)):
+        raise RuntimeError("no EGL display available")
+    attributes = (EGL.EGLint * 9)(EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT, EGL.EGL_DEPTH_SIZE, 24,
+                                  EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT, EGL.EGL_NONE, 0, 0)
+    config, count = EGL.EGLConfig(), EGL.EGLint()
+    EGL.eglChooseConfig(display, attributes, ctypes.pointer(config), 1, ctypes.pointer(count))
+    if not count.value:
+        raise RuntimeError("no EGL config with desktop OpenGL")
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    surface = EGL.eglCreatePbufferSurface(
+        display, config, (EGL.EGLint * 5)(EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height, EGL.EGL_NONE))
+    context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT, None)
+    EGL.eglMakeCurrent(display, surface, surface, context)
+    return display, context
+
+
+def office_scene(booths):
+    """Synthetic office with the same kind of geometry as World: floor, walls and furnished booths"""
+    from render_mesh import MeshBuilder
+
+    mesh = MeshBuilder()
+    size = 5 * max(1, int(booths ** 0.5))
+    mesh.set_color(0.76, 0.6, 0.42)
+    mesh.quads([(-size, 0, -size), (-size, 0, size), (size, 0, size), (size, 0, -size)])
+    mesh.set_color(0.85, 0.85, 0.85)
+    for sign in (-1, 1):
+        mesh.quads([(-size, 0, sign * size), (size, 0, sign * size), (size, 2, sign * size), (-size, 2, sign * size),
+                    (sign * size, 0, -size), (sign * size, 0, size), (sign * size, 2, size), (sign * size, 2, -size)])
+    rng = np.random.default_rng(0)
+    for x, z in rng.uniform(-size + 1, size - 1, (booths, 2)):
+        mesh.push()
+        mesh.translate(x, 0, z)
+        mesh.set_color(0.6, 0.4, 0.2)
+        mesh.quads([(-0.4, 0.4, -0.3), (0.4, 0.4, -0.3), (0.4, 0.4, 0.3), (-0.4, 0.4, 0.3)])
+        for leg_x, leg_z in [(-0.35, -0.25), (0.35, -0.25), (-0.35, 0.25), (0.35, 0.25)]:
+            mesh.quads([(leg_x - 0.02, 0, leg_z - 0.02), (leg_x + 0.02, 0, leg_z - 0.02),
+                        (leg_x + 0.02, 0.4, leg_z - 0.02), (leg_x - 0.02, 0.4, leg_z - 0.02)])
+        mesh.set_color(0.3, 0.3, 0.3)
+        for offset, angle in ((0, 0), (0.5, 90)):
+            mesh.push()
+            mesh.translate(0, 0, offset)
+            mesh.rotate(angle, 0, 1, 0)
+            mesh.scale(0.05, 1.0, 0.8)
+            mesh.cube()
+            mesh.pop()
+        mesh.pop()
+    return mesh.build()
+
+
+@benchmark
+def static_scene(frames=100):
+    """Static office geometry per frame: immediate-mode replay vs baked VBO vs display list (offscreen GL)"""
+    try:
+        headless_gl_context()
+    except Exception as e:
+        print(f"  skipped, no offscreen OpenGL context: {e}")
+        return
+    from OpenGL.GL import glClear, glFinish, glGetString, GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT, GL_RENDERER
+    from render_mesh import StaticMesh, draw_immediate
+
+    print(f"  renderer: {glGetString(GL_RENDERER).decode()}")
+    for booths in (2, 50):
+        vertices = office_scene(booths)
+        vbo = StaticMesh(vertices)
+        display_list = StaticMesh(vertices, use_vbo=False)
+        print(f"  {booths} booths, {len(vertices)} vertices")
+
+        def frame(draw, *args):
+            glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+            draw(*args)
+            glFinish()
+
+        for label, draw, args in (("immediate mode", draw_immediate, (vertices,)),
+                                  ("StaticMesh (VBO)", vbo.draw, ()),
+                                  ("StaticMesh (display list)", display_list.draw, ())):
+            frame(draw, *args)  # Warm up driver state
+            report(label, [timed(frame, draw, *args) for _ in range(frames)])
+        vbo.delete()
+        display_list.delete()
+
+
+@benchmark
+def npc_spheres(frames=100, npcs=50):
+    """Head and hair spheres per frame: per-vertex trig + glVertex vs cached SphereMesh, with and without LOD"""
+    import math
+    try:
+        headless_gl_context()
+    except Exception as e:
+        print(f"  skipped, no offscreen OpenGL context: {e}")
+        return
+    from OpenGL.GL import (glBegin, glClear, glEnd, glFinish, glLoadIdentity, glMatrixMode, glNormal3f,
+                           glPopMatrix, glPushMatrix, glTranslatef, glVertex3f, GL_COLOR_BUFFER_BIT,
+                           GL_DEPTH_BUFFER_BIT, GL_MODELVIEW, GL_PROJECTION, GL_QUAD_STRIP)
+    from OpenGL.GLU import gluPerspective
+    from render_mesh import sphere_detail, sphere_mesh
+
+    glMatrixMode(GL_PROJECTION)
+    glLoadIdentity()
+    gluPerspective(45, 800 / 600, 0.1, 50.0)
+    glMatrixMode(GL_MODELVIEW)
+
+    def draw_sphere_immediate(radius, slices, stacks):
+        # The pre-cache draw_sphere
+        for i in range(stacks):
+            lat0 = math.pi * (-0.5 + float(i) / stacks)
+            z0, zr0 = math.sin(lat0), math.cos(lat0)
+            lat1 = math.pi * (-0.5 + float(i + 1) / stacks)
+            z1, zr1 = math.sin(lat1), math.cos(lat1)
+            glBegin(GL_QUAD_STRIP)
+            for j in range(slices + 1):
+                lng = 2 * math.pi * float(j) / slices
+                x, y = math.cos(lng), math.sin(lng)
+                glNormal3f(x * zr0, y * zr0, z0)
+                glVertex3f(x * zr0 * radius, y * zr0 * radius, z0 * radius)
+                glNormal3f(x * zr1, y * zr1, z1)
+                glVertex3f(x * zr1 * radius, y * zr1 * radius, z1 * radius)
+            glEnd()
+
+    def cached(radius, slices, stacks):
+        sphere_mesh(slices, stacks).draw(radius)
+
+    # NPCs spread out in front of the camera, 1 to 15 units away
+    positions = [(math.sin(i), 0.0, -1 - 14 * i / npcs) for i in range(npcs)]
+
+    def frame(draw, lod):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        for position in positions:
+            slices, stacks = sphere_detail(math.dist((0, 0, 0), position)) if lod else (16, 16)
+            glPushMatrix()
+            glTranslatef(*position)
+            draw(0.12, slices, stacks)
+            draw(0.13, slices, stacks)
+            glPopMatrix()
+        glFinish()
+
+    print(f"  {npcs} NPCs, 2 spheres each")
+    for label, draw, lod in (("per-vertex draw_sphere", draw_sphere_immediate, False),
+                             ("SphereMesh", cached, False),
+                             ("SphereMesh + LOD", cached, True)):
+        frame(draw, lod)  # Warm up, builds the cached meshes
+        report(label, [timed(frame, draw, lod) for _ in range(frames)])
+
+
+@benchmark
+def npc_crowd(frames=30):
+    """NPC rendering per frame at 10/100/1000 NPCs: one draw sequence per NPC vs NPCCrowd batches"""
+    import math
+    try:
+        headless_gl_context()
+    except Exception as e:
+        print(f"  skipped, no offscreen OpenGL context: {e}")
+        return
+    from OpenGL.GL import (glClear, glColor3f, glFinish, glLoadIdentity, glMatrixMode, glPopMatrix,
+                           glPushMatrix, glScalef, glTranslatef, GL_COLOR_BUFFER_BIT, GL_DEPTH_BUFFER_BIT,
+                           GL_MODELVIEW, GL_PROJECTION)
+    from OpenGL.GLU import gluPerspective
+    from npc_crowd import NPCCrowd, npc_template
+    from render_mesh import StaticMesh, sphere_detail, sphere_mesh
+
+    glMatrixMode(GL_PROJECTION)
+    glLoadIdentity()
+    gluPerspective(45, 800 / 600, 0.1, 50.0)
+    glMatrixMode(GL_MODELVIEW)
+    camera = (0.0, 1.0, 0.0)
+
+    # The per-NPC path: the body as its own mesh, spheres from the sphere cache
+    positions, normals, parts, indices = npc_template(16, 16)
+    body = parts >= 2
+    palette = np.array([(0.8, 0.7, 0.6), (0.2, 0.15, 0.1), (0.8, 0.2, 0.2), (0.6, 0.15, 0.15)], dtype=np.float32)
+    body_mesh = StaticMesh(np.hstack((positions[body], normals[body], palette[parts[body]])))
+
+    def per_npc_frame(crowd, finish=True):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        for position in crowd.positions:
+            slices, stacks = sphere_detail(math.dist(camera, position))
+            glPushMatrix()
+            glTranslatef(*position)
+            glScalef(0.6, 0.6, 0.6)
+            glColor3f(*palette[0])
+            sphere_mesh(slices, stacks).draw(0.12)
+            glColor3f(*palette[1])
+            glPushMatrix()
+            glTranslatef(0, 0.05, 0)
+            sphere_mesh(slices, stacks).draw(0.13)
+            glPopMatrix()
+            body_mesh.draw()
+            glPopMatrix()
+        if finish:
+            glFinish()
+
+    def batched_frame(crowd, finish=True):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        crowd.draw(camera)
+        if finish:
+            glFinish()
+
+    def culled_frame(crowd, visible):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        crowd.draw(camera, visible)
+        glFinish()
+
+    rng = np.random.default_rng(0)
+    for count in (10, 100, 1000):
+        # Spread out in front of the camera so all three detail levels are in use
+        distance = rng.uniform(1, 20, count)
+        angle = rng.uniform(-0.6, 0.6, count)
+        crowd = NPCCrowd(["HR"] * count,
+                         np.stack((distance * np.sin(angle), np.full(count, 0.65), -distance * np.cos(angle)), axis=1),
+                         np.full(count, 0.6), [palette], np.zeros(count))
+        print(f"  {count} NPCs (frame = submit + glFinish; submit = CPU time issuing GL calls)")
+        per_npc_frame(crowd)
+        report("per-NPC draw, frame", [timed(per_npc_frame, crowd) for _ in range(frames)])
+        report("per-NPC draw, submit", [timed(per_npc_frame, crowd, False) for _ in range(frames)])
+        glFinish()
+        report("NPCCrowd, first frame (bake)", [timed(batched_frame, crowd)])
+        report("NPCCrowd, frame", [timed(batched_frame, crowd) for _ in range(frames)])
+        report("NPCCrowd, submit", [timed(batched_frame, crowd, False) for _ in range(frames)])
+        # Culling hands a different visible set every frame while the camera turns
+        masks = [rng.random(count) < 0.5 for _ in range(frames)]
+        report("NPCCrowd, new mask per frame", [timed(culled_frame, crowd, mask) for mask in masks])
+        glFinish()
+        vertices = sum(len(mesh.vertices) for mesh in crowd.batches.values())
+        print(f"  {'':<28} draw calls per frame: {3 * count} per-NPC vs {len(crowd.batches)} batched, "
+              f"{vertices} batched vertices")
+        crowd.delete()
+    body_mesh.delete()
+
+
+@benchmark
+def npc_proximity(npcs=10000, queries=2000, radius=2.0):
+    """Nearest NPC within the interaction distance at 10k NPCs: per-NPC math.sqrt loop vs NumPy scan vs SpatialGrid"""
+    import math
+    from npc_crowd import NPCCrowd
+
+    rng = np.random.default_rng(0)
+    size = 100.0 * math.sqrt(npcs / 10000)  # ~1 NPC per square metre
+    positions = np.stack((rng.uniform(-size / 2, size / 2, npcs), np.full(npcs, 0.65),
+                          rng.uniform(-size / 2, size / 2, npcs)), axis=1)
+    crowd = NPCCrowd(["HR"] * npcs, positions, np.full(npcs, 0.6), [np.zeros((4, 3))], np.zeros(npcs))
+    players = rng.uniform(-size / 2, size / 2, (queries, 3))
+    position_list = positions.tolist()
+
+    def python_loop(player):
+        # The old check_npc_distance, once per NPC
+        best, best_distance = None, radius
+        for i, (x, _, z) in enumerate(position_list):
+            dx = player[0] - x
+            dz = player[2] - z
+            distance = math.sqrt(dx * dx + dz * dz)
+            if distance < best_distance:
+                best, best_distance = i, distance
+        return best
+
+    def numpy_scan(player):
+        distances = np.hypot(positions[:, 0] - player[0], positions[:, 2] - player[2])
+        best = int(np.argmin(distances))
+        return best if distances[best] < radius else None
+
+    crowd.nearest(players[0], radius)  # Build the grid
+    print(f"  {npcs} NPCs over {size:.0f}x{size:.0f} m, radius {radius} m, grid build "
+          f"{timed(crowd.delete) + timed(crowd.nearest, players[0], radius):.0f} us")
+    report("math.sqrt loop", [timed(python_loop, p) for p in players[:queries // 20]])
+    report("NumPy scan", [timed(numpy_scan, p) for p in players])
+    report("SpatialGrid", [timed(crowd.nearest, p, radius) for p in players])
+
+
+@benchmark
+def collision_grid(size=1000, queries=2000, radius=0.3):
+    """Movement queries on a 1000x1000 tile map: obstacle-list scan vs CollisionGrid lookups and swept moves"""
+    from tile_map import CollisionGrid, TileMap
+
+    rng = np.random.default_rng(0)
+    walls = rng.random((size, size)) < 0.1
+    walls[[0, -1], :] = walls[:, [0, -1]] = True
+    rows = ["".join(row) for row in np.where(walls, "W", ".")]
+
+    started = time.perf_counter()
+    tile_map = TileMap(rows)
+    grid = CollisionGrid(tile_map)
+    # Furniture footprints on top of the walls
+    corners = rng.uniform(-size / 2, size / 2, (size * 10, 2))
+    footprints = np.hstack((corners, corners + rng.uniform(0.2, 0.8, corners.shape)))
+    for footprint in footprints:
+        grid.block_rect(*footprint)
+    print(f"  {size}x{size} tiles, {walls.sum()} wall tiles + {len(footprints)} footprints, "
+          f"{grid.rows}x{grid.cols} cells, built in {time.perf_counter() - started:.2f} s")
+
+    started = time.perf_counter()
+    floors, faces = tile_map.floor_rects(), tile_map.wall_faces()
+    print(f"  geometry from the map: {len(floors)} floor rects, {len(faces)} wall faces "
+          f"in {time.perf_counter() - started:.2f} s")
+
+    # Every obstacle as an AABB, which is what a per-object check would have to scan
+    wall_rows, wall_cols = np.nonzero(walls)
+    x0 = tile_map.origin[0] + wall_cols
+    z0 = tile_map.origin[1] + wall_rows
+    boxes = np.vstack((np.stack((x0, z0, x0 + 1, z0 + 1), axis=1), footprints))
+
+    def scan_blocked(x, z):
+        dx = np.clip(x, boxes[:, 0], boxes[:, 2]) - x
+        dz = np.clip(z, boxes[:, 1], boxes[:, 3]) - z
+        return bool(np.any(dx * dx + dz * dz < radius * radius))
+
+    points = rng.uniform(-size / 2, size / 2, (queries, 2))
+    start_points = [(x, z) for x, z in points if not grid.circle_blocked(x, z, radius)]
+    angles = rng.uniform(0, 2 * np.pi, len(start_points))
+    moves = np.stack((np.cos(angles), np.sin(angles)), axis=1) * 0.3  # One 60 Hz step at 18 units/s
+
+    print(f"  {len(boxes)} obstacles")
+    report("obstacle scan (circle)", [timed(scan_blocked, x, z) for x, z in points[:queries // 10]])
+    report("is_blocked (point)", [timed(grid.is_blocked, x, z) for x, z in points])
+    report("circle_blocked", [timed(grid.circle_blocked, x, z, radius) for x, z in points])
+    report("move_circle (0.3 step)", [timed(grid.move_circle, x, z, dx, dz, radius)
+                                      for (x, z), (dx, dz) in zip(start_points, moves)])
+
+
+@benchmark
+def frustum_culling(npcs=10000, chunks=1000, frames=200):
+    """Per-frame cull pass over 10k NPC spheres + 1k world chunks: per-object Python loop vs vectorized NumPy"""
+    from culling import frustum_planes, perspective, visible_boxes, visible_spheres
+    from render_mesh import rotation, translation
+
+    rng = np.random.default_rng(0)
+    size = 200.0
+    centers = np.stack((rng.uniform(-size / 2, size / 2, npcs), np.full(npcs, 0.4),
+                        rng.uniform(-size / 2, size / 2, npcs)), axis=1)
+    radii = np.full(npcs, 0.45)
+    mins = np.stack((rng.uniform(-size / 2, size / 2, chunks), np.zeros(chunks),
+                     rng.uniform(-size / 2, size / 2, chunks)), axis=1)
+    maxs = mins + (8.0, 2.0, 8.0)
+    projection = perspective(45, 800 / 600, 0.1, 50.0)
+    cameras = [(rng.uniform(-size / 2, size / 2, 3) * (1, 0, 1) + (0, 0.5, 0), rng.uniform(0, 360))
+               for _ in range(frames)]
+
+    def planes_for(camera):
+        position, yaw = camera
+        view = translation(0, 0, -5) @ rotation(yaw, 0, 1, 0) @ translation(*-position)
+        return frustum_planes(projection @ view), np.linalg.inv(view)[:3, 3]
+
+    def loop_cull(camera):
+        planes, eye = planes_for(camera)
+        plane_list = planes.tolist()
+        visible = []
+        for center, radius in zip(centers.tolist(), radii.tolist()):
+            visible.append(all(a * center[0] + b * center[1] + c * center[2] + d >= -radius
+                               for a, b, c, d in plane_list))
+        for low, high in zip(mins.tolist(), maxs.tolist()):
+            visible.append(all(a * (high[0] if a > 0 else low[0]) + b * (high[1] if b > 0 else low[1]) +
+                               c * (high[2] if c > 0 else low[2]) + d >= 0 for a, b, c, d in plane_list))
+        return visible
+
+    submitted = []
+
+    def vector_cull(camera):
+        planes, eye = planes_for(camera)
+        npc_mask = visible_spheres(planes, centers, radii, eye, 40.0)
+        chunk_mask = visible_boxes(planes, mins, maxs, eye, 40.0)
+        submitted.append(int(npc_mask.sum() + chunk_mask.sum()))
+
+    print(f"  {npcs} NPC spheres + {chunks} chunk boxes over {size:.0f}x{size:.0f} m")
+    report("Python loop", [timed(loop_cull, camera) for camera in cameras[:frames // 10]])
+    report("NumPy (frustum + distance)", [timed(vector_cull, camera) for camera in cameras])
+    print(f"  {'':<28} submitted {np.mean(submitted):.0f} of {npcs + chunks} objects per frame on average")
+
+
+@benchmark
+def app_startup(runs=5):
+    """Cost of `import app`, launch to first menu frame (offscreen window), and headless simulation speed"""
+    import re
+    import subprocess
+    import sys
+
+    def run(args, env=None):
+        started = time.perf_counter_ns()
+        output = subprocess.run([sys.executable] + args, capture_output=True, text=True, check=True,
+                                env=dict(LAUNCH_ENV, **(env or {}))).stdout
+        return (time.perf_counter_ns() - started) / 1000, output
+
+    imports = [run(["-c", "import app"])[0] for _ in range(runs)]
+    report("import app", imports)
+
+    first_frames = []
+    for _ in range(runs):
+        _, output = run(["app.py", "--frames", "1"], {"SDL_VIDEODRIVER": "offscreen", "OPENAI_API_KEY": "unused"})
+        first_frames.append(float(re.search(r"First menu frame (\d+) ms", output).group(1)) * 1000)
+    report("Launch to first menu frame", first_frames)
+
+    steps = 3600
+    elapsed, output = run(["app.py", "--headless", "--frames", str(steps)])
+    simulated = float(re.search(r"in ([\d.]+) s,", output).group(1))
+    print(f"  {'Headless simulation':<28} {steps / simulated:8.0f} steps/s   "
+          f"({elapsed / 1e6:.2f} s including startup)")
+
+
+@benchmark
+def chat_history(turns=200, budget=1500):
+    """Prompt tokens per request over a 200-turn scripted conversation: full history vs ConversationHistory"""
+    from chat_history import ConversationHistory, count_tokens
+
+    rng = np.random.default_rng(0)
+    words = "venture talent policy metrics startup remote culture launch funding team office growth".split()
+    system_prompt = " ".join(rng.choice(words, 120))
+    script = [("user" if i % 2 == 0 else "assistant", " ".join(rng.choice(words, rng.integers(10, 60))))
+              for i in range(turns * 2)]
+    summary = " ".join(rng.choice(words, 100))  # Stands in for the model's summary, which is capped at 150 tokens
+
+    full = [count_tokens(system_prompt) + 4]
+    history = ConversationHistory(system_prompt, budget)
+    full_tokens, bounded_tokens, append_us = [], [], []
+    for turn in range(turns):
+        (_, question), (_, answer) = script[2 * turn:2 * turn + 2]
+        full.append(count_tokens(question) + 4)
+        full_tokens.append(sum(full))
+        append_us.append(timed(history.append, "user", question))
+        bounded_tokens.append(history.prompt_tokens)
+        # The summary lands while the reply is being generated, as it would from the background worker
+        history.begin_summary()
+        history.finish_summary(summary)
+        full.append(count_tokens(answer) + 4)
+        append_us.append(timed(history.append, "assistant", answer))
+
+    print(f"  {turns} turns, budget {budget} tokens, {len(history.messages())} messages in the final prompt")
+    for label, tokens in (("Full history", full_tokens), ("ConversationHistory", bounded_tokens)):
+        samples = "  ".join(f"{tokens[n - 1]:>6}" for n in (1, 10, 50, 100, turns))
+        print(f"  {label:<28} turns 1/10/50/100/{turns}: {samples}   total {sum(tokens):>8} tokens")
+    report("append + trim", append_us)
+
+
+@benchmark
+def response_cache(entries=500, lookups=2000):
+    """ResponseCache lookups for replies (short text) and speech (40 KB audio): memory hits, disk hits, misses, stores"""
+    import tempfile
+    from response_cache import ResponseCache
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.sqlite")
+        for label, value in (("reply", "Thanks for stopping by. " * 8), ("speech", rng.bytes(40 << 10))):
+            cache = ResponseCache(label, path, max_entries=entries)
+            keys = [("HR", f"question {i}") for i in range(entries)]
+            report(f"{label} store", [timed(cache.put, value, *key) for key in keys])
+            report(f"{label} memory hit", [timed(cache.get, *keys[i % entries]) for i in range(lookups)])
+            cache.close()
+            cache = ResponseCache(label, path, max_entries=entries)  # Fresh memory level: every lookup reads SQLite
+            report(f"{label} disk hit", [timed(cache.get, *key) for key in keys])
+            report(f"{label} miss", [timed(cache.get, "HR", f"other {i}") for i in range(lookups)])
+            cache.close()
+
+            # On the server's event loop: how long disk hits keep every other connection waiting
+            for name in ("get", "get_async"):
+                cache = ResponseCache(label, path, max_entries=entries)
+                get = getattr(cache, name)
+
+                async def lookup(key, get=get):
+                    result = get(*key)
+                    if asyncio.iscoroutine(result):
+                        await result
+
+                report(f"{label} loop stall, {name}", asyncio.run(loop_gaps([lookup(key) for key in keys])))
+                cache.close()
+
+
+async def loop_gaps(coroutines):
+    """Await the coroutines in turn beside a task that keeps yielding; returns the gaps between its turns (us)"""
+    gaps = []
+    done = False
+
+    async def ticker():
+        last = time.perf_counter_ns()
+        while not done:
+            await asyncio.sleep(0)
+            now = time.perf_counter_ns()
+            gaps.append((now - last) / 1000)
+            last = now
+
+    task = asyncio.ensure_future(ticker())
+    for coroutine in coroutines:
+        await coroutine
+        await asyncio.sleep(0)  # Let the ticker run even when the coroutine never yields
+    done = True
+    await task
+    return gaps
+
+
+def speech_like(seconds, sample_rate, seed=0):
+    """Voiced, syllable-modulated harmonics with breath noise and pauses: compresses roughly like speech"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    f0 = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)  # Wandering pitch
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 20) if k * 170 < sample_rate / 2)
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t), 0, None) * (np.sin(2 * np.pi * 0.2 * t) > -0.5)
+    return (0.2 * voiced * syllables + 0.005 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+@benchmark
+def audio_codecs(utterances=20, seconds=3.0):
+    """Bytes per conversation minute and encode/decode cost per codec: mic audio upstream, TTS audio downstream"""
+    import io
+    import soundfile as sf
+    import audio_protocol
+
+    minutes = utterances * seconds / 60
+    block = 16000 // 2  # SpeechHandler streams speech in 0.5 s blocks, each its own frame (and Ogg/FLAC file)
+    print(f"  Upstream: {utterances} utterances of {seconds:.0f} s at 16 kHz, sent as 0.5 s frames")
+    clips = [speech_like(seconds, 16000, seed) for seed in range(utterances)]
+    blocks = [clip[i:i + block] for clip in clips for i in range(0, len(clip), block)]
+    legacy = sum(len(chunk.tobytes().hex()) for chunk in blocks)
+    print(f"  {'legacy hex-in-JSON':<28} {legacy / minutes / 1024:8.0f} KB/min")
+    for name in audio_protocol.supported_codecs():
+        codec = audio_protocol.CODEC_NAMES[name]
+        encode_us, decode_us, size = [], [], 0
+        for chunk in blocks:
+            encode_us.append(timed(audio_protocol.encode_audio, chunk, codec, 16000))
+            payload = bytes(memoryview(audio_protocol.encode_audio(chunk, codec, 16000)).cast("B"))
+            decode_us.append(timed(audio_protocol.decode_audio, payload, codec))
+            size += len(payload) + audio_protocol.HEADER.size
+        print(f"  {name:<28} {size / minutes / 1024:8.0f} KB/min   encode {sum(encode_us) / 1000 / minutes:6.1f} ms "
+              f"and decode {sum(decode_us) / 1000 / minutes:6.1f} ms per minute of audio")
+
+    print(f"  Downstream: {utterances} TTS clips of {seconds:.0f} s at 24 kHz")
+    clips = [speech_like(seconds, 24000, seed) for seed in range(utterances)]
+    formats = {"wav": ("WAV", "PCM_16"), "mp3": ("MP3", "MPEG_LAYER_III"), "flac": ("FLAC", "PCM_16"),
+               "opus": ("OGG", "OPUS")}
+    for name, (file_format, subtype) in formats.items():
+        if subtype not in sf.available_subtypes(file_format):
+            continue
+        encoded = []
+        for clip in clips:
+            buffer = io.BytesIO()
+            sf.write(buffer, clip, 24000, format=file_format, subtype=subtype)
+            encoded.append(buffer.getvalue())
+        decode_us = [timed(lambda data: sf.read(io.BytesIO(data), dtype="float32"), data) for data in encoded]
+        print(f"  {name:<28} {sum(map(len, encoded)) / minutes / 1024:8.0f} KB/min   "
+              f"client decode {sum(decode_us) / 1000 / minutes:6.1f} ms per minute of audio")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("names", nargs="*", metavar="name", help=", ".join(sorted(BENCHMARKS)))
+    args = parser.parse_args()
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+    for name in args.names or sorted(BENCHMARKS):
+        print(f"== {name}: {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
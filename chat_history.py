@@ -0,0 +1,99 @@
+import threading
+from collections import deque
+
+MESSAGE_OVERHEAD = 4  # Tokens the chat format adds around every message
+SUMMARY_PROMPT = ("Summarize the conversation below for your own memory in at most 100 words. "
+                  "Keep names, facts, requests and promises; drop small talk.")
+SUMMARY_PREFIX = "Summary of the conversation so far: "
+
+try:
+    import tiktoken
+    encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    encoding = None
+
+
+def count_tokens(text):
+    """Tokens in text: exact with tiktoken installed, otherwise about four characters per token"""
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+class ConversationHistory:
+    """Chat messages kept within a token budget: the system prompt and greeting, a running summary and recent turns.
+
+    Each message is counted once when it is added. Whenever the recent turns no longer fit
+    the budget, the oldest are moved out of the prompt onto `pending`; `begin_summary` and
+    `finish_summary` fold them into the running summary, which callers compute in the
+    background so no reply waits for it. Safe to use from the render loop and a worker thread.
+    """
+    def __init__(self, system_prompt=None, budget=1500, greeting=None):
+        self.budget = budget
+        self.lock = threading.Lock()
+        # Never trimmed or summarized, so every prompt for a persona starts with the same bytes
+        self.pinned = [{"role": role, "content": content}
+                       for role, content in (("system", system_prompt), ("assistant", greeting)) if content]
+        self.pinned_tokens = sum(self.message_tokens(message["content"]) for message in self.pinned)
+        self.turns = deque()  # (message, tokens), oldest first
+        self.turn_tokens = 0
+        self.pending = []  # Messages dropped from the prompt and not yet summarized
+        self.summarizing = 0  # Number of pending messages the running summary request covers
+        self.summary = ""
+        self.summary_tokens = 0
+
+    @staticmethod
+    def message_tokens(content):
+        return count_tokens(content) + MESSAGE_OVERHEAD
+
+    def __len__(self):
+        return len(self.turns) + len(self.pinned)
+
+    def append(self, role, content):
+        with self.lock:
+            tokens = self.message_tokens(content)
+            self.turns.append(({"role": role, "content": content}, tokens))
+            self.turn_tokens += tokens
+            self.trim()
+
+    def trim(self):
+        # Always keep the newest message, even if it alone is over budget
+        while len(self.turns) > 1 and self.prompt_tokens > self.budget:
+            message, tokens = self.turns.popleft()
+            self.turn_tokens -= tokens
+            self.pending.append(message)
+
+    @property
+    def prompt_tokens(self):
+        """Tokens in the prompt `messages` would build"""
+        return self.pinned_tokens + self.summary_tokens + self.turn_tokens
+
+    def messages(self):
+        """The messages to send: system prompt, greeting, summary of earlier turns, then the recent turns"""
+        with self.lock:
+            messages = list(self.pinned)
+            if self.summary:
+                messages.append({"role": "system", "content": SUMMARY_PREFIX + self.summary})
+            messages.extend(message for message, _ in self.turns)
+            return messages
+
+    def begin_summary(self):
+        """Messages for a request that folds the pending turns into the summary, or None if there is nothing to do"""
+        with self.lock:
+            if not self.pending or self.summarizing:
+                return None
+            self.summarizing = len(self.pending)
+            transcript = "\n".join(f"{message['role']}: {message['content']}" for message in self.pending)
+            if self.summary:
+                transcript = f"Earlier summary: {self.summary}\n\n{transcript}"
+            return [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}]
+
+    def finish_summary(self, summary):
+        """Install the result of the request from `begin_summary`; None (a failed request) keeps the turns pending"""
+        with self.lock:
+            if summary:
+                del self.pending[:self.summarizing]
+                self.summary = summary.strip()
+                self.summary_tokens = self.message_tokens(SUMMARY_PREFIX + self.summary)
+                self.trim()
+            self.summarizing = 0
@@ -0,0 +1,50 @@
+import math
+
+import numpy as np
+
+
+def perspective(fovy, aspect, near, far):
+    """Projection matrix with gluPerspective semantics"""
+    f = 1 / math.tan(math.radians(fovy) / 2)
+    matrix = np.zeros((4, 4))
+    matrix[0, 0] = f / aspect
+    matrix[1, 1] = f
+    matrix[2, 2] = (far + near) / (near - far)
+    matrix[2, 3] = 2 * far * near / (near - far)
+    matrix[3, 2] = -1
+    return matrix
+
+
+def frustum_planes(clip):
+    """The six planes (a, b, c, d) of a projection @ view matrix, normals pointing inwards and unit length"""
+    rows = np.asarray(clip, dtype=np.float64)
+    planes = np.array([
+        rows[3] + rows[0], rows[3] - rows[0],  # Left, right
+        rows[3] + rows[1], rows[3] - rows[1],  # Bottom, top
+        rows[3] + rows[2], rows[3] - rows[2],  # Near, far
+    ])
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+
+def visible_spheres(planes, centers, radii, eye=None, max_distance=None):
+    """Boolean mask of the bounding spheres that are at least partly inside the frustum (and in range)"""
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+    radii = np.asarray(radii, dtype=np.float64)
+    distances = centers @ planes[:, :3].T + planes[:, 3]
+    visible = np.all(distances >= -radii[:, None], axis=1)
+    if max_distance is not None:
+        visible &= np.linalg.norm(centers - eye, axis=1) - radii <= max_distance
+    return visible
+
+
+def visible_boxes(planes, mins, maxs, eye=None, max_distance=None):
+    """Boolean mask of the axis-aligned boxes that are at least partly inside the frustum (and in range)"""
+    mins = np.asarray(mins, dtype=np.float64).reshape(-1, 3)
+    maxs = np.asarray(maxs, dtype=np.float64).reshape(-1, 3)
+    # For each plane only the corner furthest along its normal needs testing
+    corners = np.where(planes[None, :, :3] > 0, maxs[:, None, :], mins[:, None, :])
+    visible = np.all(np.einsum("npk,pk->np", corners, planes[:, :3]) + planes[:, 3] >= 0, axis=1)
+    if max_distance is not None:
+        nearest = np.clip(eye, mins, maxs)
+        visible &= np.linalg.norm(nearest - eye, axis=1) <= max_distance
+    return visible
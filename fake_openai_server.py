@@ -0,0 +1,161 @@
+"""Local stand-in for the OpenAI endpoints used by websocket_server, for latency measurements.
+
+Run it, then start the server with OPENAI_BASE_URL=http://localhost:8900/v1 and any OPENAI_API_KEY.
+Delays are configurable so time-to-first-audio can be compared between pipeline versions.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import struct
+import time
+import wave
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = ("Thanks for stopping by. We just launched a new talent program this quarter. "
+         "It pairs every new hire with a mentor. Would you like to hear more about it?")
+
+
+# TTS response_format -> soundfile format, subtype and content type; anything else is answered with WAV
+TTS_FORMATS = {"opus": ("OGG", "OPUS", "audio/ogg"), "flac": ("FLAC", "PCM_16", "audio/flac")}
+
+
+def make_tone(seconds, sample_rate=24000, frequency=440):
+    """Build a short WAV tone to stand in for synthesized speech"""
+    frames = int(seconds * sample_rate)
+    samples = b"".join(
+        struct.pack("<h", int(8000 * math.sin(2 * math.pi * frequency * i / sample_rate)))
+        for i in range(frames)
+    )
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples)
+    return buffer.getvalue()
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    config = None
+    prompts = deque(maxlen=256)  # Recent prompts, for simulating the provider's prompt cache
+    tones = {}
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def tone(self, response_format):
+        """The stand-in speech encoded as requested, converted once per format"""
+        if response_format not in TTS_FORMATS:
+            return self.config.tone, "audio/wav"
+        if response_format not in self.tones:
+            import soundfile as sf
+            file_format, subtype, content_type = TTS_FORMATS[response_format]
+            samples, sample_rate = sf.read(io.BytesIO(self.config.tone), dtype="int16")
+            buffer = io.BytesIO()
+            sf.write(buffer, samples, sample_rate, format=file_format, subtype=subtype)
+            self.tones[response_format] = (buffer.getvalue(), content_type)
+        return self.tones[response_format]
+
+    def prompt_usage(self, messages, completion_tokens):
+        """Usage like the real API's: a prompt shares cached 128-token blocks with earlier prompts
+        once it reaches the cache minimum (tokens approximated as four characters)"""
+        text = json.dumps(messages)
+        prompt_tokens = len(text) // 4
+        cached = 0
+        if prompt_tokens >= self.config.cache_min_tokens:
+            shared = max((len(os.path.commonprefix([earlier, text])) // 4 for earlier in self.prompts), default=0)
+            if shared >= self.config.cache_min_tokens:
+                cached = shared // 128 * 128
+        self.prompts.append(text)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached}}
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        if self.path.endswith("/audio/transcriptions"):
+            time.sleep(self.config.stt_delay)
+            self.send_json({"text": "Hi, can you tell me about the talent program?"})
+
+        elif self.path.endswith("/chat/completions"):
+            request = json.loads(body)
+            time.sleep(self.config.chat_delay)
+            words = REPLY.split(" ")
+            if not request.get("stream"):
+                self.send_json({
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                    "model": request["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": REPLY}}],
+                    "usage": self.prompt_usage(request["messages"], len(words)),
+                })
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for i, word in enumerate(words):
+                chunk = {
+                    "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": request["model"],
+                    "choices": [{"index": 0, "finish_reason": None,
+                                 "delta": {"content": word if i == 0 else " " + word}}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(self.config.token_delay)
+            if request.get("stream_options", {}).get("include_usage"):
+                chunk = {
+                    "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                    "model": request["model"], "choices": [],
+                    "usage": self.prompt_usage(request["messages"], len(words)),
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.write(b"data: [DONE]\n\n")
+
+        elif self.path.endswith("/audio/speech"):
+            request = json.loads(body)
+            time.sleep(self.config.tts_delay + self.config.tts_delay_per_char * len(request["input"]))
+            audio, content_type = self.tone(request.get("response_format"))
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(audio)))
+            self.end_headers()
+            self.wfile.write(audio)
+
+        else:
+            self.send_error(404)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--stt-delay", type=float, default=0.4)
+    parser.add_argument("--chat-delay", type=float, default=0.3, help="Delay before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.03)
+    parser.add_argument("--tts-delay", type=float, default=0.2)
+    parser.add_argument("--tts-delay-per-char", type=float, default=0.004)
+    parser.add_argument("--cache-min-tokens", type=int, default=1024,
+                        help="Shortest prompt the simulated prompt cache applies to")
+    config = parser.parse_args()
+    config.tone = make_tone(0.5)
+
+    FakeOpenAIHandler.config = config
+    server = ThreadingHTTPServer(("localhost", config.port), FakeOpenAIHandler)
+    print(f"Fake OpenAI server listening on http://localhost:{config.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import time
+
+import numpy as np
+
+
+class FrameTimer:
+    """Per-stage frame times in a preallocated ring buffer of the last `capacity` frames.
+
+    Call `begin_frame`, then `mark(stage)` as each stage finishes (the time since the
+    previous mark is charged to that stage), then `end_frame`. Times are in milliseconds.
+    """
+    def __init__(self, stages, capacity=600):
+        self.stages = list(stages)
+        self.columns = {stage: i for i, stage in enumerate(self.stages)}
+        self.capacity = capacity
+        self.times = np.zeros((capacity, len(self.stages)), dtype=np.float32)
+        self.frames = 0  # Total frames ever recorded
+        self.row = np.zeros(len(self.stages), dtype=np.float32)
+        self.last_mark = None
+
+    def begin_frame(self):
+        self.row[:] = 0
+        self.last_mark = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.row[self.columns[stage]] += (now - self.last_mark) * 1000
+        self.last_mark = now
+
+    def end_frame(self):
+        self.times[self.frames % self.capacity] = self.row
+        self.frames += 1
+
+    def recent(self):
+        """Recorded frames, oldest first, as a (frames, stages) array"""
+        if self.frames <= self.capacity:
+            return self.times[:self.frames]
+        split = self.frames % self.capacity
+        return np.concatenate((self.times[split:], self.times[:split]))
+
+    def percentiles(self, q=(50, 95, 99)):
+        """{stage: percentiles} over the buffered frames, plus "frame" for whole-frame time"""
+        times = self.recent()
+        if not len(times):
+            return {}
+        result = dict(zip(self.stages, np.percentile(times, q, axis=0).T))
+        result["frame"] = np.percentile(times.sum(axis=1), q)
+        return result
+
+    def dump_csv(self, path):
+        """Write the buffered frames to a CSV file, one row per frame"""
+        times = self.recent()
+        with open(path, "w") as f:
+            f.write(",".join(["frame"] + [f"{stage}_ms" for stage in self.stages] + ["total_ms"]) + "\n")
+            first = self.frames - len(times)
+            for i, row in enumerate(times):
+                f.write(",".join([str(first + i)] + [f"{value:.3f}" for value in row] + [f"{row.sum():.3f}"]) + "\n")
+        return len(times)
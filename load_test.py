@@ -0,0 +1,78 @@
+"""Simulate N concurrent speech clients against websocket_server and report throughput.
+
+Start fake_openai_server.py and websocket_server.py (with OPENAI_BASE_URL pointing at the fake),
+then run e.g. `python load_test.py --clients 1 2 4 8 16`. "audio s" is the median time to first audio.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import numpy as np
+import websockets
+
+import audio_protocol
+
+SAMPLE_RATE = 16000
+BLOCK_SAMPLES = SAMPLE_RATE // 2
+
+
+async def simulated_client(url, utterances, audio, codec):
+    """Send a fixed utterance repeatedly, returning per-utterance (first audio, total) latencies"""
+    latencies = []
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.send(audio_protocol.hello_message())
+        json.loads(await ws.recv())
+        # Streamed in blocks, as the game sends speech while it is still being spoken
+        payloads = [audio_protocol.encode_audio(audio[i:i + BLOCK_SAMPLES], codec, SAMPLE_RATE)
+                    for i in range(0, len(audio), BLOCK_SAMPLES)]
+        for _ in range(utterances):
+            for payload in payloads:
+                await ws.send(audio_protocol.pack_frame(audio_protocol.AUDIO_CHUNK, payload, codec=codec,
+                                                        sample_rate=SAMPLE_RATE))
+            started = time.perf_counter()
+            await ws.send(json.dumps({"type": "end_of_audio"}))
+            first_audio = None
+            while True:
+                message = await ws.recv()
+                if isinstance(message, bytes):
+                    if first_audio is None:
+                        first_audio = time.perf_counter() - started
+                elif json.loads(message).get("type") == "end_of_response":
+                    break
+            total = time.perf_counter() - started
+            latencies.append((first_audio or total, total))
+    return latencies
+
+
+async def run_level(url, clients, utterances, audio, codec):
+    started = time.perf_counter()
+    results = await asyncio.gather(*(simulated_client(url, utterances, audio, codec) for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    first_audio, totals = zip(*(latency for result in results for latency in result))
+    return len(totals) / elapsed, statistics.median(first_audio), statistics.median(totals), max(totals)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="ws://localhost:8765")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--utterances", type=int, default=3, help="Utterances per client")
+    parser.add_argument("--seconds", type=float, default=2.0, help="Length of each utterance")
+    parser.add_argument("--codec", default="pcm_f32", choices=audio_protocol.supported_codecs(),
+                        help="Microphone audio codec")
+    args = parser.parse_args()
+
+    t = np.arange(int(args.seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    audio = (0.1 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+    print(f"{'clients':>8} {'utt/s':>8} {'audio s':>8} {'p50 s':>8} {'max s':>8}")
+    for clients in args.clients:
+        throughput, first_audio, median, worst = await run_level(args.url, clients, args.utterances, audio,
+                                                                 audio_protocol.CODEC_NAMES[args.codec])
+        print(f"{clients:>8} {throughput:>8.2f} {first_audio:>8.2f} {median:>8.2f} {worst:>8.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,193 @@
+import json
+
+import numpy as np
+
+from render_mesh import MeshBuilder, SPHERE_LODS, StaticMesh, VERTEX_FLOATS, unit_sphere
+
+PARTS = ("skin", "hair", "clothes_primary", "clothes_secondary")
+DEFAULT_SCALE = 0.6  # NPCs are drawn at about 60% of model size
+GRID_CELL_SIZE = 2.0  # Proximity grid cell, about the interaction distance
+
+
+def npc_template(slices, stacks):
+    """One NPC in model space: positions, normals, part index per vertex and triangle indices"""
+    positions, normals, parts, indices = [], [], [], []
+
+    def add(part, part_positions, part_normals, part_indices):
+        indices.append(part_indices + sum(len(p) for p in positions))
+        positions.append(part_positions)
+        normals.append(part_normals)
+        parts.append(np.full(len(part_positions), part))
+
+    sphere_normals, sphere_indices = unit_sphere(slices, stacks)
+    # Head, and hair slightly larger than the head and above it
+    add(0, sphere_normals * 0.12, sphere_normals, sphere_indices)
+    add(1, sphere_normals * 0.13 + (0, 0.05, 0), sphere_normals, sphere_indices)
+
+    # Body (torso), then arms and legs
+    for part, boxes in ((2, [((0, -0.3, 0), (0.3, 0.4, 0.2))]),
+                        (3, [((x, -0.3, 0), (0.1, 0.4, 0.1)) for x in (-0.2, 0.2)] +
+                            [((x, -0.8, 0), (0.1, 0.5, 0.1)) for x in (-0.1, 0.1)])):
+        mesh = MeshBuilder()
+        for offset, size in boxes:
+            mesh.push()
+            mesh.translate(*offset)
+            mesh.scale(*size)
+            mesh.cube()
+            mesh.pop()
+        vertices = mesh.build()
+        add(part, vertices[:, :3], vertices[:, 3:6], np.arange(len(vertices)))
+
+    return (np.vstack(positions).astype(np.float32), np.vstack(normals).astype(np.float32),
+            np.concatenate(parts), np.concatenate(indices).astype(np.uint32))
+
+
+class SpatialGrid:
+    """Uniform grid over the floor (x/z) for radius queries against a fixed set of points.
+
+    Points are sorted by cell, so the points in a run of neighbouring cells are one slice.
+    A query only measures the points in the cells its radius overlaps.
+    """
+    ROW = 1 << 32  # Cell key = column * ROW + row
+
+    def __init__(self, positions, cell_size):
+        self.cell_size = float(cell_size)
+        self.points = np.asarray(positions, dtype=np.float64).reshape(-1, 3)[:, [0, 2]]
+        cells = np.floor(self.points / self.cell_size).astype(np.int64)
+        keys = cells[:, 0] * self.ROW + cells[:, 1]
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def query(self, point, radius):
+        """Indices of the points in the cells within radius of point (a superset of the true hits)"""
+        low = np.floor((np.array((point[0], point[2])) - radius) / self.cell_size).astype(np.int64)
+        high = np.floor((np.array((point[0], point[2])) + radius) / self.cell_size).astype(np.int64)
+        columns = np.arange(low[0], high[0] + 1) * self.ROW
+        starts = np.searchsorted(self.keys, columns + low[1], side="left")
+        ends = np.searchsorted(self.keys, columns + high[1], side="right")
+        return np.concatenate([self.order[start:end] for start, end in zip(starts, ends)])
+
+    def nearest(self, point, radius, exclude=None):
+        """Index of the closest point within radius and its distance, or (None, inf)"""
+        candidates = self.query(point, radius)
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+        if not len(candidates):
+            return None, float("inf")
+        offsets = self.points[candidates] - (point[0], point[2])
+        distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        best = int(np.argmin(distances))
+        if distances[best] > radius:
+            return None, float("inf")
+        return int(candidates[best]), float(distances[best])
+
+
+class NPCCrowd:
+    """Every NPC in the office as parallel NumPy arrays, drawn in one batch per level of detail.
+
+    Every NPC is baked once per sphere detail into a single indexed mesh in world space, each
+    NPC's triangles one contiguous run of indices. A frame draws the NPCs at each level that
+    pass culling as runs of that mesh, one multi-draw call per detail level, so moving the
+    camera or changing the visible set never rebakes or uploads anything.
+    """
+    def __init__(self, roles, positions, scales, palettes, palette_index):
+        self.roles = list(roles)
+        self.positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+        self.scales = np.asarray(scales, dtype=np.float32)
+        self.palettes = np.asarray(palettes, dtype=np.float32).reshape(-1, len(PARTS), 3)
+        self.palette_index = np.asarray(palette_index, dtype=np.intp)
+        self.templates = {}  # (slices, stacks) -> npc_template arrays
+        self.batches = {}  # (slices, stacks) -> StaticMesh of every NPC at that detail
+        self.grid = None  # SpatialGrid for proximity queries, built on first use
+        self.bounding_spheres = None  # (centers, radii) for culling, built on first use
+
+    @classmethod
+    def load(cls, path):
+        """Read a roster: named colour palettes, and NPCs with a role, position and optional palette/scale"""
+        with open(path) as f:
+            config = json.load(f)
+        names = list(config["palettes"])
+        palettes = [[config["palettes"][name][part] for part in PARTS] for name in names]
+        npcs = config["npcs"]
+        return cls(
+            roles=[npc["role"] for npc in npcs],
+            positions=[npc["position"] for npc in npcs],
+            scales=[npc.get("scale", DEFAULT_SCALE) for npc in npcs],
+            palettes=palettes,
+            palette_index=[names.index(npc.get("palette", npc["role"])) for npc in npcs],
+        )
+
+    def __len__(self):
+        return len(self.roles)
+
+    def distance_to(self, index, point):
+        """Horizontal distance from point to one NPC"""
+        x, _, z = self.positions[index]
+        return float(np.hypot(x - point[0], z - point[2]))
+
+    def nearest(self, point, max_distance, exclude=None):
+        """Closest NPC within max_distance of point (optionally skipping one) as (index, distance), or (None, inf)"""
+        if self.grid is None:
+            self.grid = SpatialGrid(self.positions, GRID_CELL_SIZE)
+        return self.grid.nearest(point, max_distance, exclude)
+
+    def bounds(self):
+        """Bounding sphere centre and radius of every NPC"""
+        if self.bounding_spheres is None:
+            positions = self.template(SPHERE_LODS[0][1])[0]
+            low, high = positions.min(axis=0), positions.max(axis=0)
+            center = (low + high) / 2
+            radius = np.linalg.norm(positions - center, axis=1).max()
+            self.bounding_spheres = (self.positions + center * self.scales[:, None], radius * self.scales)
+        return self.bounding_spheres
+
+    def template(self, detail):
+        template = self.templates.get(detail)
+        if template is None:
+            template = self.templates[detail] = npc_template(*detail)
+        return template
+
+    def build_batch(self, detail, selected):
+        """World-space vertices and indices for the selected NPCs at one sphere detail"""
+        positions, normals, parts, indices = self.template(detail)
+        scales = self.scales[selected, None, None]
+        vertices = np.empty((len(selected), len(positions), VERTEX_FLOATS), dtype=np.float32)
+        vertices[:, :, :3] = positions * scales + self.positions[selected, None, :]
+        # The old per-NPC glScalef also scaled normals by 1/scale (GL_NORMALIZE is off)
+        vertices[:, :, 3:6] = normals / scales
+        vertices[:, :, 6:] = self.palettes[self.palette_index[selected]][:, parts]
+        offsets = np.arange(len(selected), dtype=np.uint32)[:, None] * len(positions)
+        return vertices.reshape(-1, VERTEX_FLOATS), (indices + offsets).reshape(-1)
+
+    def draw(self, camera_pos=None, visible=None):
+        """Draw every NPC, or only those set in the `visible` mask"""
+        if camera_pos is None:
+            levels = np.zeros(len(self), dtype=np.intp)
+        else:
+            limits = [limit for limit, _ in SPHERE_LODS[:-1]]
+            distances = np.linalg.norm(self.positions - np.asarray(camera_pos, dtype=np.float32), axis=1)
+            levels = np.searchsorted(limits, distances)
+        if visible is not None:
+            levels = np.where(visible, levels, -1)
+
+        for level, (_, detail) in enumerate(SPHERE_LODS):
+            selected = np.flatnonzero(levels == level)
+            if not len(selected):
+                continue
+            mesh = self.batches.get(detail)
+            if mesh is None:
+                mesh = self.batches[detail] = StaticMesh(*self.build_batch(detail, np.arange(len(self))))
+            # Neighbouring NPCs in the roster are one run of indices, so the whole crowd is a single range
+            breaks = np.flatnonzero(np.diff(selected) != 1) + 1
+            firsts = selected[np.concatenate(([0], breaks))]
+            lengths = np.diff(np.concatenate(([0], breaks, [len(selected)])))
+            per_npc = len(self.template(detail)[3])
+            mesh.draw_ranges(firsts * per_npc, lengths * per_npc)
+
+    def delete(self):
+        """Release the baked batches, grid and bounds; the next use rebuilds them, e.g. after editing positions"""
+        for mesh in self.batches.values():
+            mesh.delete()
+        self.batches.clear()
+        self.grid = None
+        self.bounding_spheres = None
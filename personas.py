@@ -0,0 +1,68 @@
+import json
+import os
+import threading
+from collections import namedtuple
+
+PERSONAS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "personas.json")
+
+Persona = namedtuple("Persona", ["role", "system_prompt", "greeting", "voice"])
+
+
+def usage_value(usage, *path):
+    """Read a possibly missing field from an API usage object or dict, e.g. ("prompt_tokens_details", "cached_tokens")"""
+    for name in path:
+        if usage is None:
+            return 0
+        usage = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+    return usage or 0
+
+
+class PersonaRegistry:
+    """NPC personas keyed by role, shared by the game and the WebSocket server.
+
+    Each system prompt is built once at load time, so every request for a role starts
+    with the same bytes and the provider's prompt cache can reuse that prefix; per-turn
+    content always comes after it. Cached prompt tokens reported by the API are tallied
+    per role.
+    """
+    def __init__(self, base_prompt, personas, default_role, fallback):
+        self.personas = {
+            role: Persona(role, f"{base_prompt}\n\n{persona['prompt']}", persona["greeting"], persona["voice"])
+            for role, persona in personas.items()
+        }
+        self.default_role = default_role
+        self.fallback = fallback  # Said when a reply can't be produced
+        self.lock = threading.Lock()
+        self.usage = {role: {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0} for role in self.personas}
+
+    @classmethod
+    def load(cls, path=PERSONAS_PATH):
+        """Read personas: a shared base prompt and fallback line, then a prompt, greeting and TTS voice per role
+        (prompts are lists of lines)"""
+        with open(path) as f:
+            config = json.load(f)
+        personas = {role: dict(persona, prompt="\n".join(persona["prompt"]))
+                    for role, persona in config["personas"].items()}
+        return cls("\n".join(config["base_prompt"]), personas, config["default_role"], config["fallback"])
+
+    def get(self, role):
+        """The persona for role, or the default persona for unknown roles"""
+        return self.personas.get(role) or self.personas[self.default_role]
+
+    def record_usage(self, role, usage):
+        """Add one response's usage (from a completion or the final streamed chunk) to the role's totals"""
+        role = self.get(role).role
+        with self.lock:
+            totals = self.usage[role]
+            totals["requests"] += 1
+            totals["prompt_tokens"] += usage_value(usage, "prompt_tokens")
+            totals["cached_tokens"] += usage_value(usage, "prompt_tokens_details", "cached_tokens")
+
+    def cache_report(self, role):
+        """One line summarizing the prompt cache hits for role"""
+        role = self.get(role).role
+        with self.lock:
+            totals = dict(self.usage[role])
+        share = totals["cached_tokens"] / totals["prompt_tokens"] if totals["prompt_tokens"] else 0
+        return (f"{role}: {totals['cached_tokens']} of {totals['prompt_tokens']} prompt tokens cached "
+                f"({share:.0%}) over {totals['requests']} requests")
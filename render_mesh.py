@@ -0,0 +1,333 @@
+import ctypes
+import math
+
+import numpy as np
+from OpenGL.GL import *
+
+# Interleaved vertex layout: position xyz, normal xyz, colour rgb
+VERTEX_FLOATS = 9
+VERTEX_STRIDE = VERTEX_FLOATS * 4
+
+# Unit cube corners and faces, as drawn by the old immediate-mode draw_cube
+CUBE_VERTICES = np.array([
+    [-0.5, -0.5,  0.5], [ 0.5, -0.5,  0.5], [ 0.5,  0.5,  0.5], [-0.5,  0.5,  0.5],
+    [-0.5, -0.5, -0.5], [-0.5,  0.5, -0.5], [ 0.5,  0.5, -0.5], [ 0.5, -0.5, -0.5],
+], dtype=np.float32)
+CUBE_FACES = [
+    [0, 1, 2, 3],  # Front
+    [3, 2, 6, 5],  # Top
+    [0, 3, 5, 4],  # Left
+    [1, 7, 6, 2],  # Right
+    [4, 5, 6, 7],  # Back
+    [0, 4, 7, 1],  # Bottom
+]
+
+
+def translation(x, y, z):
+    matrix = np.eye(4)
+    matrix[:3, 3] = (x, y, z)
+    return matrix
+
+
+def rotation(angle, x, y, z):
+    """Rotation matrix with glRotatef semantics (degrees about an axis)"""
+    axis = np.array([x, y, z], dtype=float)
+    axis /= np.linalg.norm(axis)
+    x, y, z = axis
+    c, s = math.cos(math.radians(angle)), math.sin(math.radians(angle))
+    matrix = np.eye(4)
+    matrix[:3, :3] = [
+        [x * x * (1 - c) + c, x * y * (1 - c) - z * s, x * z * (1 - c) + y * s],
+        [y * x * (1 - c) + z * s, y * y * (1 - c) + c, y * z * (1 - c) - x * s],
+        [x * z * (1 - c) - y * s, y * z * (1 - c) + x * s, z * z * (1 - c) + c],
+    ]
+    return matrix
+
+
+def scaling(x, y, z):
+    return np.diag([x, y, z, 1.0])
+
+
+class MeshBuilder:
+    """Records geometry the way the old glBegin/glVertex code drew it, but into NumPy arrays.
+
+    It mirrors the fixed-function state the drawing code relied on: a matrix stack
+    (push/pop/translate/rotate/scale), a current colour and a current normal. Quads are
+    split into triangles so a whole scene bakes into a single GL_TRIANGLES batch.
+    """
+    def __init__(self):
+        self.matrix = np.eye(4)
+        self.stack = []
+        self.color = (1.0, 1.0, 1.0)
+        self.normal = (0.0, 1.0, 0.0)
+        self.chunks = []
+
+    def push(self):
+        self.stack.append(self.matrix.copy())
+
+    def pop(self):
+        self.matrix = self.stack.pop()
+
+    def translate(self, x, y, z):
+        self.matrix = self.matrix @ translation(x, y, z)
+
+    def rotate(self, angle, x, y, z):
+        self.matrix = self.matrix @ rotation(angle, x, y, z)
+
+    def scale(self, x, y, z):
+        self.matrix = self.matrix @ scaling(x, y, z)
+
+    @property
+    def vertex_count(self):
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def set_color(self, r, g, b):
+        self.color = (r, g, b)
+
+    def set_normal(self, x, y, z):
+        self.normal = (x, y, z)
+
+    def triangles(self, vertices, normals=None):
+        """Add triangles given as consecutive vertex triples in model space"""
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        if normals is None:
+            normals = np.broadcast_to(self.normal, vertices.shape)
+        normals = np.asarray(normals, dtype=np.float64).reshape(-1, 3)
+
+        positions = vertices @ self.matrix[:3, :3].T + self.matrix[:3, 3]
+        # Transform normals the way the fixed-function pipeline would (inverse transpose, and
+        # no renormalizing since GL_NORMALIZE is off) so lighting matches the old drawing code
+        normals = normals @ np.linalg.inv(self.matrix[:3, :3])
+        colors = np.broadcast_to(self.color, vertices.shape)
+        self.chunks.append(np.hstack((positions, normals, colors)).astype(np.float32))
+
+    def quads(self, vertices, normals=None):
+        """Add quads given as consecutive vertex quadruples"""
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 4, 3)
+        order = [0, 1, 2, 0, 2, 3]
+        if normals is not None:
+            normals = np.asarray(normals, dtype=np.float64).reshape(-1, 4, 3)[:, order]
+        self.triangles(vertices[:, order], normals)
+
+    def cube(self):
+        """Unit cube with the same flat normal the immediate-mode version used"""
+        self.set_normal(0, 0, 1)
+        self.quads(CUBE_VERTICES[np.array(CUBE_FACES)])
+
+    def build(self):
+        """Interleaved float32 vertex data for everything recorded so far"""
+        if not self.chunks:
+            return np.empty((0, VERTEX_FLOATS), dtype=np.float32)
+        return np.ascontiguousarray(np.vstack(self.chunks))
+
+
+class StaticMesh:
+    """Baked triangles uploaded once and drawn with a single call.
+
+    Uses a vertex buffer object, or a display list when VBOs are unavailable. With
+    `indices` the triangles are drawn indexed.
+    """
+    def __init__(self, vertices, indices=None, use_vbo=True):
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+        self.indices = None if indices is None else np.ascontiguousarray(indices, dtype=np.uint32)
+        self.count = len(self.vertices) if indices is None else len(self.indices)
+        self.vbo = None
+        self.index_vbo = None
+        self.display_list = None
+        if use_vbo and bool(glGenBuffers):
+            self.vbo = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            glBufferData(GL_ARRAY_BUFFER, self.vertices.nbytes, self.vertices, GL_STATIC_DRAW)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            if self.indices is not None:
+                self.index_vbo = glGenBuffers(1)
+                glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_vbo)
+                glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, GL_STATIC_DRAW)
+                glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        else:
+            self.display_list = glGenLists(1)
+            glNewList(self.display_list, GL_COMPILE)
+            # Client arrays are copied into the list when it is compiled
+            self.draw_arrays(self.vertices.ctypes.data, self.indices)
+            glEndList()
+
+    def draw_arrays(self, base, indices=None, ranges=None):
+        """Issue the draw with pointers at base: 0 inside a bound VBO, or the client array's address.
+
+        `ranges` draws only some runs of the index buffer, as (byte offsets, index counts) arrays;
+        `indices` is then the address the offsets are relative to.
+        """
+        if self.count == 0:
+            return
+        glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(3, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(base))
+        glNormalPointer(GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(base + 12))
+        glColorPointer(3, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(base + 24))
+        if ranges is not None:
+            offsets, counts = ranges
+            offsets = np.asarray(offsets, dtype=np.uintp) + indices
+            counts = np.asarray(counts, dtype=np.int32)
+            if bool(glMultiDrawElements):
+                glMultiDrawElements(GL_TRIANGLES, counts, GL_UNSIGNED_INT, offsets, len(offsets))
+            else:
+                for offset, count in zip(offsets.tolist(), counts.tolist()):
+                    glDrawElements(GL_TRIANGLES, count, GL_UNSIGNED_INT, ctypes.c_void_p(offset))
+        elif indices is None:
+            glDrawArrays(GL_TRIANGLES, 0, self.count)
+        else:
+            glDrawElements(GL_TRIANGLES, self.count, GL_UNSIGNED_INT, indices)
+        glPopClientAttrib()
+
+    def draw(self):
+        if self.vbo is not None:
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            if self.index_vbo is not None:
+                glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_vbo)
+                self.draw_arrays(0, ctypes.c_void_p(0))
+                glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+            else:
+                self.draw_arrays(0)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+        else:
+            glCallList(self.display_list)
+
+    def draw_ranges(self, firsts, counts):
+        """Draw counts[i] indices starting at index firsts[i], for each run; indexed meshes only"""
+        if not len(counts):
+            return
+        offsets = np.asarray(firsts, dtype=np.uintp) * self.indices.itemsize
+        if self.vbo is not None:
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_vbo)
+            self.draw_arrays(0, 0, (offsets, counts))
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+        else:
+            # A display list can't draw part of itself, so use the client arrays it was compiled from
+            self.draw_arrays(self.vertices.ctypes.data, self.indices.ctypes.data, (offsets, counts))
+
+    def delete(self):
+        if self.vbo is not None:
+            glDeleteBuffers(1, [self.vbo])
+            self.vbo = None
+        if self.index_vbo is not None:
+            glDeleteBuffers(1, [self.index_vbo])
+            self.index_vbo = None
+        if self.display_list is not None:
+            glDeleteLists(self.display_list, 1)
+            self.display_list = None
+
+
+def draw_immediate(vertices):
+    """Replay baked vertices one glVertex call at a time, the way the scene used to be drawn"""
+    glBegin(GL_TRIANGLES)
+    for x, y, z, nx, ny, nz, r, g, b in vertices.tolist():
+        glColor3f(r, g, b)
+        glNormal3f(nx, ny, nz)
+        glVertex3f(x, y, z)
+    glEnd()
+
+
+# Sphere detail (slices, stacks) by distance from the camera; the last entry covers everything further
+SPHERE_LODS = ((4.0, (16, 16)), (8.0, (10, 10)), (None, (6, 6)))
+
+
+def sphere_detail(distance):
+    for max_distance, detail in SPHERE_LODS:
+        if max_distance is None or distance <= max_distance:
+            return detail
+
+
+def unit_sphere(slices, stacks):
+    """Normals (which double as unit-sphere positions) and triangle indices for one resolution"""
+    lat = math.pi * (-0.5 + np.arange(stacks + 1) / stacks)
+    lng = 2 * math.pi * np.arange(slices + 1) / slices
+    zr = np.cos(lat)[:, None]
+    normals = np.ascontiguousarray(np.stack((
+        np.cos(lng)[None, :] * zr,
+        np.sin(lng)[None, :] * zr,
+        np.broadcast_to(np.sin(lat)[:, None], (stacks + 1, slices + 1)),
+    ), axis=2).reshape(-1, 3), dtype=np.float32)
+
+    # Each quad of the old GL_QUAD_STRIPs as two triangles, split the same way GL splits them
+    a = (np.arange(stacks)[:, None] * (slices + 1) + np.arange(slices)[None, :]).reshape(-1)
+    b = a + slices + 1
+    indices = np.ascontiguousarray(np.stack((a, b, b + 1, a, b + 1, a + 1), axis=1).reshape(-1), dtype=np.uint32)
+    return normals, indices
+
+
+class SphereMesh:
+    """Unit sphere for one (slices, stacks) resolution, built once with NumPy.
+
+    Normals and triangle indices are shared; vertex positions are scaled per radius and
+    cached too, so drawing never touches the modelview matrix and lighting matches the
+    old per-vertex draw_sphere exactly.
+    """
+    def __init__(self, slices, stacks, use_vbo=True):
+        self.normals, self.indices = unit_sphere(slices, stacks)
+        self.count = len(self.indices)
+
+        self.positions = {}  # radius -> VBO id, or vertex array without VBOs
+        self.use_vbo = use_vbo and bool(glGenBuffers)
+        self.normal_vbo = self.index_vbo = None
+        if self.use_vbo:
+            self.normal_vbo, self.index_vbo = glGenBuffers(2)
+            glBindBuffer(GL_ARRAY_BUFFER, self.normal_vbo)
+            glBufferData(GL_ARRAY_BUFFER, self.normals.nbytes, self.normals, GL_STATIC_DRAW)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_vbo)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, GL_STATIC_DRAW)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def position_buffer(self, radius):
+        buffer = self.positions.get(radius)
+        if buffer is None:
+            positions = self.normals * np.float32(radius)
+            if self.use_vbo:
+                buffer = glGenBuffers(1)
+                glBindBuffer(GL_ARRAY_BUFFER, buffer)
+                glBufferData(GL_ARRAY_BUFFER, positions.nbytes, positions, GL_STATIC_DRAW)
+                glBindBuffer(GL_ARRAY_BUFFER, 0)
+            else:
+                buffer = positions
+            self.positions[radius] = buffer
+        return buffer
+
+    def draw(self, radius):
+        """Draw with the current colour, centred on the current origin"""
+        positions = self.position_buffer(radius)
+        glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        if self.use_vbo:
+            glBindBuffer(GL_ARRAY_BUFFER, self.normal_vbo)
+            glNormalPointer(GL_FLOAT, 0, ctypes.c_void_p(0))
+            glBindBuffer(GL_ARRAY_BUFFER, positions)
+            glVertexPointer(3, GL_FLOAT, 0, ctypes.c_void_p(0))
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_vbo)
+            glDrawElements(GL_TRIANGLES, self.count, GL_UNSIGNED_INT, ctypes.c_void_p(0))
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+        else:
+            glNormalPointer(GL_FLOAT, 0, self.normals)
+            glVertexPointer(3, GL_FLOAT, 0, positions)
+            glDrawElements(GL_TRIANGLES, self.count, GL_UNSIGNED_INT, self.indices)
+        glPopClientAttrib()
+
+    def delete(self):
+        if self.use_vbo:
+            glDeleteBuffers(2 + len(self.positions), [self.normal_vbo, self.index_vbo, *self.positions.values()])
+        self.positions.clear()
+
+
+sphere_meshes = {}  # (slices, stacks) -> SphereMesh
+
+
+def sphere_mesh(slices, stacks):
+    mesh = sphere_meshes.get((slices, stacks))
+    if mesh is None:
+        mesh = sphere_meshes[(slices, stacks)] = SphereMesh(slices, stacks)
+    return mesh
@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_PATH = os.getenv('RESPONSE_CACHE_PATH',
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "responses.sqlite"))
+NON_WORD = re.compile(r"[^\w\s]+")
+
+
+def normalize(text):
+    """Case, punctuation and spacing folded away, so trivially different inputs share a cache entry"""
+    return " ".join(NON_WORD.sub(" ", text.lower()).split())
+
+
+def conversation_key(messages):
+    """Every message normalized, summary included, so a reply is only reused for the same conversation"""
+    return [(message["role"], normalize(message["content"])) for message in messages]
+
+
+class ResponseCache:
+    """Two-level cache of NPC replies or synthesized speech: an in-memory LRU over a SQLite table.
+
+    Keys are any JSON-serializable parts, hashed; values are str or bytes. Entries expire
+    `ttl` seconds after they are stored (ttl <= 0 disables the cache), and the table is
+    trimmed least recently used first to `max_bytes`. With path=None only the memory
+    level is used. Safe to share between threads; asyncio code uses `get_async` and
+    `put_async`, which keep SQLite off the event loop.
+    """
+    def __init__(self, table, path=DEFAULT_PATH, ttl=7 * 24 * 3600, max_entries=256, max_bytes=64 << 20):
+        self.table = table
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()  # key -> (value, expires), least recently used first
+        self.lock = threading.Lock()  # Guards the memory level and counters
+        self.db_lock = threading.Lock()  # Guards SQLite, so a slow query never blocks a memory hit
+        self.hits = self.misses = 0
+        self.db = None
+        if path and ttl > 0:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute(f"CREATE TABLE IF NOT EXISTS {table} "
+                            "(key TEXT PRIMARY KEY, value BLOB, size INTEGER, expires REAL, used REAL)")
+            self.db.execute(f"DELETE FROM {table} WHERE expires < ?", (time.time(),))
+            self.stored_bytes = self.db.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+
+    @staticmethod
+    def key(parts):
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode()).hexdigest()
+
+    def get(self, *parts):
+        """The cached value for parts, or None"""
+        if self.ttl <= 0:
+            return None
+        key = self.key(parts)
+        value = self.memory_get(key)
+        return value if value is not None else self.disk_get(key)
+
+    async def get_async(self, *parts):
+        """`get` for the event loop: memory hits return inline, disk lookups run on a worker thread"""
+        if self.ttl <= 0:
+            return None
+        key = self.key(parts)
+        value = self.memory_get(key)
+        if value is None:
+            value = await asyncio.to_thread(self.disk_get, key) if self.db else self.disk_get(key)
+        return value
+
+    async def put_async(self, value, *parts):
+        """`put` for the event loop, on a worker thread when there is a disk level"""
+        if self.db:
+            await asyncio.to_thread(self.put, value, *parts)
+        else:
+            self.put(value, *parts)
+
+    def memory_get(self, key):
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry and entry[1] >= time.time():
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.memory.pop(key, None)
+            return None
+
+    def disk_get(self, key):
+        now = time.time()
+        row = None
+        with self.db_lock:
+            if self.db:
+                row = self.db.execute(f"SELECT value, expires FROM {self.table} WHERE key = ? AND expires >= ?",
+                                      (key, now)).fetchone()
+                if row:
+                    self.db.execute(f"UPDATE {self.table} SET used = ? WHERE key = ?", (now, key))
+        with self.lock:
+            if row:
+                self.remember(key, row[0], row[1])
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, value, *parts):
+        """Store value under parts in both levels"""
+        if self.ttl <= 0:
+            return
+        key = self.key(parts)
+        now = time.time()
+        with self.lock:
+            self.remember(key, value, now + self.ttl)
+        with self.db_lock:
+            if self.db:
+                size = len(value.encode() if isinstance(value, str) else value)
+                old = self.db.execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                self.db.execute(f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?, ?)",
+                                (key, value, size, now + self.ttl, now))
+                self.stored_bytes += size - (old[0] if old else 0)
+                if self.stored_bytes > self.max_bytes:
+                    self.evict()
+
+    def remember(self, key, value, expires):
+        self.memory[key] = (value, expires)
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def evict(self):
+        # Drop expired rows, then the least recently used until the table is back under budget
+        self.db.execute(f"DELETE FROM {self.table} WHERE expires < ?", (time.time(),))
+        freed = 0
+        keys = []
+        total = self.db.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        for key, size in self.db.execute(f"SELECT key, size FROM {self.table} ORDER BY used"):
+            if total - freed <= self.max_bytes:
+                break
+            keys.append((key,))
+            freed += size
+        self.db.executemany(f"DELETE FROM {self.table} WHERE key = ?", keys)
+        self.stored_bytes = total - freed
+
+    def close(self):
+        with self.db_lock:
+            if self.db:
+                self.db.close()
+                self.db = None
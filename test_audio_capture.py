@@ -0,0 +1,50 @@
+import numpy as np
+
+from audio_capture import AudioRingBuffer
+
+
+def ramp(start, count):
+    """Samples whose values are their own stream positions, so reads are easy to check"""
+    return np.arange(start, start + count, dtype=np.float32)
+
+
+def test_reads_across_the_wraparound():
+    buffer = AudioRingBuffer(1000)
+    position = 0
+    for count in (300, 300, 300, 300, 250):  # Wraps once part-way through a block
+        buffer.write(ramp(position, count).reshape(-1, 1))
+        position += count
+    assert buffer.written == 1450
+    assert np.array_equal(buffer.read(800, 1200), ramp(800, 400))
+    assert np.array_equal(buffer.read(1000), ramp(1000, 450))
+
+
+def test_reads_are_clamped_to_what_is_still_buffered():
+    buffer = AudioRingBuffer(1000)
+    buffer.write(ramp(0, 2500))
+    # The first 1500 samples were overwritten, and nothing past `written` exists yet
+    assert np.array_equal(buffer.read(0, 3000), ramp(1500, 1000))
+    assert len(buffer.read(2600, 2700)) == 0
+
+
+def test_block_larger_than_the_buffer_keeps_its_tail():
+    buffer = AudioRingBuffer(100)
+    buffer.write(ramp(0, 50))
+    buffer.write(ramp(50, 250))
+    assert buffer.written == 300
+    assert np.array_equal(buffer.read(0), ramp(200, 100))
+
+
+def test_clear_starts_over():
+    buffer = AudioRingBuffer(100)
+    buffer.write(ramp(0, 150))
+    buffer.clear()
+    buffer.write(ramp(0, 10))
+    assert np.array_equal(buffer.read(0), ramp(0, 10))
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,89 @@
+import json
+
+import numpy as np
+
+import audio_protocol
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds=0.5, frequency=220, amplitude=0.5):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+
+
+def round_trip(samples, name):
+    """Encode, frame, unframe and decode samples the way mic audio travels to the server"""
+    codec = audio_protocol.CODEC_NAMES[name]
+    frame = audio_protocol.pack_frame(audio_protocol.AUDIO_CHUNK, audio_protocol.encode_audio(samples, codec, SAMPLE_RATE),
+                                      codec=codec, seq=7, sample_rate=SAMPLE_RATE)
+    unpacked = audio_protocol.unpack_frame(frame)
+    assert (unpacked.kind, unpacked.codec, unpacked.seq, unpacked.sample_rate) == \
+        (audio_protocol.AUDIO_CHUNK, codec, 7, SAMPLE_RATE)
+    return audio_protocol.decode_audio(unpacked.payload, unpacked.codec)
+
+
+def test_pcm_frame_round_trip():
+    samples = tone()
+    frame = audio_protocol.pack_frame(audio_protocol.AUDIO_CHUNK, samples, seq=65537, sample_rate=SAMPLE_RATE)
+    unpacked = audio_protocol.unpack_frame(frame)
+    # The sequence number wraps at 16 bits
+    assert (unpacked.kind, unpacked.codec, unpacked.seq, unpacked.sample_rate) == \
+        (audio_protocol.AUDIO_CHUNK, audio_protocol.CODEC_PCM_F32, 1, SAMPLE_RATE)
+    assert np.array_equal(audio_protocol.pcm_from_payload(unpacked.payload), samples)
+
+
+def test_lossless_codecs_round_trip():
+    samples = tone()
+    assert np.array_equal(round_trip(samples, "pcm_f32"), samples)
+    for name in ("pcm_s16", "flac"):
+        decoded = round_trip(samples, name)
+        assert len(decoded) == len(samples)
+        assert np.abs(decoded - samples).max() <= 1 / 16384, name
+
+
+def test_opus_round_trip_keeps_the_signal():
+    if "opus" not in audio_protocol.supported_codecs():
+        return  # libsndfile too old for Opus
+    samples = tone()
+    decoded = round_trip(samples, "opus")
+    # Opus resamples and adds a little latency, so compare levels rather than samples
+    assert abs(len(decoded) - len(samples)) <= SAMPLE_RATE // 10
+    assert abs(np.sqrt(np.mean(decoded ** 2)) - np.sqrt(np.mean(samples ** 2))) < 0.05
+
+
+def test_undecodable_payload_raises_value_error():
+    for codec in (audio_protocol.CODEC_FLAC, audio_protocol.CODEC_OPUS, 99):
+        try:
+            audio_protocol.decode_audio(b"not audio", codec)
+        except ValueError:
+            continue
+        raise AssertionError(f"codec {codec} accepted garbage")
+
+
+def test_short_frame_is_rejected():
+    try:
+        audio_protocol.unpack_frame(b"\x01\x00")
+    except ValueError:
+        return
+    raise AssertionError("short frame accepted")
+
+
+def test_negotiation():
+    assert audio_protocol.negotiate(None) == audio_protocol.LEGACY_PROTOCOL_VERSION
+    assert audio_protocol.negotiate("2") == 2
+    assert audio_protocol.negotiate(99) == audio_protocol.PROTOCOL_VERSION
+    hello = json.loads(audio_protocol.hello_message(codecs=["flac", "pcm_f32"]))
+    assert hello == {"type": "hello", "protocol": audio_protocol.PROTOCOL_VERSION, "codecs": ["flac", "pcm_f32"]}
+    assert audio_protocol.choose_codec(["pcm_s16", "flac"], codecs=["opus", "flac", "pcm_s16"]) == \
+        audio_protocol.CODEC_FLAC
+    assert audio_protocol.choose_codec(None) == audio_protocol.CODEC_PCM_F32
+    assert audio_protocol.choose_tts_format(["flac", "opus"]) == "opus"
+    assert audio_protocol.choose_tts_format(["pcm_f32"]) == "mp3"
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
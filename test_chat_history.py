@@ -0,0 +1,74 @@
+from chat_history import SUMMARY_PREFIX, ConversationHistory
+
+
+def turn(i):
+    return "user" if i % 2 == 0 else "assistant", f"Message number {i} " + "about the venture studio " * 5
+
+
+def test_oldest_turns_leave_the_prompt_to_stay_in_budget():
+    history = ConversationHistory("You are an NPC.", budget=200)
+    for i in range(20):
+        history.append(*turn(i))
+        assert history.prompt_tokens <= history.budget
+    messages = history.messages()
+    assert messages[0] == {"role": "system", "content": "You are an NPC."}
+    # The newest turns stay, in order, and everything dropped waits to be summarized
+    assert messages[-1]["content"] == turn(19)[1]
+    assert len(history.pending) + len(messages) - 1 == 20
+    assert history.pending[0]["content"] == turn(0)[1]
+
+
+def test_newest_message_is_kept_even_over_budget():
+    history = ConversationHistory(budget=10)
+    history.append("user", "word " * 100)
+    assert len(history.messages()) == 1
+
+
+def test_summary_replaces_pending_turns():
+    history = ConversationHistory("You are an NPC.", budget=200)
+    for i in range(20):
+        history.append(*turn(i))
+    request = history.begin_summary()
+    assert request is not None and history.begin_summary() is None  # One summary request at a time
+    summarized = list(history.pending)
+    assert turn(0)[1] in request[1]["content"]
+    history.append(*turn(20))  # Arrives while the summary is being written
+    history.finish_summary("The player asked about the studio.")
+    messages = history.messages()
+    assert messages[1] == {"role": "system", "content": SUMMARY_PREFIX + "The player asked about the studio."}
+    assert history.prompt_tokens <= history.budget
+    assert history.summarizing == 0
+    assert not any(message in history.pending for message in summarized)
+
+
+def test_greeting_stays_after_the_system_prompt():
+    history = ConversationHistory("You are an NPC.", budget=200, greeting="Welcome to the studio!")
+    prefix = [{"role": "system", "content": "You are an NPC."},
+              {"role": "assistant", "content": "Welcome to the studio!"}]
+    for i in range(20):
+        history.append(*turn(i))
+        assert history.messages()[:2] == prefix
+    assert history.prompt_tokens <= history.budget
+    assert all(message not in history.pending for message in prefix)
+    history.begin_summary()
+    history.finish_summary("The player asked about the studio.")
+    messages = history.messages()
+    assert messages[:2] == prefix and messages[2]["content"].startswith(SUMMARY_PREFIX)
+
+
+def test_failed_summary_keeps_turns_pending():
+    history = ConversationHistory("You are an NPC.", budget=200)
+    for i in range(20):
+        history.append(*turn(i))
+    pending = list(history.pending)
+    history.begin_summary()
+    history.finish_summary(None)
+    assert history.pending == pending and history.summary == ""
+    assert history.begin_summary() is not None  # Can be retried
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,68 @@
+import math
+
+import numpy as np
+
+from culling import frustum_planes, perspective, visible_boxes, visible_spheres
+
+PROJECTION = perspective(45, 4 / 3, 0.1, 50.0)
+
+
+def view(eye, yaw=0.0):
+    """View matrix for an eye at `eye` turned `yaw` degrees about +y (looking down -z at yaw 0)"""
+    angle = math.radians(yaw)
+    rotation = np.eye(4)
+    rotation[0, 0] = rotation[2, 2] = math.cos(angle)
+    rotation[0, 2], rotation[2, 0] = -math.sin(angle), math.sin(angle)
+    translation = np.eye(4)
+    translation[:3, 3] = -np.asarray(eye, dtype=float)
+    return rotation @ translation
+
+
+def test_perspective_matches_glu():
+    f = 1 / math.tan(math.radians(45) / 2)
+    point = PROJECTION @ np.array([1.0, 1.0, -10.0, 1.0])
+    assert np.allclose(point[:2] / point[3], (f / (4 / 3) / 10, f / 10))
+    # The near and far planes map to -1 and 1 in normalized depth
+    for z, depth in ((-0.1, -1.0), (-50.0, 1.0)):
+        clip = PROJECTION @ np.array([0.0, 0.0, z, 1.0])
+        assert math.isclose(clip[2] / clip[3], depth, abs_tol=1e-9)
+
+
+def test_planes_are_unit_and_point_inwards():
+    planes = frustum_planes(PROJECTION @ view((0, 0, 0)))
+    assert np.allclose(np.linalg.norm(planes[:, :3], axis=1), 1)
+    # A point straight ahead is on the inside of every plane
+    assert np.all(planes[:, :3] @ (0, 0, -10) + planes[:, 3] > 0)
+
+
+def test_spheres_ahead_behind_beside_and_beyond():
+    planes = frustum_planes(PROJECTION @ view((0, 1, 5)))
+    centers = [(0, 1, 0), (0, 1, 10), (30, 1, 0), (0, 1, -60), (0, 1, -46)]
+    radii = [0.5, 0.5, 0.5, 0.5, 1.5]  # The last one pokes through the far plane
+    assert visible_spheres(planes, centers, radii).tolist() == [True, False, False, False, True]
+
+
+def test_turning_around_swaps_what_is_visible():
+    centers, radii = [(0, 0, -10), (0, 0, 10)], [0.5, 0.5]
+    ahead = visible_spheres(frustum_planes(PROJECTION @ view((0, 0, 0))), centers, radii)
+    behind = visible_spheres(frustum_planes(PROJECTION @ view((0, 0, 0), yaw=180)), centers, radii)
+    assert ahead.tolist() == [True, False]
+    assert behind.tolist() == [False, True]
+
+
+def test_boxes_and_draw_distance():
+    eye = np.array([0.0, 1.0, 5.0])
+    planes = frustum_planes(PROJECTION @ view(eye))
+    mins = [(-1, 0, -1), (-1, 0, 8), (-40, 0, -30), (-1, 0, -31)]
+    maxs = [(1, 2, 1), (1, 2, 9), (40, 2, -29), (1, 2, -29)]
+    # The wide box straddles the frustum even though all its corners are outside it
+    assert visible_boxes(planes, mins, maxs).tolist() == [True, False, True, True]
+    assert visible_boxes(planes, mins, maxs, eye, max_distance=20).tolist() == [True, False, False, False]
+    assert visible_spheres(planes, [(0, 1, -14), (0, 1, -16)], [0.5, 0.5], eye, 20).tolist() == [True, False]
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
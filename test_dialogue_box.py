@@ -0,0 +1,49 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "hide")
+
+import pygame
+
+from app import MAX_REPLY_TOKENS, DialogueSystem, reply_lines
+from chat_history import count_tokens
+
+PLAIN = ("When we launched our first venture five years ago, we had three people and a whiteboard. "
+         "Today our studio supports fifteen portfolio companies, and our metrics show that founders "
+         "in the residency program reach their first paying customer twice as fast. ")
+LONG_WORDS = ("Organizational responsibilities, interdisciplinary collaboration and comprehensive "
+              "infrastructure considerations characterize entrepreneurship internationally. ")
+
+
+def longest_reply(text, tokens=MAX_REPLY_TOKENS):
+    """The text repeated and cut to at most `tokens` tokens, like a reply stopped by max_tokens"""
+    words = (text * 20).split()
+    while count_tokens(" ".join(words)) > tokens:
+        words.pop()
+    return " ".join(words)
+
+
+def test_longest_reply_fits_message_box():
+    dialogue = DialogueSystem(headless=True)
+    lines = reply_lines(dialogue.font, dialogue.text_width)
+    surface = pygame.Surface((dialogue.text_width, lines * dialogue.line_height))
+    for text in (PLAIN, LONG_WORDS):
+        reply = longest_reply(text)
+        height = dialogue.text_layout.render(surface, reply, 0, 0, dialogue.text_width, dialogue.line_height)
+        assert height <= lines * dialogue.line_height, (text[:20], height)
+
+
+def test_overlong_text_shows_its_end():
+    dialogue = DialogueSystem(headless=True)
+    surface = pygame.Surface((dialogue.text_width, 100))
+    reply = longest_reply(PLAIN, 4 * MAX_REPLY_TOKENS)
+    height = dialogue.text_layout.render(surface, reply, 0, 0, dialogue.text_width, dialogue.line_height,
+                                         max_lines=3)
+    assert height == 3 * dialogue.line_height
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
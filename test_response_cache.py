@@ -0,0 +1,86 @@
+import asyncio
+import os
+import tempfile
+import time
+
+from response_cache import ResponseCache, conversation_key, normalize
+
+
+def test_normalized_inputs_share_an_entry():
+    assert normalize("  What's the PLAN,  for Europe?! ") == "what s the plan for europe"
+    cache = ResponseCache("replies", path=None)
+    cache.put("We expand in spring.", "CEO", conversation_key([{"role": "user", "content": "What's the plan?"}]))
+    assert cache.get("CEO", conversation_key([{"role": "user", "content": "what's the plan"}])) == "We expand in spring."
+    assert cache.get("HR", conversation_key([{"role": "user", "content": "what's the plan"}])) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_replies_depend_on_the_whole_conversation():
+    cache = ResponseCache("replies", path=None)
+    tail = [{"role": "assistant", "content": "Welcome to the studio."}, {"role": "user", "content": "And then?"}]
+    earlier = [{"role": "system", "content": "You are the CEO."}, {"role": "user", "content": "Tell me about Europe."}]
+    summary = {"role": "system", "content": "Summary of the conversation so far: the player asked about hiring."}
+    cache.put("We expand in spring.", "CEO", conversation_key(earlier + tail))
+    assert cache.get("CEO", conversation_key(earlier + tail)) == "We expand in spring."
+    # Same last two messages, but a different question earlier or a summary in between
+    other = [earlier[0], {"role": "user", "content": "Tell me about hiring."}]
+    assert cache.get("CEO", conversation_key(other + tail)) is None
+    assert cache.get("CEO", conversation_key(earlier[:1] + [summary] + tail)) is None
+
+
+def test_memory_level_drops_least_recently_used():
+    cache = ResponseCache("replies", path=None, max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get(1)  # 1 is now more recent than 2
+    cache.put("c", 3)
+    assert (cache.get(1), cache.get(2), cache.get(3)) == ("a", None, "c")
+
+
+def test_entries_expire_and_ttl_zero_disables():
+    cache = ResponseCache("replies", path=None, ttl=0.05)
+    cache.put("soon gone", "key")
+    assert cache.get("key") == "soon gone"
+    time.sleep(0.1)
+    assert cache.get("key") is None
+    disabled = ResponseCache("replies", path=None, ttl=0)
+    disabled.put("value", "key")
+    assert disabled.get("key") is None
+
+
+def test_disk_level_survives_restart_and_evicts_to_budget():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.sqlite")
+        cache = ResponseCache("speech", path, max_bytes=10_000)
+        for i in range(5):
+            cache.put(bytes(3000), i)
+            time.sleep(0.01)  # Distinct last-used times
+        cache.close()
+
+        cache = ResponseCache("speech", path, max_bytes=10_000)
+        assert cache.stored_bytes <= 10_000
+        assert cache.get(0) is None and cache.get(4) == bytes(3000)
+        cache.close()
+
+
+def test_async_access_from_the_event_loop():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "cache.sqlite")
+        ResponseCache("replies", path).put("stored earlier", "key")
+
+        async def lookups():
+            cache = ResponseCache("replies", path)
+            first = await cache.get_async("key")  # From disk, on a worker thread
+            second = await cache.get_async("key")  # From memory
+            await cache.put_async("new", "other")
+            cache.close()
+            return first, second, cache.get("other")
+
+        assert asyncio.run(lookups()) == ("stored earlier", "stored earlier", "new")
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,100 @@
+import asyncio
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "hide")
+
+import numpy as np
+
+from app import SpeechHandler
+from test_vad import BLOCK, SAMPLE_RATE, silence, voiced
+
+
+def recording_handler(**attributes):
+    """A SpeechHandler recording without a microphone; its loop only runs when `sent` drains it"""
+    handler = SpeechHandler()
+    for name, value in attributes.items():
+        setattr(handler, name, value)
+    handler.loop = asyncio.new_event_loop()
+    handler.utterances = asyncio.Queue()
+    handler.is_recording = True
+    return handler
+
+
+def feed(handler, *parts):
+    """Pass a signal through the audio callback in capture-sized blocks"""
+    signal = np.concatenate(parts).astype(np.float32)
+    for offset in range(0, len(signal), BLOCK):
+        block = signal[offset:offset + BLOCK].reshape(-1, 1)
+        handler.audio_callback(block, len(block), None, None)
+
+
+def sent(handler):
+    """The utterances handed to the consumer, as sample counts, the last one possibly unfinished"""
+    handler.loop.run_until_complete(asyncio.sleep(0))
+    handler.loop.close()
+    utterances = [0]
+    while not handler.utterances.empty():
+        chunk = handler.utterances.get_nowait()
+        if chunk is None:
+            utterances.append(0)
+        else:
+            utterances[-1] += len(chunk)
+    return utterances
+
+
+def test_utterance_is_cut_at_max_length():
+    handler = recording_handler(max_utterance_seconds=3)
+    feed(handler, silence(0.5), voiced(8.0), silence(1.0), voiced(1.0), silence(1.0))
+    first, second, unfinished = sent(handler)
+    assert 3 * SAMPLE_RATE <= first < 3 * SAMPLE_RATE + BLOCK
+    # The rest of the long stretch is dropped, and the next one starts after a pause as usual
+    assert SAMPLE_RATE <= second < 2 * SAMPLE_RATE
+    assert unfinished == 0
+
+
+def test_shorter_speech_is_not_cut():
+    handler = recording_handler(max_utterance_seconds=3)
+    feed(handler, silence(0.5), voiced(2.0), silence(1.0))
+    (length, unfinished) = sent(handler)
+    assert 2 * SAMPLE_RATE <= length < 3 * SAMPLE_RATE
+    assert unfinished == 0
+
+
+def playing(handler, amplitude):
+    """Pretend the NPC's reply is playing at the level of speech with the given amplitude"""
+    handler.player.buffered = 10 * SAMPLE_RATE
+    handler.player.level = float(np.mean(np.square(voiced(1.0, amplitude))))
+
+
+def test_playback_echo_opens_no_utterance():
+    handler = recording_handler()
+    playing(handler, amplitude=0.3)
+    # The reply picked up again by the mic, quieter than it was played
+    feed(handler, silence(0.5), voiced(2.0, amplitude=0.15), silence(1.0))
+    assert sent(handler) == [0]
+    assert handler.player.is_playing and not handler.barged_in
+
+
+def test_voice_over_quiet_playback_barges_in():
+    handler = recording_handler()
+    playing(handler, amplitude=0.03)
+    feed(handler, silence(0.5), voiced(2.0), silence(1.0))
+    (length, unfinished) = sent(handler)
+    assert length >= 2 * SAMPLE_RATE and unfinished == 0
+    assert not handler.player.is_playing and handler.barged_in
+
+
+def test_without_barge_in_speech_during_playback_is_ignored():
+    handler = recording_handler(barge_in=False)
+    playing(handler, amplitude=0.03)
+    feed(handler, silence(0.5), voiced(2.0), silence(1.0))
+    assert sent(handler) == [0]
+    assert handler.player.is_playing
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,49 @@
+from tile_map import CollisionGrid, TileMap
+
+# 6 x 4 units centred on the origin: x runs from -3 to 3 and z from -2 to 2, walls all round
+ROOM = [
+    "WWWWWW",
+    "W....W",
+    "W....W",
+    "WWWWWW",
+]
+
+
+def test_walls_footprints_and_outside_are_blocked():
+    grid = CollisionGrid(TileMap(ROOM))
+    assert grid.is_blocked(-2.5, 0) and not grid.is_blocked(0, 0)
+    assert grid.is_blocked(10, 0)
+    grid.block_rect(0.1, 0.1, 0.4, 0.4)
+    assert grid.is_blocked(0.3, 0.3) and not grid.is_blocked(-0.3, -0.3)
+
+
+def test_circle_against_walls():
+    grid = CollisionGrid(TileMap(ROOM))
+    assert not grid.circle_blocked(0, 0, 0.3)
+    assert grid.circle_blocked(1.8, 0, 0.3)  # Reaches into the wall at x = 2
+    assert not grid.circle_blocked(1.65, 0, 0.3)
+
+
+def test_movement_slides_along_walls_and_does_not_tunnel():
+    grid = CollisionGrid(TileMap(ROOM))
+    # Heading diagonally into the right wall: x stops short of it, z keeps going
+    x, z = grid.move_circle(1.0, -0.5, 2.0, 0.5, 0.3)
+    assert 1.5 <= x <= 1.7 and abs(z) < 1e-9
+    # One huge step still stops at the wall instead of jumping over it
+    x, z = grid.move_circle(0, 0, 50, 0, 0.3)
+    assert x < 1.7
+
+
+def test_tile_size_must_be_a_multiple_of_cell_size():
+    try:
+        CollisionGrid(TileMap(ROOM, tile_size=1.0), cell_size=0.3)
+    except ValueError:
+        return
+    raise AssertionError("accepted a cell size that doesn't divide the tiles")
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
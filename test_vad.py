@@ -0,0 +1,92 @@
+import io
+
+import numpy as np
+import soundfile as sf
+
+from audio_capture import VoiceActivityDetector
+
+SAMPLE_RATE = 16000
+BLOCK = 1024
+
+
+def voiced(seconds, amplitude=0.3, pitch=140):
+    """Harmonic tone with a syllable-rate envelope, a rough stand-in for voiced speech"""
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    tone = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 5))
+    envelope = 0.6 + 0.4 * np.sin(2 * np.pi * 4 * t)
+    return amplitude * envelope * tone / 2
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE))
+
+
+def hum(seconds, amplitude=0.05):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return amplitude * np.sin(2 * np.pi * 60 * t)
+
+
+def through_wav(*parts):
+    """Round-trip the synthetic signal through an in-memory WAV like a recorded file"""
+    buffer = io.BytesIO()
+    sf.write(buffer, np.concatenate(parts).astype(np.float32), SAMPLE_RATE, format="WAV", subtype="PCM_16")
+    buffer.seek(0)
+    data, _ = sf.read(buffer, dtype="float32")
+    return data
+
+
+def run_vad(signal, **kwargs):
+    """Feed a signal in capture-sized blocks and return (start, end) utterance positions"""
+    vad = VoiceActivityDetector(sample_rate=SAMPLE_RATE, **kwargs)
+    events = []
+    for offset in range(0, len(signal), BLOCK):
+        events.extend(vad.process(signal[offset:offset + BLOCK].reshape(-1, 1)))
+    events.extend(vad.flush())
+    starts = [position for kind, position in events if kind == "start"]
+    ends = [position for kind, position in events if kind == "end"]
+    assert len(starts) == len(ends)
+    return list(zip(starts, ends))
+
+
+def test_short_pause_stays_one_utterance():
+    signal = through_wav(silence(0.5), voiced(1.0), silence(0.25), voiced(1.0), silence(1.0))
+    assert len(run_vad(signal)) == 1
+
+
+def test_long_pause_splits_utterances():
+    signal = through_wav(silence(0.5), voiced(1.0), silence(1.5), voiced(1.0), silence(1.0))
+    assert len(run_vad(signal)) == 2
+
+
+def test_preroll_keeps_onset():
+    signal = through_wav(silence(0.5), voiced(1.0), silence(1.0))
+    (start, end), = run_vad(signal, preroll_ms=200)
+    onset = int(0.5 * SAMPLE_RATE)
+    assert onset - int(0.2 * SAMPLE_RATE) <= start <= onset
+    assert end >= int(1.5 * SAMPLE_RATE)
+
+
+def test_silence_and_noise_only_produce_nothing():
+    assert run_vad(through_wav(silence(3.0))) == []
+    rng = np.random.default_rng(0)
+    assert run_vad(through_wav(rng.normal(0, 0.05, 3 * SAMPLE_RATE))) == []
+
+
+def test_noise_floor_adapts_to_steady_hum():
+    # The hum alone is far above the old fixed 0.01 peak threshold
+    assert run_vad(through_wav(hum(3.0))) == []
+    signal = through_wav(hum(1.0), hum(1.0) + voiced(1.0), hum(1.5))
+    assert len(run_vad(signal)) == 1
+
+
+def test_long_utterance_is_not_lost_to_floor_rise():
+    signal = through_wav(silence(0.5), voiced(8.0), silence(1.0))
+    (start, end), = run_vad(signal)
+    assert end - start >= 8 * SAMPLE_RATE
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
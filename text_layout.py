@@ -0,0 +1,90 @@
+from collections import OrderedDict
+
+
+class TextLayoutCache:
+    """Word-wraps text for one font and keeps the rendered line surfaces between frames.
+
+    Layout is only recomputed when the text changes, and text that grows by appending
+    (streamed tokens) re-wraps just its last line. Lines are rasterized once and reused,
+    so steady-state frames do no font rendering at all.
+    """
+    def __init__(self, font, color=(255, 255, 255), max_surfaces=256):
+        self.font = font
+        self.color = color
+        self.max_surfaces = max_surfaces
+        self.surfaces = OrderedDict()  # line text -> surface, least recently used first
+        self.word_widths = {}
+        self.layouts = {}  # (text, max_width) -> lines
+        self.last_layout = {}  # max_width -> (text, lines), for incremental re-wrapping
+        self.rasterized = 0  # Number of font.render calls, for benchmarks and debugging
+
+    def word_width(self, word):
+        width = self.word_widths.get(word)
+        if width is None:
+            # font.size measures without rasterizing
+            width = self.word_widths[word] = self.font.size(word + ' ')[0]
+        return width
+
+    def wrap_words(self, text, max_width, lines):
+        current_line = []
+        current_width = 0
+        for word in text.split():
+            word_width = self.word_width(word)
+            if current_width + word_width <= max_width or not current_line:
+                current_line.append(word)
+                current_width += word_width
+            else:
+                lines.append(' '.join(current_line))
+                current_line = [word]
+                current_width = word_width
+        if current_line:
+            lines.append(' '.join(current_line))
+        return lines
+
+    def layout(self, text, max_width):
+        """Return the wrapped lines of text, reusing earlier layouts where possible"""
+        key = (text, max_width)
+        lines = self.layouts.get(key)
+        if lines is not None:
+            return lines
+
+        previous = self.last_layout.get(max_width)
+        if previous and previous[1] and text.startswith(previous[0]):
+            # Greedy wrapping never changes earlier lines when text is appended
+            previous_text, previous_lines = previous
+            separator = ' ' if previous_text[-1:].isspace() else ''
+            tail = previous_lines[-1] + separator + text[len(previous_text):]
+            lines = self.wrap_words(tail, max_width, previous_lines[:-1])
+        else:
+            lines = self.wrap_words(text, max_width, [])
+
+        if len(self.layouts) > 64:
+            self.layouts.clear()
+        self.layouts[key] = lines
+        self.last_layout[max_width] = (text, lines)
+        return lines
+
+    def line_surface(self, line):
+        """Rendered surface for one line of text"""
+        surface = self.surfaces.get(line)
+        if surface is None:
+            surface = self.font.render(line, True, self.color)
+            self.rasterized += 1
+            self.surfaces[line] = surface
+            if len(self.surfaces) > self.max_surfaces:
+                self.surfaces.popitem(last=False)
+        else:
+            self.surfaces.move_to_end(line)
+        return surface
+
+    def render(self, surface, text, x, y, max_width, line_height, max_lines=None):
+        """Blit wrapped text onto surface and return the height it used.
+
+        Text longer than max_lines shows its last max_lines lines, so streamed text stays in view.
+        """
+        lines = self.layout(text, max_width)
+        if max_lines is not None:
+            lines = lines[-max_lines:]
+        for i, line in enumerate(lines):
+            surface.blit(self.line_surface(line), (x, y + i * line_height))
+        return len(lines) * line_height
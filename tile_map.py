@@ -0,0 +1,130 @@
+import math
+
+import numpy as np
+
+WALL = "W"
+
+
+def runs(mask):
+    """(start, end) index pairs of the runs of True in a 1-D boolean array"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([False], mask, [False])).astype(np.int8)))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+class TileMap:
+    """A level laid out as rows of characters ('W' wall, anything else floor), centred on the origin.
+
+    Row index runs along +z and column index along +x; each tile is `tile_size` units square.
+    """
+    def __init__(self, rows, tile_size=1.0):
+        self.rows = list(rows)
+        self.tile_size = float(tile_size)
+        self.walls = np.array([[char == WALL for char in row] for row in self.rows], dtype=bool)
+        depth, width = self.walls.shape
+        self.origin = (-width * self.tile_size / 2, -depth * self.tile_size / 2)  # World x, z of tile (0, 0)
+
+    def tile_rect(self, row, col, rows=1, cols=1):
+        """World x0, z0, x1, z1 of a block of tiles"""
+        x0 = self.origin[0] + col * self.tile_size
+        z0 = self.origin[1] + row * self.tile_size
+        return x0, z0, x0 + cols * self.tile_size, z0 + rows * self.tile_size
+
+    def floor_rects(self):
+        """Floor as few rectangles as possible: runs of floor tiles, merged down identical rows"""
+        rects = []
+        open_runs = {}  # (first col, end col) -> first row
+        for row in range(len(self.walls) + 1):
+            row_runs = set(runs(~self.walls[row])) if row < len(self.walls) else set()
+            for run in list(open_runs):
+                if run not in row_runs:
+                    first = open_runs.pop(run)
+                    rects.append(self.tile_rect(first, run[0], row - first, run[1] - run[0]))
+            for run in row_runs:
+                open_runs.setdefault(run, row)
+        return rects
+
+    def wall_faces(self):
+        """Vertical wall faces as (x0, z0, x1, z1) segments wherever a wall tile borders floor, merged into runs"""
+        walls = np.pad(self.walls, 1, constant_values=True)
+        faces = []
+        # Edge line i of the padded grid lies between map rows (or columns) i - 1 and i
+        for line, mask in enumerate(walls[1:, :] != walls[:-1, :]):
+            for start, end in runs(mask):
+                x0, z0, x1, _ = self.tile_rect(line, start - 1, 1, end - start)
+                faces.append((x0, z0, x1, z0))
+        for line, mask in enumerate((walls[:, 1:] != walls[:, :-1]).T):
+            for start, end in runs(mask):
+                x0, z0, _, z1 = self.tile_rect(start - 1, line, end - start, 1)
+                faces.append((x0, z0, x0, z1))
+        return faces
+
+
+class CollisionGrid:
+    """Boolean occupancy grid over a TileMap for O(1) lookups and swept-circle movement.
+
+    Walls come from the map; furniture and other obstacles are added as footprint
+    rectangles. A footprint blocks every cell it touches, and anything outside the map
+    is solid.
+    """
+    def __init__(self, tile_map, cell_size=0.25):
+        per_tile = tile_map.tile_size / cell_size
+        if abs(per_tile - round(per_tile)) > 1e-6:
+            raise ValueError("tile_size must be a multiple of cell_size")
+        per_tile = int(round(per_tile))
+        self.cell_size = float(cell_size)
+        self.origin = tile_map.origin
+        self.blocked = np.repeat(np.repeat(tile_map.walls, per_tile, axis=0), per_tile, axis=1)
+        self.rows, self.cols = self.blocked.shape
+
+    def cell(self, x, z):
+        return (int(math.floor((z - self.origin[1]) / self.cell_size)),
+                int(math.floor((x - self.origin[0]) / self.cell_size)))
+
+    def block_rect(self, x0, z0, x1, z1):
+        """Mark every cell overlapping the rectangle as blocked"""
+        row0, col0 = self.cell(x0, z0)
+        row1, col1 = self.cell(x1, z1)
+        self.blocked[max(row0, 0):max(row1 + 1, 0), max(col0, 0):max(col1 + 1, 0)] = True
+
+    def is_blocked(self, x, z):
+        row, col = self.cell(x, z)
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return bool(self.blocked[row, col])
+        return True
+
+    def circle_blocked(self, x, z, radius):
+        """Whether a circle overlaps any blocked cell (or leaves the map)"""
+        row0, col0 = self.cell(x - radius, z - radius)
+        row1, col1 = self.cell(x + radius, z + radius)
+        if row0 < 0 or col0 < 0 or row1 >= self.rows or col1 >= self.cols:
+            return True
+        window = self.blocked[row0:row1 + 1, col0:col1 + 1]
+        if not window.any():
+            return False
+        # Exact test: distance from the centre to the nearest point of each blocked cell
+        rows, cols = np.nonzero(window)
+        left = self.origin[0] + (col0 + cols) * self.cell_size
+        top = self.origin[1] + (row0 + rows) * self.cell_size
+        dx = np.clip(x, left, left + self.cell_size) - x
+        dz = np.clip(z, top, top + self.cell_size) - z
+        return bool(np.any(dx * dx + dz * dz < radius * radius))
+
+    def move_circle(self, x, z, dx, dz, radius):
+        """Move a circle by (dx, dz), sliding along whatever it hits; returns the new x, z.
+
+        The move is split into steps of at most half a cell so it can't tunnel through thin
+        obstacles, and each axis is resolved separately so the circle slides along walls.
+        """
+        steps = max(1, math.ceil(max(abs(dx), abs(dz)) / (self.cell_size / 2)))
+        step_x, step_z = dx / steps, dz / steps
+        for _ in range(steps):
+            moved = False
+            if step_x and not self.circle_blocked(x + step_x, z, radius):
+                x += step_x
+                moved = True
+            if step_z and not self.circle_blocked(x, z + step_z, radius):
+                z += step_z
+                moved = True
+            if not moved:
+                break
+        return x, z
@@ -1,14 +1,23 @@
 import asyncio
 import websockets
+import io
 import json
 import os
+import re
+import time
 import soundfile as sf
 import numpy as np
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
-import requests
 import logging
 
+import audio_protocol
+from audio_capture import VoiceActivityDetector
+from chat_history import ConversationHistory
+from personas import PersonaRegistry
+from response_cache import ResponseCache, conversation_key
+
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -20,122 +29,478 @@ if not api_key:
     raise ValueError("OpenAI API key not found")
 logger.info("API key loaded successfully")
 
-client = OpenAI(api_key=api_key)
+# Point OPENAI_BASE_URL at a local fake server to measure latency without the real API
+base_url = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1').rstrip('/')
+client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+# Pooled HTTP session for the TTS endpoint
+http_session = httpx.AsyncClient(
+    timeout=httpx.Timeout(30.0),
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+)
+
+# Per-stage concurrency limits shared by all connections
+stage_limits = {
+    "stt": asyncio.Semaphore(int(os.getenv('STT_CONCURRENCY', 8))),
+    "chat": asyncio.Semaphore(int(os.getenv('CHAT_CONCURRENCY', 8))),
+    "tts": asyncio.Semaphore(int(os.getenv('TTS_CONCURRENCY', 16)))
+}
+
+SAMPLE_RATE = 16000
+# While the utterance is still arriving, audio is handed to Whisper at pauses at least this long,
+# in segments of at least MIN_SEGMENT_SECONDS; unbroken speech is cut after MAX_SEGMENT_SECONDS
+PAUSE_MS = 250
+MIN_SEGMENT_SECONDS = 2
+MAX_SEGMENT_SECONDS = 10
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+# Sentences of one reply synthesized at the same time; audio is still sent in sentence order
+SENTENCE_TTS_CONCURRENCY = int(os.getenv('SENTENCE_TTS_CONCURRENCY', 3))
+# Prompt tokens per chat request; older turns are folded into a running summary
+HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', 1500))
+
+# Personas are loaded once so every request for a role shares a byte-identical prompt prefix
+personas = PersonaRegistry.load()
 
-# Store conversation history for each connection
+# Replies keyed by (persona, normalized history tail) and speech keyed by (voice, text), in memory and on disk
+reply_cache = ResponseCache("replies", ttl=int(os.getenv('REPLY_CACHE_TTL', 24 * 3600)))
+speech_cache = ResponseCache("speech", ttl=int(os.getenv('SPEECH_CACHE_TTL', 30 * 24 * 3600)),
+                             max_bytes=int(os.getenv('SPEECH_CACHE_MB', 256)) << 20)
+
+# Store conversation history and NPC role for each connection
 conversation_histories = {}
+npc_roles = {}
+# Strong references to fire-and-forget tasks so they aren't garbage collected mid-run
+background_tasks = set()
+
+async def send_audio_response(websocket, protocol, audio_data, seq=0):
+    """Send TTS audio using the framing negotiated for this connection"""
+    if protocol >= 2:
+        await websocket.send(audio_protocol.pack_frame(
+            audio_protocol.AUDIO_RESPONSE,
+            audio_data,
+            codec=audio_protocol.CODEC_ENCODED,
+            seq=seq
+        ))
+    else:
+        await websocket.send(json.dumps({
+            "type": "audio_response",
+            "audio": audio_data.hex()
+        }))
+
+def encode_wav(audio_data):
+    """Encode PCM audio as an in-memory WAV file"""
+    buffer = io.BytesIO()
+    sf.write(buffer, audio_data, SAMPLE_RATE, format="WAV")
+    return buffer.getvalue()
+
+async def transcribe_segment(audio_data):
+    """Transcribe one segment of PCM audio with Whisper"""
+    wav_bytes = await asyncio.to_thread(encode_wav, audio_data)
+    async with stage_limits["stt"]:
+        transcript = await client.audio.transcriptions.create(
+            model="whisper-1",
+            file=("utterance.wav", wav_bytes)
+        )
+    return transcript.text
+
+async def synthesize_speech(text, voice="alloy", response_format="mp3"):
+    """Convert text to speech, returning the encoded audio or None on failure"""
+    audio_data = await speech_cache.get_async("tts-1", voice, response_format, text)
+    if audio_data is not None:
+        return audio_data
+    async with stage_limits["tts"]:
+        tts_response = await http_session.post(
+            f"{base_url}/audio/speech",
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": "tts-1",
+                "input": text,
+                "voice": voice,
+                "response_format": response_format
+            }
+        )
+    if tts_response.status_code != 200:
+        logger.error(f"TTS request failed: {tts_response.status_code} {tts_response.text}")
+        return None
+    await speech_cache.put_async(tts_response.content, "tts-1", voice, response_format, text)
+    return tts_response.content
+
+async def presynthesize():
+    """Synthesize every persona's greeting and the fallback line up front so they play without waiting on TTS"""
+    started = time.perf_counter()
+    lines = {(persona.voice, line) for persona in personas.personas.values()
+             for line in (persona.greeting, personas.fallback)}
+    # In the format current clients ask for; legacy clients synthesize on demand
+    response_format = audio_protocol.choose_tts_format(audio_protocol.supported_codecs())
+    results = await asyncio.gather(*(synthesize_speech(text, voice, response_format) for voice, text in lines),
+                                   return_exceptions=True)
+    ready = sum(isinstance(result, bytes) for result in results)
+    logger.info(f"Pre-synthesized {ready} of {len(lines)} lines in {time.perf_counter() - started:.2f}s")
+
+async def speak_line(websocket, protocol, text, voice, response_format):
+    """Send one fixed line as speech (greetings, the fallback line), logging rather than raising on failure"""
+    try:
+        audio_data = await synthesize_speech(text, voice, response_format)
+        if audio_data is not None:
+            await send_audio_response(websocket, protocol, audio_data)
+    except websockets.exceptions.ConnectionClosed:
+        raise
+    except Exception as e:
+        logger.error(f"Could not speak line: {e}")
+
+async def chat_tokens(messages, npc_role):
+    """Yield chat completion tokens as they are streamed back"""
+    async with stage_limits["chat"]:
+        stream = await client.chat.completions.create(
+            model="gpt-4-0125-preview",
+            messages=messages,
+            temperature=0.85,
+            max_tokens=150,
+            stream=True,
+            # Usage arrives in a final chunk; openai 1.12 has no stream_options argument yet
+            extra_body={"stream_options": {"include_usage": True}}
+        )
+        async for chunk in stream:
+            if getattr(chunk, "usage", None):
+                personas.record_usage(npc_role, chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+async def cached_tokens(reply):
+    """A cached reply, delivered like a stream that sends everything at once"""
+    yield reply
+
+async def summarize_history(history):
+    """Fold turns that no longer fit the token budget into the history's running summary"""
+    messages = history.begin_summary()
+    if not messages:
+        return
+    summary = None
+    try:
+        async with stage_limits["chat"]:
+            response = await client.chat.completions.create(
+                model="gpt-4-0125-preview",
+                messages=messages,
+                temperature=0.3,
+                max_tokens=150
+            )
+        summary = response.choices[0].message.content
+    except Exception as e:
+        logger.error(f"Summary request failed: {e}")
+    history.finish_summary(summary)
+
+def start_background(coroutine):
+    """Run a coroutine as a fire-and-forget task"""
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+def start_conversation(connection_id, npc_role):
+    """Begin a fresh history for the NPC's persona; clients that never name an NPC get the default"""
+    persona = personas.get(npc_role)
+    history = ConversationHistory(persona.system_prompt, HISTORY_TOKEN_BUDGET, persona.greeting)
+    conversation_histories[connection_id] = history
+    npc_roles[connection_id] = persona.role
+
+class SentenceSplitter:
+    """Accumulates streamed tokens and emits complete sentences"""
+    def __init__(self):
+        self.pending = ""
+
+    def feed(self, token):
+        self.pending += token
+        parts = SENTENCE_END.split(self.pending)
+        self.pending = parts.pop()
+        return [part.strip() for part in parts if part.strip()]
+
+    def flush(self):
+        tail, self.pending = self.pending.strip(), ""
+        return tail
+
+class Utterance:
+    """Transcribes an utterance segment by segment while its audio is still arriving.
+
+    Segments end in the pauses between phrases so no word is split between two Whisper calls;
+    speech without a pause is cut at its quietest frame once MAX_SEGMENT_SECONDS is pending.
+    """
+    def __init__(self):
+        self.vad = VoiceActivityDetector(SAMPLE_RATE, hangover_ms=PAUSE_MS, preroll_ms=0)
+        self.pending = []
+        self.pending_samples = 0
+        self.segment_start = 0  # Position in the utterance of the first pending sample
+        self.segments = []
+
+    def feed(self, audio_chunk):
+        self.pending.append(audio_chunk)
+        self.pending_samples += len(audio_chunk)
+        for event, position in self.vad.process(audio_chunk):
+            # An end event marks the last speech frame before a pause; cut in the middle of the pause
+            if event == "end" and position - self.segment_start >= MIN_SEGMENT_SECONDS * SAMPLE_RATE:
+                self.flush(position + self.vad.hangover // 2)
+        if self.pending_samples >= MAX_SEGMENT_SECONDS * SAMPLE_RATE:
+            self.flush(self.quietest_point())
+
+    def quietest_point(self):
+        """Position of the quietest frame in the second half of the pending audio"""
+        audio_data = np.concatenate(self.pending)
+        self.pending = [audio_data]
+        frame_size = self.vad.frame_size
+        half = len(audio_data) // 2
+        count = (len(audio_data) - half) // frame_size
+        frames = audio_data[half:half + count * frame_size].reshape(count, frame_size)
+        quietest = int(np.argmin(np.mean(np.square(frames), axis=1)))
+        return self.segment_start + half + quietest * frame_size + frame_size // 2
+
+    def flush(self, end=None):
+        """Start transcribing the pending audio up to position end, or all of it"""
+        if not self.pending:
+            return
+        audio_data = np.concatenate(self.pending)
+        cut = len(audio_data) if end is None else min(max(end - self.segment_start, 0), len(audio_data))
+        rest = audio_data[cut:]
+        self.pending = [rest] if len(rest) else []
+        self.pending_samples = len(rest)
+        self.segment_start += cut
+        if cut:
+            self.segments.append(asyncio.ensure_future(transcribe_segment(audio_data[:cut])))
+
+    def __bool__(self):
+        return bool(self.pending or self.segments)
+
+    async def transcript(self):
+        # Leftover pause after the last cut would only give Whisper silence to hallucinate on
+        if not self.segments or self.vad.last_speech_end > self.segment_start:
+            self.flush()
+        texts = await asyncio.gather(*self.segments)
+        return " ".join(text.strip() for text in texts if text and text.strip())
+
+    def cancel(self):
+        for segment in self.segments:
+            segment.cancel()
+
+async def synthesize_limited(text, voice, response_format, limit):
+    async with limit:
+        return await synthesize_speech(text, voice, response_format)
+
+async def speak_sentences(websocket, protocol, syntheses, timings, started):
+    """Send each queued sentence's audio, in sentence order, as soon as it and every earlier one are ready"""
+    seq = 0
+    while True:
+        synthesis = await syntheses.get()
+        if synthesis is None:
+            break
+        try:
+            audio_data = await synthesis
+        except Exception as e:
+            logger.error(f"Sentence synthesis failed: {e}")
+            continue
+        if audio_data is None:
+            continue
+        await send_audio_response(websocket, protocol, audio_data, seq=seq)
+        if seq == 0:
+            timings["first_audio"] = time.perf_counter() - started
+            logger.info(f"Time to first audio: {timings['first_audio']:.3f}s")
+        seq += 1
+
+async def stream_response(websocket, protocol, tokens, voice, response_format, timings, started):
+    """Stream chat tokens to the client and start TTS on each completed sentence.
+
+    Up to SENTENCE_TTS_CONCURRENCY sentences are synthesized at once, so a long reply's
+    later sentences are ready by the time the earlier ones have been sent.
+    """
+    syntheses = asyncio.Queue()
+    speaker = asyncio.create_task(speak_sentences(websocket, protocol, syntheses, timings, started))
+    limit = asyncio.Semaphore(SENTENCE_TTS_CONCURRENCY)
+    splitter = SentenceSplitter()
+    reply = []
+
+    def synthesize(sentence):
+        syntheses.put_nowait(asyncio.ensure_future(synthesize_limited(sentence, voice, response_format, limit)))
+
+    try:
+        async for token in tokens:
+            if not reply:
+                timings["first_token"] = time.perf_counter() - started
+            reply.append(token)
+            await websocket.send(json.dumps({"type": "chat_token", "text": token}))
+            for sentence in splitter.feed(token):
+                synthesize(sentence)
+        tail = splitter.flush()
+        if tail:
+            synthesize(tail)
+    finally:
+        syntheses.put_nowait(None)
+        try:
+            await speaker
+        finally:
+            # Only left over if the speaker failed; don't leave their errors unretrieved
+            while not syntheses.empty():
+                synthesis = syntheses.get_nowait()
+                if synthesis is not None:
+                    synthesis.cancel()
+    return "".join(reply)
+
+async def batch_response(websocket, protocol, tokens, voice, response_format):
+    """Legacy clients expect a single audio message per utterance"""
+    reply = "".join([token async for token in tokens])
+    audio_data = await synthesize_speech(reply, voice, response_format)
+    if audio_data is not None:
+        await send_audio_response(websocket, protocol, audio_data)
+        logger.info("Audio response sent to client")
+    return reply
+
+async def handle_utterance(websocket, protocol, tts_format, connection_id, utterance, started):
+    """Run the transcription -> chat -> TTS pipeline for one utterance"""
+    timings = {}
+    user_input = await utterance.transcript()
+    timings["transcribe"] = time.perf_counter() - started
+    logger.info(f"Transcribed text: {user_input}")
+    if not user_input:
+        if protocol >= 3:
+            await websocket.send(json.dumps({"type": "end_of_response", "timings": timings,
+                                             "error": "No speech recognized"}))
+        return
+
+    if protocol >= 3:
+        await websocket.send(json.dumps({"type": "transcript", "text": user_input}))
+
+    # Add to conversation history
+    history = conversation_histories[connection_id]
+    npc_role = npc_roles[connection_id]
+    history.append("user", user_input)
+    messages = history.messages()
+    logger.info(f"Prompt: {len(messages)} messages, {history.prompt_tokens} tokens")
+
+    persona = personas.get(npc_role)
+    cache_key = (persona.role, persona.system_prompt, conversation_key(messages))
+    cached_reply = await reply_cache.get_async(*cache_key)
+    if cached_reply:
+        logger.info("Reply cache hit")
+        tokens = cached_tokens(cached_reply)
+    else:
+        tokens = chat_tokens(messages, npc_role)
+
+    if protocol >= 3:
+        ai_response = await stream_response(websocket, protocol, tokens, persona.voice, tts_format, timings, started)
+    else:
+        ai_response = await batch_response(websocket, protocol, tokens, persona.voice, tts_format)
+    logger.info(f"AI response: {ai_response}")
+    if not cached_reply:
+        logger.info(f"Prompt cache: {personas.cache_report(npc_role)}")
+        if ai_response:
+            await reply_cache.put_async(ai_response, *cache_key)
+
+    # Add AI response to history
+    history.append("assistant", ai_response)
+    # Summarize in the background so the next reply never waits for it
+    start_background(summarize_history(history))
+
+    timings["total"] = time.perf_counter() - started
+    logger.info(f"Utterance timings: {timings}")
+    if protocol >= 3:
+        await websocket.send(json.dumps({"type": "end_of_response", "timings": timings}))
 
 async def process_audio(websocket):
     logger.info("Client connected")
-    audio_buffer = []
-    sample_rate = 16000
+    utterance = Utterance()
     connection_id = id(websocket)
-    conversation_histories[connection_id] = []
+    start_conversation(connection_id, None)
+    # Clients that never send a hello are treated as legacy hex-in-JSON clients playing mp3
+    protocol = audio_protocol.LEGACY_PROTOCOL_VERSION
+    tts_format = "mp3"
 
     try:
         while True:
             try:
                 message = await websocket.recv()
+
+                if isinstance(message, bytes):
+                    frame = audio_protocol.unpack_frame(message)
+                    if frame.kind == audio_protocol.AUDIO_CHUNK:
+                        if frame.codec in audio_protocol.COMPRESSED_CODECS:
+                            audio_chunk = await asyncio.to_thread(audio_protocol.decode_audio, frame.payload, frame.codec)
+                        else:
+                            audio_chunk = audio_protocol.decode_audio(frame.payload, frame.codec)
+                        logger.debug(f"Binary audio chunk size: {len(audio_chunk)}")
+                        utterance.feed(audio_chunk)
+                    else:
+                        logger.warning(f"Unexpected binary frame kind: {frame.kind}")
+                    continue
+
                 data = json.loads(message)
 
-                if data.get("type") == "audio_chunk":
+                if data.get("type") == "hello":
+                    protocol = audio_protocol.negotiate(data.get("protocol"))
+                    tts_format = audio_protocol.choose_tts_format(data.get("codecs"))
+                    await websocket.send(audio_protocol.hello_message(protocol))
+                    logger.info(f"Negotiated protocol version {protocol}, client codecs {data.get('codecs')}, "
+                                f"TTS format {tts_format}")
+
+                elif data.get("type") == "npc":
+                    start_conversation(connection_id, data.get("role"))
+                    logger.info(f"Talking as {npc_roles[connection_id]}")
+                    if data.get("greet") and protocol >= 3:
+                        persona = personas.get(npc_roles[connection_id])
+                        await speak_line(websocket, protocol, persona.greeting, persona.voice, tts_format)
+                        await websocket.send(json.dumps({"type": "end_of_response", "timings": {}}))
+
+                elif data.get("type") == "audio_chunk":
                     logger.info("Received audio chunk")
                     audio_chunk = np.frombuffer(bytes.fromhex(data["chunk"]), dtype=np.float32)
                     logger.debug(f"Audio chunk size: {len(audio_chunk)}")
-                    audio_buffer.append(audio_chunk)
+                    utterance.feed(audio_chunk)
 
                 elif data.get("type") == "end_of_audio":
                     logger.info("Processing complete audio")
-                    if audio_buffer:
+                    if utterance:
+                        started = time.perf_counter()
                         try:
-                            # Combine audio chunks and save
-                            audio_data = np.concatenate(audio_buffer)
-                            temp_file = "temp_audio.wav"
-                            sf.write(temp_file, audio_data, sample_rate)
-
-                            # Transcribe audio using Whisper
-                            with open(temp_file, "rb") as audio_file:
-                                transcript = client.audio.transcriptions.create(
-                                    model="whisper-1",
-                                    file=audio_file
-                                )
-                            user_input = transcript.text
-                            logger.info(f"Transcribed text: {user_input}")
-
-                            # Add to conversation history
-                            conversation_histories[connection_id].append({
-                                "role": "user",
-                                "content": user_input
-                            })
-
-                            # Get AI response
-                            response = client.chat.completions.create(
-                                model="gpt-4-0125-preview",
-                                messages=conversation_histories[connection_id],
-                                temperature=0.85,
-                                max_tokens=150
-                            )
-                            ai_response = response.choices[0].message.content
-                            logger.info(f"AI response: {ai_response}")
-
-                            # Add AI response to history
-                            conversation_histories[connection_id].append({
-                                "role": "assistant",
-                                "content": ai_response
-                            })
-
-                            # Convert to speech
-                            tts_response = requests.post(
-                                "https://api.openai.com/v1/audio/speech",
-                                headers={
-                                    "Authorization": f"Bearer {api_key}",
-                                    "Content-Type": "application/json"
-                                },
-                                json={
-                                    "model": "tts-1",
-                                    "input": ai_response,
-                                    "voice": "alloy"
-                                }
-                            )
-
-                            if tts_response.status_code == 200:
-                                audio_data = tts_response.content
-                                logger.info("TTS conversion successful")
-
-                                # Send response
-                                response_message = json.dumps({
-                                    "type": "audio_response",
-                                    "audio": audio_data.hex()
-                                })
-                                await websocket.send(response_message)
-                                logger.info("Audio response sent to client")
-
-                            # Cleanup
-                            if os.path.exists(temp_file):
-                                os.remove(temp_file)
-                            audio_buffer = []
-
+                            await handle_utterance(websocket, protocol, tts_format, connection_id, utterance, started)
+                        except websockets.exceptions.ConnectionClosed:
+                            raise
                         except Exception as e:
                             logger.error(f"Error processing audio: {e}", exc_info=True)
+                            if protocol >= 3:
+                                persona = personas.get(npc_roles[connection_id])
+                                await speak_line(websocket, protocol, personas.fallback, persona.voice, tts_format)
+                                await websocket.send(json.dumps({"type": "end_of_response", "error": str(e)}))
+                        finally:
+                            utterance = Utterance()
+                    elif protocol >= 3:
+                        # The client waits for end_of_response after every end_of_audio
+                        await websocket.send(json.dumps({"type": "end_of_response", "timings": {},
+                                                         "error": "No audio received"}))
 
             except json.JSONDecodeError as e:
                 logger.error(f"JSON decode error: {e}")
+            except ValueError as e:
+                logger.error(f"Malformed binary frame: {e}")
 
     except websockets.exceptions.ConnectionClosed:
         logger.info("Client disconnected")
-        if connection_id in conversation_histories:
-            del conversation_histories[connection_id]
     except Exception as e:
         logger.error(f"Unexpected error: {e}", exc_info=True)
+    finally:
+        utterance.cancel()
+        conversation_histories.pop(connection_id, None)
+        npc_roles.pop(connection_id, None)
 
 async def main():
     logger.info("Starting WebSocket server...")
     try:
         async with websockets.serve(process_audio, "localhost", 8765):
             logger.info("WebSocket server is running on ws://localhost:8765")
+            start_background(presynthesize())
             await asyncio.Future()  # run forever
     except Exception as e:
         logger.error(f"Server error: {e}", exc_info=True)
+    finally:
+        await http_session.aclose()
+        await client.close()
+        reply_cache.close()
+        speech_cache.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())